@@ -17,8 +17,21 @@
     'data': [
         'security/ir.model.access.csv',
         'data/biblioteca_data.xml',
+        'data/biblioteca_cron.xml',
         'views/biblioteca_views.xml',
+        'views/ejemplar_views.xml',
         'views/prestamo_views.xml',
+        'views/reserva_views.xml',
+        'views/politica_views.xml',
+        'views/aviso_views.xml',
+        'views/prestamo_historico_views.xml',
+        'views/movimiento_multa_views.xml',
+        'views/reporte_views.xml',
+        'views/instrumentacion_views.xml',
+        'views/mantenimiento_views.xml',
+        'wizard/devolucion_lote_views.xml',
+        'wizard/pago_multa_views.xml',
+        'wizard/intercambio_views.xml',
         'views/menus.xml',
     ],
     'demo': [],
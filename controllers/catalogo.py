@@ -0,0 +1,114 @@
+from odoo import http
+from odoo.http import request
+from odoo.tools.lru import LRU
+import hashlib
+import json
+
+# Respuestas en caché por proceso: {(base_de_datos, versión, (recurso, parámetros...)): (etag sin comillas, cuerpo)}.
+# Al cambiar la versión del catálogo las entradas antiguas dejan de consultarse y el LRU las descarta.
+_cache = LRU(512)
+
+LIMITE_POR_DEFECTO = 50
+LIMITE_MAXIMO = 200
+
+CAMPOS_LIBRO = [
+    'name', 'autor_id', 'editorial', 'anio_publicacion', 'genero', 'estado', 'disponibilidad',
+    'ejemplares_total', 'ejemplares_disponibles',
+]
+CAMPOS_AUTOR = ['name', 'nacionalidad', 'total_libros']
+
+
+class CatalogoController(http.Controller):
+    """
+    Catálogo público en JSON para el quiosco y la aplicación móvil, de solo lectura.
+
+    - Paginación por cursor (keyset): cada página devuelve `siguiente`, el id a
+      partir del cual pedir la siguiente (`?despues=<id>`), de modo que ninguna
+      página recorre las anteriores.
+    - Caché por proceso identificada por la versión del catálogo, que avanza al
+      cambiar libros, autores o la disponibilidad (`biblioteca.libro._invalidar_catalogo`).
+    - ETag / If-None-Match: un cliente que ya tiene la página recibe 304 sin cuerpo.
+    Con la página en caché, una petición cuesta una consulta (la versión) y ningún acceso al ORM.
+    """
+
+    @http.route('/biblioteca/api/libros', type='http', auth='public', methods=['GET'], csrf=False, readonly=True)
+    def libros(self, despues=0, limite=LIMITE_POR_DEFECTO, disponibles=None, **kwargs):
+        """
+        Libros activos ordenados por id, con su autor y disponibilidad.
+        `disponibles=1` devuelve solo los que tienen algo disponible para préstamo
+        en este momento (`disponibilidad`, leída de los ejemplares).
+        """
+        filtro = [('disponibilidad', '=', 'disponible')] if disponibles in ('1', 'true') else []
+        return self._listar('libros', 'biblioteca.libro', CAMPOS_LIBRO, filtro, despues, limite)
+
+    @http.route('/biblioteca/api/autores', type='http', auth='public', methods=['GET'], csrf=False, readonly=True)
+    def autores(self, despues=0, limite=LIMITE_POR_DEFECTO, **kwargs):
+        """
+        Autores activos ordenados por id, con su número de libros.
+        """
+        return self._listar('autores', 'biblioteca.autor', CAMPOS_AUTOR, [], despues, limite)
+
+    @http.route('/biblioteca/api/libros/<int:libro_id>/recomendaciones', type='http', auth='public', methods=['GET'], csrf=False, readonly=True)
+    def recomendaciones(self, libro_id, **kwargs):
+        """
+        Títulos que más se prestan junto a este (ver `biblioteca.recomendacion`).
+        """
+        return self._responder(
+            ('recomendaciones', libro_id),
+            lambda: {'datos': request.env['biblioteca.recomendacion'].sudo()._vecinos(libro_id)},
+        )
+
+    def _listar(self, recurso, modelo, campos, filtro, despues, limite):
+        try:
+            despues = max(int(despues), 0)
+            limite = min(max(int(limite), 1), LIMITE_MAXIMO)
+        except (TypeError, ValueError):
+            return request.make_json_response({'error': "Parámetros de paginación no válidos"}, status=400)
+        return self._responder(
+            (recurso, tuple(filtro), despues, limite),
+            lambda: self._pagina(modelo, campos, filtro, despues, limite),
+        )
+
+    def _responder(self, parametros, construir):
+        """
+        Devuelve la respuesta en caché para `parametros` en la versión actual del
+        catálogo o, si no está, la construye con `construir()` y la guarda.
+        """
+        version = request.env['biblioteca.libro'].sudo()._version_catalogo()
+        clave = (request.env.cr.dbname, version, parametros)
+        entrada = _cache.get(clave)
+        if entrada is None:
+            cuerpo = json.dumps(construir(), ensure_ascii=False, default=str)
+            etag = hashlib.sha1(cuerpo.encode()).hexdigest()
+            entrada = _cache[clave] = (etag, cuerpo)
+        etag, cuerpo = entrada
+
+        # La cabecera lleva el ETag entre comillas; `ETags` de werkzeug guarda los valores sin ellas.
+        cabeceras = [('ETag', '"%s"' % etag), ('Cache-Control', 'no-cache')]
+        if request.httprequest.if_none_match.contains(etag):
+            return request.make_response('', headers=cabeceras, status=304)
+        return request.make_response(cuerpo, headers=cabeceras + [('Content-Type', 'application/json; charset=utf-8')])
+
+    def _pagina(self, modelo, campos, filtro, despues, limite):
+        """
+        Lee una página con una búsqueda por id (`id > despues`, sobre la clave primaria)
+        y pide un registro de más para saber si hay página siguiente.
+        """
+        registros = request.env[modelo].sudo().search_fetch(
+            filtro + [('id', '>', despues)], campos, order='id', limit=limite + 1,
+        )
+        pagina = registros[:limite]
+        datos = []
+        for registro in pagina:
+            fila = {'id': registro.id}
+            for campo in campos:
+                valor = registro[campo]
+                if campo == 'autor_id':
+                    fila['autor'] = {'id': valor.id, 'nombre': valor.name}
+                else:
+                    fila[campo] = valor
+            datos.append(fila)
+        return {
+            'datos': datos,
+            'siguiente': pagina[-1].id if len(registros) > limite else None,
+        }
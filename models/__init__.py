@@ -1,2 +1,14 @@
+from . import instrumentacion
+from . import historial
 from . import biblioteca
-from . import prestamo
\ No newline at end of file
+from . import politica
+from . import ejemplar
+from . import prestamo
+from . import prestamo_historico
+from . import reserva
+from . import recomendacion
+from . import aviso
+from . import movimiento_multa
+from . import reporte
+from . import intercambio
+from . import mantenimiento
\ No newline at end of file
@@ -0,0 +1,268 @@
+from odoo import models, fields, api, _
+from odoo.tools import format_date
+from itertools import groupby
+import json
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Destinos posibles del parámetro `biblioteca.avisos_salida` (ver `Aviso._enviar_<destino>`).
+SALIDAS = ('correo', 'registro', 'fichero')
+
+class Aviso(models.Model):
+    """
+    Clase que representa un aviso pendiente de envío a un miembro.
+    Cada aviso es un resumen con todos los préstamos del miembro que vencen pronto
+    o están atrasados. Los avisos se generan por lotes con una tarea programada y
+    se envían desde esta cola con otra, en tandas limitadas por minuto.
+
+    El destino se configura con el parámetro `biblioteca.avisos_salida`:
+    - 'correo' (por defecto): se envían con `ir.mail_server`.
+    - 'registro': se escriben en el registro del servidor, para pruebas.
+    - 'fichero': se añaden como líneas JSON al fichero de `biblioteca.avisos_fichero`.
+    """
+    _name = 'biblioteca.aviso'
+    _description = 'Aviso de Préstamos'
+    _order = 'id desc'
+
+    # Parámetros del sistema del envío de avisos.
+    _parametro_dias_antes = 'biblioteca.dias_aviso_vencimiento'
+    _dias_antes_por_defecto = 2
+    _parametro_repetir = 'biblioteca.dias_repetir_aviso_atraso'
+    _repetir_por_defecto = 7
+    _parametro_por_minuto = 'biblioteca.avisos_por_minuto'
+    _por_minuto_por_defecto = 60
+    _parametro_salida = 'biblioteca.avisos_salida'
+    _parametro_fichero = 'biblioteca.avisos_fichero'
+
+    # ==================== CAMPOS DEL AVISO ====================
+    miembro_id = fields.Many2one('biblioteca.miembro', string='Miembro', required=True, readonly=True, index=True, ondelete='cascade', help="Miembro al que se dirige el aviso.")
+    tipo = fields.Selection([
+        ('vencimiento', 'Próximo a vencer'),
+        ('atraso', 'Atrasado'),
+    ], string='Tipo', required=True, readonly=True, help="'Atrasado' si el resumen incluye algún préstamo vencido.")
+    email = fields.Char(string='Email', readonly=True, help="Email copiado en los préstamos del aviso.")
+    telefono = fields.Char(string='Teléfono', readonly=True, help="Teléfono copiado en los préstamos del aviso.")
+    asunto = fields.Char(string='Asunto', readonly=True)
+    cuerpo = fields.Text(string='Mensaje', readonly=True)
+    prestamo_ids = fields.Many2many('biblioteca.prestamo', string='Préstamos', readonly=True, help="Préstamos incluidos en el resumen.")
+    estado = fields.Selection([
+        ('pendiente', 'Pendiente'),
+        ('enviado', 'Enviado'),
+        ('error', 'Error'),
+        ('cancelado', 'Cancelado'),
+    ], string='Estado', default='pendiente', required=True, readonly=True, index=True, help="Situación del aviso en la cola de envío.")
+    intentos = fields.Integer(string='Intentos', readonly=True, default=0, help="Número de intentos de envío.")
+    fecha_envio = fields.Datetime(string='Fecha de Envío', readonly=True)
+    error = fields.Text(string='Error', readonly=True, help="Motivo del último envío fallido.")
+
+    # ==================== GENERACIÓN DE AVISOS ====================
+    @api.model
+    def _cron_generar_avisos(self, tamano_lote=1000, auto_commit=False):
+        """
+        Genera un aviso por miembro con sus préstamos abiertos que vencen en los
+        próximos días o que están atrasados y todavía no se han avisado (los
+        atrasados se vuelven a avisar cada `biblioteca.dias_repetir_aviso_atraso` días).
+
+        Los préstamos se seleccionan con una sola consulta sobre el índice parcial
+        de préstamos abiertos por fecha de devolución, ya ordenados por miembro.
+        Los avisos se crean en lotes de `tamano_lote` miembros con un solo `create`
+        y los préstamos se marcan como avisados con un UPDATE por lote.
+        """
+        parametros = self.env['ir.config_parameter'].sudo()
+        dias_antes = int(parametros.get_param(self._parametro_dias_antes, self._dias_antes_por_defecto))
+        repetir = int(parametros.get_param(self._parametro_repetir, self._repetir_por_defecto))
+        ahora = fields.Datetime.now()
+        self.env.flush_all()
+        self.env.cr.execute("""
+            SELECT p.miembro_id, p.id, p.name, l.name, p.fecha_devolucion, p.dias_atraso, p.multa, p.email, p.telefono
+              FROM biblioteca_prestamo p
+              JOIN biblioteca_libro l ON l.id = p.libro_id
+             WHERE p.estado IN ('prestado', 'atrasado')
+               AND p.fecha_devolucion < %(hasta)s
+               AND CASE WHEN p.fecha_devolucion >= %(ahora)s THEN p.tipo_aviso IS NULL
+                        ELSE p.tipo_aviso IS DISTINCT FROM 'atraso' OR p.fecha_aviso < %(repetir_desde)s
+                   END
+          ORDER BY p.miembro_id, p.fecha_devolucion
+        """, {
+            'ahora': ahora,
+            'hasta': fields.Datetime.add(ahora, days=dias_antes),
+            'repetir_desde': fields.Datetime.subtract(ahora, days=repetir),
+        })
+        por_miembro = [(miembro_id, list(filas)) for miembro_id, filas in groupby(self.env.cr.fetchall(), key=lambda fila: fila[0])]
+        total = 0
+        for inicio in range(0, len(por_miembro), tamano_lote):
+            lote = por_miembro[inicio:inicio + tamano_lote]
+            self.create([self._componer(miembro_id, filas, ahora) for miembro_id, filas in lote])
+            prestamo_ids = [fila[1] for _miembro_id, filas in lote for fila in filas]
+            self.env.cr.execute("""
+                UPDATE biblioteca_prestamo
+                   SET tipo_aviso = CASE WHEN fecha_devolucion < %(ahora)s THEN 'atraso' ELSE 'vencimiento' END,
+                       fecha_aviso = %(ahora)s
+                 WHERE id = ANY(%(ids)s)
+            """, {'ahora': ahora, 'ids': prestamo_ids})
+            self.env['biblioteca.prestamo'].browse(prestamo_ids).invalidate_recordset(['tipo_aviso', 'fecha_aviso'])
+            self.env.flush_all()
+            total += len(lote)
+            if auto_commit:
+                self.env.cr.commit()
+        _logger.info("Avisos de préstamos: %s avisos generados", total)
+        return total
+
+    @api.model
+    def _componer(self, miembro_id, filas, ahora):
+        """
+        Devuelve los valores del aviso de un miembro a partir de sus filas de
+        préstamo (miembro_id, id, referencia, título, fecha de devolución, días de
+        atraso, multa, email, teléfono). El texto se compone en memoria, sin leer
+        registros ni renderizar plantillas, para poder generar miles de avisos por lote.
+        """
+        atrasados = [fila for fila in filas if fila[4] < ahora]
+        proximos = [fila for fila in filas if fila[4] >= ahora]
+        lineas = []
+        if atrasados:
+            linea = _("- %(titulo)s (%(referencia)s): vencía el %(fecha)s; %(dias)s días de atraso, multa %(multa).2f")
+            lineas.append(_("Préstamos atrasados:"))
+            lineas += [
+                linea % {'titulo': titulo, 'referencia': referencia, 'fecha': format_date(self.env, fecha), 'dias': dias or 0, 'multa': multa or 0.0}
+                for _m, _id, referencia, titulo, fecha, dias, multa, _email, _telefono in atrasados
+            ]
+        if proximos:
+            linea = _("- %(titulo)s (%(referencia)s): vence el %(fecha)s")
+            lineas.append(_("Préstamos que vencen pronto:"))
+            lineas += [
+                linea % {'titulo': titulo, 'referencia': referencia, 'fecha': format_date(self.env, fecha)}
+                for _m, _id, referencia, titulo, fecha, _dias, _multa, _email, _telefono in proximos
+            ]
+        # El contacto es el copiado en el último préstamo (por vencimiento) que lo tenga.
+        email = next((fila[7] for fila in reversed(filas) if fila[7]), False)
+        telefono = next((fila[8] for fila in reversed(filas) if fila[8]), False)
+        return {
+            'miembro_id': miembro_id,
+            'tipo': 'atraso' if atrasados else 'vencimiento',
+            'email': email,
+            'telefono': telefono,
+            'asunto': _("Tiene préstamos atrasados en la biblioteca") if atrasados else _("Sus préstamos de la biblioteca vencen pronto"),
+            'cuerpo': "\n".join(lineas),
+            'prestamo_ids': [fields.Command.set([fila[1] for fila in filas])],
+        }
+
+    # ==================== ENVÍO DE LA COLA ====================
+    @api.model
+    def _cron_enviar_avisos(self, tamano_lote=50, minutos=10, auto_commit=False):
+        """
+        Envía avisos pendientes en tandas de `tamano_lote`, hasta la cuota de
+        `minutos` (el intervalo de la tarea) a razón de `biblioteca.avisos_por_minuto`,
+        y termina: el ritmo se respeta repartiendo la cola entre ejecuciones, sin
+        esperar dentro de la tarea, que así no supera su intervalo ni el límite de
+        tiempo de las tareas programadas. Cada tanda se toma con `SKIP LOCKED` y usa
+        una sola conexión SMTP; con `auto_commit` se confirma al terminar, de modo
+        que un error o una interrupción no reenvía lo ya enviado.
+        """
+        parametros = self.env['ir.config_parameter'].sudo()
+        por_minuto = max(int(parametros.get_param(self._parametro_por_minuto, self._por_minuto_por_defecto)), 1)
+        salida = parametros.get_param(self._parametro_salida) or 'correo'
+        if salida not in SALIDAS:
+            _logger.error("Avisos de préstamos: destino '%s' no válido (%s)", salida, ", ".join(SALIDAS))
+            return 0
+        maximo = por_minuto * minutos
+        total = 0
+        while total < maximo:
+            # Sin `auto_commit`, lo enviado en la tanda anterior solo está en la caché del ORM.
+            self.flush_model(['estado'])
+            self.env.cr.execute("""
+                SELECT id FROM biblioteca_aviso
+                 WHERE estado = 'pendiente'
+              ORDER BY id
+                 LIMIT %s
+                   FOR UPDATE SKIP LOCKED
+            """, [min(tamano_lote, maximo - total)])
+            avisos = self.browse([fila[0] for fila in self.env.cr.fetchall()])
+            if not avisos:
+                break
+            avisos._enviar(salida)
+            if auto_commit:
+                self.env.cr.commit()
+            total += len(avisos)
+        _logger.info("Avisos de préstamos: %s avisos procesados", total)
+        return total
+
+    def _enviar(self, salida):
+        """
+        Envía estos avisos por el destino indicado y registra el resultado de cada uno.
+        """
+        ahora = fields.Datetime.now()
+        for aviso, error in zip(self, getattr(self, '_enviar_%s' % salida)()):
+            aviso.write({
+                'estado': 'error' if error else 'enviado',
+                'error': error or False,
+                'fecha_envio': False if error else ahora,
+                'intentos': aviso.intentos + 1,
+            })
+
+    def _enviar_correo(self):
+        """
+        Envía los avisos por correo con una sola conexión al servidor de salida.
+        Devuelve, para cada aviso, el mensaje de error o False.
+        """
+        IrMailServer = self.env['ir.mail_server'].sudo()
+        remitente = IrMailServer._get_default_from_address()
+        try:
+            sesion = IrMailServer._connect__(smtp_from=remitente)
+        except Exception as e:
+            return [str(e)] * len(self)
+        errores = []
+        try:
+            for aviso in self:
+                if not aviso.email:
+                    errores.append(_("El miembro no tiene email."))
+                    continue
+                try:
+                    mensaje = IrMailServer.build_email(remitente, [aviso.email], aviso.asunto, aviso.cuerpo)
+                    IrMailServer.send_email(mensaje, smtp_session=sesion)
+                    errores.append(False)
+                except Exception as e:
+                    errores.append(str(e))
+        finally:
+            if sesion:
+                sesion.quit()
+        return errores
+
+    def _enviar_registro(self):
+        """
+        Escribe los avisos en el registro del servidor, sin enviarlos.
+        """
+        for aviso in self:
+            _logger.info("Aviso para %s (%s / %s): %s\n%s", aviso.miembro_id.display_name, aviso.email, aviso.telefono, aviso.asunto, aviso.cuerpo)
+        return [False] * len(self)
+
+    def _enviar_fichero(self):
+        """
+        Añade los avisos, uno por línea en JSON, al fichero de `biblioteca.avisos_fichero`.
+        """
+        ruta = self.env['ir.config_parameter'].sudo().get_param(self._parametro_fichero)
+        if not ruta:
+            return [_("Falta el parámetro %s.", self._parametro_fichero)] * len(self)
+        with open(ruta, 'a', encoding='utf-8') as fichero:
+            for aviso in self:
+                fichero.write(json.dumps({
+                    'miembro_id': aviso.miembro_id.id,
+                    'email': aviso.email,
+                    'telefono': aviso.telefono,
+                    'asunto': aviso.asunto,
+                    'cuerpo': aviso.cuerpo,
+                }, ensure_ascii=False) + "\n")
+        return [False] * len(self)
+
+    # ==================== MÉTODOS DE ACCIÓN (Botones) ====================
+    def action_reintentar(self):
+        """
+        Devuelve a la cola los avisos con error.
+        """
+        self.filtered(lambda a: a.estado == 'error').write({'estado': 'pendiente'})
+
+    def action_cancelar(self):
+        """
+        Saca de la cola los avisos que aún no se han enviado.
+        """
+        self.filtered(lambda a: a.estado in ('pendiente', 'error')).write({'estado': 'cancelado'})
@@ -1,4 +1,12 @@
-from odoo import models, fields, api
+from odoo import models, fields, api, tools, _
+from odoo.exceptions import UserError
+from odoo.osv import expression
+from odoo.tools import SQL
+
+from .instrumentacion import instrumentado
+
+# Contadores de ejemplares del título, en el orden de la cola de variaciones.
+CONTADORES = ['ejemplares_total', 'ejemplares_disponibles', 'ejemplares_prestados', 'ejemplares_atrasados', 'ejemplares_reservados']
 
 class Libro(models.Model):
     """
@@ -7,11 +15,13 @@ class Libro(models.Model):
     """
     _name = 'biblioteca.libro'
     _description = 'Libro de la Biblioteca'
+    _inherit = ['biblioteca.historial.mixin']
+    _campo_historial = 'libro_id'
 
     # ==================== CAMPOS DEL LIBRO ====================
-    name = fields.Char(string='Título', required=True, help="Título principal del libro.")
-    autor_id = fields.Many2one('biblioteca.autor', string='Autor', required=True, help="Autor del libro.")
-    editorial = fields.Char(string='Editorial', help="Editorial que publicó el libro.")
+    name = fields.Char(string='Título', required=True, index='trigram', help="Título principal del libro.")
+    autor_id = fields.Many2one('biblioteca.autor', string='Autor', required=True, index=True, help="Autor del libro.")
+    editorial = fields.Char(string='Editorial', index='trigram', help="Editorial que publicó el libro.")
     anio_publicacion = fields.Integer(string='Año de Publicación', help="Año en que el libro fue publicado.")
 
     multa = fields.Float(string='Multa por Atraso', default=0.0, help="Costo de la multa por cada día de atraso en la devolución.")
@@ -30,12 +40,385 @@ class Libro(models.Model):
         ('disponible', 'Disponible'),
         ('prestado', 'Prestado'),
         ('atrasado', 'Atrasado'),
+        ('reservado', 'Reservado'),
     ], string='Estado', default='disponible', help="Estado actual del libro en la biblioteca.")
 
     descripcion = fields.Text(string='Descripción', help="Sinopsis o resumen del contenido del libro.")
     active = fields.Boolean(string='Activo', default=True, help="Indica si el registro está activo o archivado (borrado lógico).")
 
     prestamo_ids = fields.One2many('biblioteca.prestamo', 'libro_id', string='Préstamos', help="Historial de todos los préstamos de este libro.")
+    # Mantenidas por la tarea programada de `biblioteca.recomendacion`, ya ordenadas por afinidad.
+    recomendacion_ids = fields.One2many('biblioteca.recomendacion', 'libro_id', string='También Prestados', readonly=True, help="Títulos que más se prestan junto a este.")
+
+    # ==================== EJEMPLARES Y DISPONIBILIDAD ====================
+    # Los contadores se almacenan en el título y se ajustan de forma incremental
+    # cada vez que un ejemplar cambia de estado, a través de una cola (ver `_ajustar_ejemplares`).
+    ejemplar_ids = fields.One2many('biblioteca.ejemplar', 'libro_id', string='Ejemplares', help="Ejemplares físicos de este título.")
+    ejemplares_total = fields.Integer(string='Ejemplares', readonly=True, default=0, help="Número de ejemplares activos de este título.")
+    ejemplares_disponibles = fields.Integer(string='Disponibles', readonly=True, default=0, help="Ejemplares disponibles para préstamo.")
+    ejemplares_prestados = fields.Integer(string='Prestados', readonly=True, default=0, help="Ejemplares prestados dentro de plazo.")
+    ejemplares_atrasados = fields.Integer(string='Atrasados', readonly=True, default=0, help="Ejemplares prestados con la devolución vencida.")
+    ejemplares_reservados = fields.Integer(string='Reservados', readonly=True, default=0, help="Ejemplares apartados para una reserva.")
+    # `estado` y los contadores pueden llevar hasta un minuto de retraso (variaciones en cola);
+    # los filtros de disponibilidad usan este campo, que se lee de los ejemplares como `_con_disponibles`.
+    disponibilidad = fields.Selection(
+        selection=lambda self: self._fields['estado'].selection, string='Disponibilidad',
+        compute='_compute_disponibilidad', search='_search_disponibilidad',
+        help="Estado del libro en este momento, según sus ejemplares.",
+    )
+
+    def init(self):
+        """
+        Crea el índice de texto completo sobre la descripción del libro.
+        Los índices trigram de título, editorial y nombre del autor los crea el ORM
+        a partir de `index='trigram'` en los campos.
+        También crea la secuencia con la versión del catálogo público (ver `_invalidar_catalogo`)
+        y la cola de variaciones de los contadores de ejemplares.
+        """
+        tools.create_index(
+            self.env.cr, 'biblioteca_libro_descripcion_fts_idx', self._table,
+            ["to_tsvector('simple', COALESCE(descripcion, ''))"],
+            method='gin',
+        )
+        self.env.cr.execute("CREATE SEQUENCE IF NOT EXISTS biblioteca_catalogo_version_seq")
+        # Cola de variaciones de disponibilidad pendientes de consolidar (ver `_ajustar_ejemplares`).
+        # Sin clave foránea: la comprobación bloquearía la fila del título en cada préstamo.
+        self.env.cr.execute("""
+            CREATE TABLE IF NOT EXISTS biblioteca_libro_ejemplares_delta (
+                id serial PRIMARY KEY,
+                libro_id integer NOT NULL,
+                disponibles integer NOT NULL DEFAULT 0,
+                prestados integer NOT NULL DEFAULT 0,
+                atrasados integer NOT NULL DEFAULT 0,
+                reservados integer NOT NULL DEFAULT 0
+            )
+        """)
+
+    # ==================== VERSIÓN DEL CATÁLOGO PÚBLICO ====================
+    @api.model_create_multi
+    def create(self, vals_list):
+        """
+        Crea los libros y avanza la versión del catálogo público en caché.
+        """
+        libros = super().create(vals_list)
+        self._invalidar_catalogo()
+        return libros
+
+    def write(self, vals):
+        """
+        Al modificar libros (también su estado) avanza la versión del catálogo público en caché.
+        """
+        self._invalidar_catalogo()
+        return super().write(vals)
+
+    def unlink(self):
+        """
+        Al eliminar libros avanza la versión del catálogo público en caché.
+        """
+        self._invalidar_catalogo()
+        return super().unlink()
+
+    @api.model
+    def _invalidar_catalogo(self):
+        """
+        Avanza la versión del catálogo público cuando cambian libros, autores o la
+        disponibilidad (préstamos y ejemplares). Las respuestas del catálogo en
+        caché se identifican por esta versión, así que dejan de usarse.
+
+        La versión es una secuencia de PostgreSQL y se avanza después del commit:
+        si se avanzara dentro de la transacción, otro proceso podría guardar en caché
+        los datos anteriores con la versión nueva. Se avanza una vez por transacción.
+        """
+        cr = self.env.cr
+        if 'biblioteca.catalogo' in cr.postcommit.data:
+            return
+        cr.postcommit.data['biblioteca.catalogo'] = True
+        registry = self.env.registry
+
+        @cr.postcommit.add
+        def avanzar_version():
+            with registry.cursor() as cr_version:
+                cr_version.execute("SELECT nextval('biblioteca_catalogo_version_seq')")
+
+    @api.model
+    def _version_catalogo(self):
+        """
+        Devuelve la versión actual del catálogo público (una consulta, sin ORM).
+        """
+        self.env.cr.execute("SELECT last_value FROM biblioteca_catalogo_version_seq")
+        return self.env.cr.fetchone()[0]
+
+    @api.model
+    def _ajustar_ejemplares(self, deltas):
+        """
+        Aplica variaciones a los contadores de ejemplares de varios títulos sin
+        volver a contar los ejemplares. `deltas` es {libro_id: {campo_contador: variación}}.
+
+        Prestar, devolver o apartar un ejemplar solo cambia su estado: esas
+        variaciones se añaden a la cola `biblioteca_libro_ejemplares_delta` con un
+        INSERT, sin tocar la fila del título, para que dos puestos que prestan
+        ejemplares distintos del mismo título no se bloqueen entre sí. La tarea
+        programada `_cron_consolidar_ejemplares` las suma a los títulos cada minuto,
+        así que los contadores y el estado de los títulos con ejemplares pueden ir
+        hasta un minuto por detrás; lo que tiene que ser exacto en el momento
+        consulta los ejemplares: prestar y reservar con `_con_disponibles`, y los
+        filtros de las vistas y del catálogo público con el campo `disponibilidad`.
+        Las altas, bajas y archivados de ejemplares cambian `ejemplares_total` y
+        se aplican en el acto.
+        """
+        pendientes = []
+        inmediatos = {}
+        for libro_id, contadores in deltas.items():
+            if not any(contadores.get(campo) for campo in CONTADORES):
+                continue
+            if contadores.get('ejemplares_total'):
+                inmediatos[libro_id] = contadores
+            else:
+                pendientes.append(SQL("(%s, %s, %s, %s, %s)", libro_id, *(int(contadores.get(campo, 0)) for campo in CONTADORES[1:])))
+        if pendientes:
+            self.env.cr.execute(SQL("""
+                INSERT INTO biblioteca_libro_ejemplares_delta (libro_id, disponibles, prestados, atrasados, reservados)
+                VALUES %s
+            """, SQL(", ").join(pendientes)))
+            # El catálogo público filtra por `disponibilidad`, que ya ha cambiado.
+            self._invalidar_catalogo()
+        self._aplicar_ejemplares(inmediatos)
+
+    @api.model
+    def _aplicar_ejemplares(self, deltas):
+        """
+        Suma las variaciones de `deltas` ({libro_id: {campo_contador: variación}})
+        a los contadores de los títulos con una sola sentencia UPDATE. En los
+        títulos con ejemplares, el estado del libro se deriva de los contadores
+        resultantes: 'disponible' si queda alguno libre, 'atrasado' si alguno está
+        vencido, 'prestado' si alguno está prestado y 'reservado' si todos están apartados.
+        Un título que se queda sin ejemplares activos vuelve a 'disponible', como
+        cualquier título sin ejemplares que nadie tiene prestado.
+        """
+        filas = [
+            SQL("(%s, %s, %s, %s, %s, %s)", libro_id, *(int(contadores.get(campo, 0)) for campo in CONTADORES))
+            for libro_id, contadores in deltas.items()
+        ]
+        if not filas:
+            return
+        self.flush_model(CONTADORES + ['estado'])
+        self.env.cr.execute(SQL("""
+            UPDATE biblioteca_libro l
+               SET ejemplares_total = l.ejemplares_total + v.total,
+                   ejemplares_disponibles = l.ejemplares_disponibles + v.disponibles,
+                   ejemplares_prestados = l.ejemplares_prestados + v.prestados,
+                   ejemplares_atrasados = l.ejemplares_atrasados + v.atrasados,
+                   ejemplares_reservados = l.ejemplares_reservados + v.reservados,
+                   estado = CASE
+                       WHEN l.ejemplares_total + v.total = 0 AND v.total != 0 THEN 'disponible'
+                       WHEN l.ejemplares_total + v.total = 0 THEN l.estado
+                       WHEN l.ejemplares_disponibles + v.disponibles > 0 THEN 'disponible'
+                       WHEN l.ejemplares_atrasados + v.atrasados > 0 THEN 'atrasado'
+                       WHEN l.ejemplares_prestados + v.prestados > 0 THEN 'prestado'
+                       ELSE 'reservado'
+                   END
+              FROM (VALUES %s) AS v(id, total, disponibles, prestados, atrasados, reservados)
+             WHERE l.id = v.id
+        """, SQL(", ").join(filas)))
+        libros = self.browse(list(deltas))
+        libros.invalidate_recordset(CONTADORES + ['estado'])
+        libros.modified(CONTADORES + ['estado'])
+        self._invalidar_catalogo()
+
+    @api.model
+    def _cron_consolidar_ejemplares(self, tamano_lote=10000):
+        """
+        Suma a los títulos las variaciones de disponibilidad en cola, por lotes de
+        `tamano_lote` filas: cada lote se saca de la cola con un DELETE ... RETURNING
+        agrupado por título y se aplica con `_aplicar_ejemplares` (las de títulos
+        eliminados no actualizan nada). Las filas que otra ejecución está
+        consolidando se saltan (`SKIP LOCKED`).
+        Devuelve el número de títulos actualizados.
+        """
+        total = 0
+        while True:
+            self.env.cr.execute("""
+                WITH pendientes AS (
+                    DELETE FROM biblioteca_libro_ejemplares_delta
+                     WHERE id IN (
+                        SELECT id FROM biblioteca_libro_ejemplares_delta
+                      ORDER BY id
+                         LIMIT %s
+                           FOR UPDATE SKIP LOCKED
+                     )
+                 RETURNING libro_id, disponibles, prestados, atrasados, reservados
+                )
+                SELECT libro_id, SUM(disponibles), SUM(prestados), SUM(atrasados), SUM(reservados)
+                  FROM pendientes
+              GROUP BY libro_id
+            """, [tamano_lote])
+            filas = self.env.cr.fetchall()
+            if not filas:
+                break
+            self._aplicar_ejemplares({fila[0]: dict(zip(CONTADORES[1:], fila[1:])) for fila in filas})
+            total += len(filas)
+        return total
+
+    def _con_disponibles(self):
+        """
+        Devuelve los títulos activos de este conjunto que tienen algo disponible
+        para préstamo en este momento: un ejemplar disponible o, si el título no
+        tiene ejemplares, el propio libro. Consulta los ejemplares en lugar de los
+        contadores, que pueden tener variaciones pendientes de consolidar.
+        """
+        if not self:
+            return self
+        self.flush_model(['estado', 'active', 'ejemplares_total'])
+        self.env['biblioteca.ejemplar'].flush_model(['libro_id', 'estado', 'active'])
+        self.env.cr.execute("""
+            SELECT l.id
+              FROM biblioteca_libro l
+             WHERE l.id = ANY(%s) AND l.active
+               AND CASE WHEN l.ejemplares_total > 0
+                        THEN EXISTS (SELECT 1 FROM biblioteca_ejemplar e
+                                      WHERE e.libro_id = l.id AND e.active AND e.estado = 'disponible')
+                        ELSE l.estado = 'disponible'
+                   END
+        """, [self.ids])
+        return self.browse([fila[0] for fila in self.env.cr.fetchall()])
+
+    def _compute_disponibilidad(self):
+        """
+        Deriva el estado de cada título de sus ejemplares activos con la misma regla
+        que `_aplicar_ejemplares`; los títulos sin ejemplares toman su `estado`.
+        Una consulta para todo el conjunto.
+        """
+        self.flush_model(['estado', 'ejemplares_total'])
+        self.env['biblioteca.ejemplar'].flush_model(['libro_id', 'estado', 'active'])
+        ids = [libro_id for libro_id in self._origin.ids if libro_id]
+        estados = {}
+        if ids:
+            self.env.cr.execute("""
+                SELECT l.id,
+                       CASE
+                           WHEN l.ejemplares_total = 0 THEN l.estado
+                           WHEN bool_or(e.estado = 'disponible') THEN 'disponible'
+                           WHEN bool_or(e.estado = 'atrasado') THEN 'atrasado'
+                           WHEN bool_or(e.estado = 'prestado') THEN 'prestado'
+                           ELSE 'reservado'
+                       END
+                  FROM biblioteca_libro l
+             LEFT JOIN biblioteca_ejemplar e ON e.libro_id = l.id AND e.active
+                 WHERE l.id = ANY(%s)
+              GROUP BY l.id
+            """, [ids])
+            estados = dict(self.env.cr.fetchall())
+        for libro in self:
+            libro.disponibilidad = estados.get(libro._origin.id, libro.estado)
+
+    def _search_disponibilidad(self, operator, value):
+        """
+        Traduce la disponibilidad a un dominio sobre los ejemplares activos
+        (subconsultas EXISTS por `libro_id`) y, para los títulos sin ejemplares, sobre `estado`.
+        """
+        if operator not in ('=', '!=', 'in', 'not in'):
+            raise UserError(_("Operador no soportado para la disponibilidad: %s", operator))
+        valores = [value] if operator in ('=', '!=') else list(value)
+        por_estado = {
+            'disponible': [('ejemplar_ids', 'any', [('estado', '=', 'disponible')])],
+            'atrasado': [
+                ('ejemplar_ids', 'any', [('estado', '=', 'atrasado')]),
+                ('ejemplar_ids', 'not any', [('estado', '=', 'disponible')]),
+            ],
+            'prestado': [
+                ('ejemplar_ids', 'any', [('estado', '=', 'prestado')]),
+                ('ejemplar_ids', 'not any', [('estado', 'in', ('disponible', 'atrasado'))]),
+            ],
+            'reservado': [
+                ('ejemplares_total', '>', 0),
+                ('ejemplar_ids', 'not any', [('estado', 'in', ('disponible', 'atrasado', 'prestado'))]),
+            ],
+        }
+        dominio = expression.OR(
+            [[('ejemplares_total', '=', 0), ('estado', 'in', valores)]]
+            + [por_estado[valor] for valor in valores if valor in por_estado]
+        )
+        return ['!'] + dominio if operator in ('!=', 'not in') else dominio
+
+    # ==================== BÚSQUEDA EN EL CATÁLOGO ====================
+    # Coincidencias que aporta como mucho cada rama de `buscar_catalogo` (o 5 veces `limit`, si es mayor).
+    _limite_rama_catalogo = 200
+
+    @api.model
+    def buscar_catalogo(self, termino, domain=None, limit=20):
+        """
+        Busca libros por título, autor, editorial o descripción y los devuelve
+        ordenados por relevancia. `domain` permite restringir los libros candidatos.
+
+        Un OR de las cuatro condiciones, una de ellas sobre el autor unido, obliga a
+        PostgreSQL a recorrer la tabla entera. Por eso cada condición es una rama de
+        un UNION que usa su propio índice, con su propio LIMIT: título y editorial
+        con los índices trigram (ILIKE), la descripción con el índice de texto
+        completo y el autor buscando primero los autores por su índice trigram y
+        luego sus libros por `autor_id`. El dominio y la relevancia solo se aplican
+        a esas coincidencias, así que el coste depende del número de coincidencias
+        y no del tamaño del catálogo. Los índices trigram requieren la extensión
+        pg_trgm y términos de tres o más caracteres; sin ellos, las ramas de título,
+        editorial y autor recorren su tabla. Un término muy frecuente puede dejar
+        fuera coincidencias que superen el límite de su rama.
+        """
+        termino = (termino or '').strip()
+        if not termino:
+            return self.search(domain or [], limit=limit)
+        rama = limit and max(limit * 5, self._limite_rama_catalogo)
+        self.flush_model(['name', 'editorial', 'descripcion', 'autor_id', 'active'])
+        self.env['biblioteca.autor'].flush_model(['name'])
+        self.env.cr.execute(SQL("""
+            (SELECT id FROM biblioteca_libro WHERE name ILIKE %(patron)s LIMIT %(rama)s)
+            UNION
+            (SELECT id FROM biblioteca_libro WHERE editorial ILIKE %(patron)s LIMIT %(rama)s)
+            UNION
+            (SELECT id FROM biblioteca_libro
+              WHERE to_tsvector('simple', COALESCE(descripcion, '')) @@ plainto_tsquery('simple', %(termino)s)
+              LIMIT %(rama)s)
+            UNION
+            (SELECT id FROM biblioteca_libro
+              WHERE autor_id IN (SELECT id FROM biblioteca_autor WHERE name ILIKE %(patron)s LIMIT %(rama)s)
+              LIMIT %(rama)s)
+        """, patron=f'%{termino}%', termino=termino, rama=rama))
+        coincidencias = [fila[0] for fila in self.env.cr.fetchall()]
+        if not coincidencias:
+            return self.browse()
+        candidatos = self._search(list(domain or []) + [('id', 'in', coincidencias)])
+        if self.env.registry.has_trigram:
+            relevancia = SQL("""GREATEST(
+                similarity(l.name, %(termino)s),
+                0.8 * similarity(a.name, %(termino)s),
+                0.5 * similarity(COALESCE(l.editorial, ''), %(termino)s),
+                ts_rank(to_tsvector('simple', COALESCE(l.descripcion, '')), plainto_tsquery('simple', %(termino)s))
+            ) DESC""", termino=termino)
+        else:
+            relevancia = SQL("l.name")
+        self.env.cr.execute(SQL("""
+            SELECT l.id
+              FROM biblioteca_libro l
+              JOIN biblioteca_autor a ON a.id = l.autor_id
+             WHERE l.id IN %(candidatos)s
+          ORDER BY %(relevancia)s, l.id
+             LIMIT %(limite)s
+        """,
+            candidatos=candidatos.subselect(),
+            relevancia=relevancia,
+            limite=limit,
+        ))
+        return self.browse([fila[0] for fila in self.env.cr.fetchall()])
+
+    @api.model
+    def name_search(self, name='', domain=None, operator='ilike', limit=100):
+        """
+        Autocompletado del selector de libros (por ejemplo, en el formulario de préstamo).
+        Para búsquedas de tres o más caracteres usa `buscar_catalogo`, que aprovecha
+        los índices trigram y ordena por relevancia; el resto sigue el comportamiento estándar.
+        """
+        if operator == 'ilike' and len((name or '').strip()) >= 3:
+            libros = self.buscar_catalogo(name, domain=domain, limit=limit)
+            return [(libro.id, libro.display_name) for libro in libros]
+        return super().name_search(name=name, domain=domain, operator=operator, limit=limit)
 
 class Autor(models.Model):
     """
@@ -46,7 +429,7 @@ class Autor(models.Model):
     _description = 'Autor de Libros'
 
     # ==================== CAMPOS DEL AUTOR ====================
-    name = fields.Char(string='Nombre', required=True, help="Nombre completo del autor.")
+    name = fields.Char(string='Nombre', required=True, index='trigram', help="Nombre completo del autor.")
     nacionalidad = fields.Char(string='Nacionalidad', help="País de origen del autor.")
     fecha_nacimiento = fields.Date(string='Fecha de Nacimiento', help="Fecha de nacimiento del autor.")
     biografia = fields.Text(string='Biografía', help="Resumen de la vida y obra del autor.")
@@ -58,15 +441,59 @@ class Autor(models.Model):
     # Campo calculado que cuenta el total de libros asociados a este autor.
     total_libros = fields.Integer(string='Total de Libros', compute='_compute_total_libros', store=True, help="Número total de libros de este autor en la biblioteca.")
 
-    @api.depends('libro_ids')
+    @api.depends('libro_ids', 'libro_ids.active')
     def _compute_total_libros(self):
         """
-        Calcula el número total de libros asociados a cada autor.
-        Este método se dispara automáticamente cuando el campo `libro_ids` cambia.
-        El resultado se almacena en la base de datos gracias a `store=True`.
+        Calcula el número de libros activos de cada autor.
+        El ORM acumula los autores afectados durante la transacción (al crear,
+        archivar o cambiar de autor un libro) y los recalcula todos juntos al
+        volcar los cambios, así que cada lote se resuelve con un solo GROUP BY en
+        lugar de cargar los libros de cada autor. En una importación, un autor con
+        miles de libros se recalcula una vez por lote, no una vez por libro.
         """
+        totales = self._leer_total_libros()
         for autor in self:
-            autor.total_libros = len(autor.libro_ids)
+            autor.total_libros = totales.get(autor._origin.id, 0) if autor._origin.id else len(autor.libro_ids)
+
+    def _leer_total_libros(self):
+        """
+        Devuelve un diccionario {autor_id: libros activos} con un único GROUP BY.
+        """
+        ids = [aid for aid in self._origin.ids if aid]
+        if not ids:
+            return {}
+        self.env['biblioteca.libro'].flush_model(['autor_id', 'active'])
+        self.env.cr.execute("""
+            SELECT autor_id, COUNT(*)
+              FROM biblioteca_libro
+             WHERE autor_id = ANY(%s) AND active
+          GROUP BY autor_id
+        """, [ids])
+        return dict(self.env.cr.fetchall())
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        """
+        Crea los autores y avanza la versión del catálogo público en caché.
+        """
+        autores = super().create(vals_list)
+        self.env['biblioteca.libro']._invalidar_catalogo()
+        return autores
+
+    def write(self, vals):
+        """
+        Al modificar autores avanza la versión del catálogo público en caché,
+        que muestra su nombre en los libros y el listado de autores.
+        """
+        self.env['biblioteca.libro']._invalidar_catalogo()
+        return super().write(vals)
+
+    def unlink(self):
+        """
+        Al eliminar autores avanza la versión del catálogo público en caché.
+        """
+        self.env['biblioteca.libro']._invalidar_catalogo()
+        return super().unlink()
 
 class Miembro(models.Model):
     """
@@ -75,12 +502,14 @@ class Miembro(models.Model):
     """
     _name = 'biblioteca.miembro'
     _description = 'Miembro de la Biblioteca'
+    _inherit = ['biblioteca.historial.mixin']
+    _campo_historial = 'miembro_id'
 
     # ==================== CAMPOS DEL MIEMBRO ====================
     name = fields.Char(string='Nombre Completo', required=True, help="Nombre y apellidos del miembro.")
     codigo_miembro = fields.Char(string='Código', default='Nuevo', readonly=True, help="Código único de identificación para el miembro.")
 
-    dni = fields.Char(string='DNI / Documento', required=True, help="Documento Nacional de Identidad o equivalente.")
+    dni = fields.Char(string='DNI / Documento', required=True, index=True, help="Documento Nacional de Identidad o equivalente.")
     email = fields.Char(string='Email', help="Correo electrónico del miembro.")
     telefono = fields.Char(string='Teléfono', help="Número de contacto del miembro.")
     direccion = fields.Char(string='Dirección', help="Dirección de residencia del miembro.")
@@ -97,29 +526,88 @@ class Miembro(models.Model):
     # Historial de todos los préstamos realizados por este miembro.
     prestamo_ids = fields.One2many('biblioteca.prestamo', 'miembro_id', string='Préstamos')
 
-    # Campo calculado para contar los préstamos que aún no han sido devueltos.
-    prestamos_activos = fields.Integer(string='Préstamos Activos', compute='_compute_prestamos_activos', help="Número de libros que el miembro tiene prestados actualmente.")
-
-    # Campo calculado para sumar todas las multas pendientes de pago.
-    deuda_total = fields.Float(string='Deuda Total', compute='_compute_deuda_total', help="Suma total de las multas acumuladas por préstamos atrasados.")
+    # Campos almacenados: se pueden filtrar y ordenar en las vistas.
+    prestamos_activos = fields.Integer(string='Préstamos Activos', compute='_compute_totales_prestamos', store=True, help="Número de libros que el miembro tiene prestados actualmente.")
+    # Saldo del libro de multas (`biblioteca.movimiento.multa`): cada movimiento lo actualiza de forma incremental.
+    deuda_total = fields.Float(string='Deuda Total', readonly=True, copy=False, default=0.0, help="Saldo pendiente de multas, mantenido por el libro de multas.")
+    movimiento_multa_ids = fields.One2many('biblioteca.movimiento.multa', 'miembro_id', string='Movimientos de Multas')
 
     @api.depends('prestamo_ids.estado')
-    def _compute_prestamos_activos(self):
+    @instrumentado
+    def _compute_totales_prestamos(self):
         """
-        Calcula el número de préstamos que están en estado 'prestado'.
-        Se actualiza cada vez que cambia el estado de alguno de los préstamos del miembro.
+        Calcula el número de préstamos abiertos ('prestado' o 'atrasado') de cada miembro.
+        En lugar de recorrer `prestamo_ids` miembro a miembro,
+        agrupa todos los miembros del lote en una sola consulta SQL, de modo que
+        el coste no depende del tamaño del historial de préstamos cargado en memoria.
         """
+        totales = self._leer_totales_prestamos()
         for m in self:
-            # Filtra los préstamos para contar solo aquellos cuyo estado es 'prestado'.
-            m.prestamos_activos = len(m.prestamo_ids.filtered(lambda p: p.estado == 'prestado'))
+            m.prestamos_activos = totales.get(m._origin.id, 0)
 
-    @api.depends('prestamo_ids.multa')
-    def _compute_deuda_total(self):
+    def _leer_totales_prestamos(self):
         """
-        Calcula la deuda total del miembro sumando las multas de todos sus préstamos.
-        Se actualiza si el campo 'multa' de alguno de sus préstamos cambia.
+        Devuelve un diccionario {miembro_id: prestamos_activos} obtenido con un
+        único GROUP BY sobre los préstamos abiertos (índice parcial de abiertos).
         """
-        for m in self:
-            # Extrae el valor de la multa de cada préstamo y los suma.
-            multas = m.prestamo_ids.mapped('multa')
-            m.deuda_total = sum(multas)
+        ids = [mid for mid in self._origin.ids if mid]
+        if not ids:
+            return {}
+        # Los cambios pendientes en memoria deben estar en la base de datos antes de agregar.
+        self.env['biblioteca.prestamo'].flush_model(['miembro_id', 'estado'])
+        self.env.cr.execute("""
+            SELECT miembro_id, COUNT(*)
+              FROM biblioteca_prestamo
+             WHERE miembro_id = ANY(%s) AND estado IN ('prestado', 'atrasado')
+          GROUP BY miembro_id
+        """, [ids])
+        return dict(self.env.cr.fetchall())
+
+    @api.model
+    def _sumar_deuda(self, deltas):
+        """
+        Suma a la deuda de cada miembro su importe en `deltas` ({miembro_id: importe})
+        con un único UPDATE, sin volver a agregar sus multas: O(1) por movimiento.
+        """
+        deltas = {miembro_id: importe for miembro_id, importe in deltas.items() if miembro_id and importe}
+        if not deltas:
+            return
+        self.flush_model(['deuda_total'])
+        self.env.cr.execute("""
+            UPDATE biblioteca_miembro m
+               SET deuda_total = ROUND((COALESCE(m.deuda_total, 0) + t.importe)::numeric, 2)
+              FROM unnest(%s::int[], %s::float8[]) AS t(id, importe)
+             WHERE m.id = t.id
+        """, [list(deltas), list(deltas.values())])
+        miembros = self.browse(list(deltas))
+        miembros.invalidate_recordset(['deuda_total'])
+        miembros.modified(['deuda_total'])
+
+    # ==================== MÉTODOS DE ACCIÓN (Botones) ====================
+    def action_registrar_pago(self):
+        """
+        Abre el asistente para registrar un pago de multas del miembro.
+        """
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _('Registrar Pago'),
+            'res_model': 'biblioteca.pago.multa',
+            'view_mode': 'form',
+            'target': 'new',
+            'context': {'default_miembro_id': self.id},
+        }
+
+    def action_ver_movimientos_multa(self):
+        """
+        Abre los movimientos del libro de multas del miembro.
+        """
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _('Multas y Pagos'),
+            'res_model': 'biblioteca.movimiento.multa',
+            'view_mode': 'list,form',
+            'domain': [('miembro_id', '=', self.id)],
+            'context': {'default_miembro_id': self.id},
+        }
@@ -0,0 +1,94 @@
+from odoo import models, fields, api
+from collections import Counter, defaultdict
+
+# Contador del título que corresponde a cada estado del ejemplar.
+CONTADOR_POR_ESTADO = {
+    'disponible': 'ejemplares_disponibles',
+    'prestado': 'ejemplares_prestados',
+    'atrasado': 'ejemplares_atrasados',
+    'reservado': 'ejemplares_reservados',
+}
+
+class Ejemplar(models.Model):
+    """
+    Clase que representa un ejemplar físico de un libro.
+    Un mismo título (`biblioteca.libro`) puede tener varios ejemplares y cada
+    préstamo se hace sobre uno de ellos. Los contadores de disponibilidad del
+    título se mantienen de forma incremental cada vez que un ejemplar cambia de estado.
+    """
+    _name = 'biblioteca.ejemplar'
+    _description = 'Ejemplar de Libro'
+    _order = 'libro_id, name'
+
+    # ==================== CAMPOS DEL EJEMPLAR ====================
+    name = fields.Char(string='Código', required=True, default='Nuevo', index=True, help="Código o código de barras único del ejemplar.")
+    libro_id = fields.Many2one('biblioteca.libro', string='Libro', required=True, index=True, ondelete='cascade', help="Título al que pertenece el ejemplar.")
+    estado = fields.Selection([
+        ('disponible', 'Disponible'),
+        ('prestado', 'Prestado'),
+        ('atrasado', 'Atrasado'),
+        ('reservado', 'Reservado'),
+    ], string='Estado', default='disponible', required=True, index=True, help="Estado actual del ejemplar. 'Reservado': apartado para la primera reserva en espera del título.")
+    active = fields.Boolean(string='Activo', default=True, help="Los ejemplares dados de baja se archivan y dejan de contar en la disponibilidad.")
+
+    prestamo_ids = fields.One2many('biblioteca.prestamo', 'ejemplar_id', string='Préstamos', help="Historial de préstamos de este ejemplar.")
+
+    _sql_constraints = [
+        ('name_uniq', 'unique(name)', 'El código del ejemplar debe ser único.'),
+    ]
+
+    # ==================== MÉTODOS CRUD (Create, Read, Update, Delete) ====================
+    @api.model_create_multi
+    def create(self, vals_list):
+        """
+        Asigna un código de la secuencia a los ejemplares que no lo traen,
+        reservando todos los códigos del lote con una sola consulta, y suma los
+        nuevos ejemplares a los contadores de su título.
+        """
+        sin_codigo = [vals for vals in vals_list if vals.get('name', 'Nuevo') == 'Nuevo']
+        codigos = self.env['biblioteca.prestamo']._reservar_referencias(len(sin_codigo), 'biblioteca.ejemplar.sequence')
+        for vals, codigo in zip(sin_codigo, codigos):
+            vals['name'] = codigo
+        ejemplares = super().create(vals_list)
+        self.env['biblioteca.libro']._ajustar_ejemplares(ejemplares._contribuciones())
+        return ejemplares
+
+    def write(self, vals):
+        """
+        Si cambia el estado, el título o el archivado de los ejemplares, ajusta
+        los contadores de los títulos con la diferencia entre antes y después.
+        """
+        if not {'estado', 'active', 'libro_id'} & vals.keys():
+            return super().write(vals)
+        antes = self._contribuciones()
+        res = super().write(vals)
+        despues = self._contribuciones()
+        deltas = defaultdict(Counter)
+        for libro_id in antes.keys() | despues.keys():
+            deltas[libro_id].update(despues.get(libro_id, Counter()))
+            deltas[libro_id].subtract(antes.get(libro_id, Counter()))
+        self.env['biblioteca.libro']._ajustar_ejemplares(deltas)
+        return res
+
+    def unlink(self):
+        """
+        Resta los ejemplares eliminados de los contadores de su título.
+        """
+        deltas = defaultdict(Counter)
+        for libro_id, contadores in self._contribuciones().items():
+            deltas[libro_id].subtract(contadores)
+        res = super().unlink()
+        self.env['biblioteca.libro']._ajustar_ejemplares(deltas)
+        return res
+
+    def _contribuciones(self):
+        """
+        Devuelve {libro_id: Counter(campo_contador: n)} con lo que aportan estos
+        ejemplares a los contadores de sus títulos. Los archivados no cuentan.
+        """
+        contribuciones = defaultdict(Counter)
+        for ejemplar in self:
+            if ejemplar.active and ejemplar.libro_id:
+                contribuciones[ejemplar.libro_id.id]['ejemplares_total'] += 1
+                contribuciones[ejemplar.libro_id.id][CONTADOR_POR_ESTADO[ejemplar.estado]] += 1
+        return contribuciones
@@ -0,0 +1,116 @@
+from odoo import models, fields, _
+from odoo.tools import SQL
+
+from .instrumentacion import instrumentado
+
+class HistorialPrestamosMixin(models.AbstractModel):
+    """
+    Mixin para los modelos que muestran un historial de préstamos en su formulario
+    (libros y miembros). En lugar de cargar el One2many completo, ofrece:
+    - Un resumen (total de préstamos, último préstamo y préstamo abierto más reciente)
+      calculado con una única consulta agregada por lote de registros.
+    - Los últimos préstamos, leídos con un índice y un LIMIT.
+    - Acciones que abren el historial completo (en uso y archivado) en listas paginadas.
+    Así, abrir el formulario cuesta lo mismo sea cual sea la antigüedad del registro.
+    """
+    _name = 'biblioteca.historial.mixin'
+    _description = 'Historial de Préstamos'
+
+    # Campo de `biblioteca.prestamo` que apunta al modelo que hereda el mixin.
+    _campo_historial = None
+    # Número de préstamos recientes que se muestran en el formulario.
+    _limite_historial_reciente = 10
+
+    # ==================== CAMPOS DEL RESUMEN ====================
+    total_prestamos = fields.Integer(string='Total de Préstamos', compute='_compute_resumen_historial', help="Número total de préstamos registrados.")
+    ultimo_prestamo = fields.Datetime(string='Último Préstamo', compute='_compute_resumen_historial', help="Fecha del préstamo más reciente.")
+    prestamo_abierto_id = fields.Many2one('biblioteca.prestamo', string='Préstamo Abierto', compute='_compute_resumen_historial', help="Préstamo sin devolver más reciente.")
+    prestamo_reciente_ids = fields.Many2many('biblioteca.prestamo', string='Préstamos Recientes', compute='_compute_prestamo_reciente_ids', help="Últimos préstamos registrados.")
+
+    @instrumentado
+    def _compute_resumen_historial(self):
+        """
+        Calcula el resumen del historial de todos los registros del lote con un único
+        GROUP BY, incluyendo los préstamos archivados en el total y el último préstamo.
+        """
+        resumen = {}
+        ids = [rid for rid in self._origin.ids if rid]
+        if ids:
+            self.env['biblioteca.prestamo'].flush_model([self._campo_historial, 'estado', 'fecha_prestamo'])
+            self.env.cr.execute(SQL("""
+                SELECT campo, SUM(total), MAX(ultimo), MAX(abierto_id)
+                  FROM (
+                        SELECT %(campo)s AS campo,
+                               COUNT(*) AS total,
+                               MAX(fecha_prestamo) AS ultimo,
+                               (ARRAY_AGG(id ORDER BY fecha_prestamo DESC) FILTER (WHERE estado IN ('prestado', 'atrasado')))[1] AS abierto_id
+                          FROM biblioteca_prestamo
+                         WHERE %(campo)s = ANY(%(ids)s)
+                      GROUP BY %(campo)s
+                     UNION ALL
+                        SELECT %(campo)s, COUNT(*), MAX(fecha_prestamo), NULL
+                          FROM biblioteca_prestamo_historico
+                         WHERE %(campo)s = ANY(%(ids)s)
+                      GROUP BY %(campo)s
+                       ) resumen
+              GROUP BY campo
+            """, campo=SQL.identifier(self._campo_historial), ids=ids))
+            resumen = {fila[0]: fila[1:] for fila in self.env.cr.fetchall()}
+        for registro in self:
+            total, ultimo, abierto_id = resumen.get(registro._origin.id, (0, False, False))
+            registro.total_prestamos = total
+            registro.ultimo_prestamo = ultimo
+            registro.prestamo_abierto_id = abierto_id
+
+    @instrumentado
+    def _compute_prestamo_reciente_ids(self):
+        """
+        Lee los últimos préstamos de cada registro con una consulta LATERAL que
+        recorre el índice (campo, fecha_prestamo DESC) y se detiene en el límite.
+        """
+        recientes = {}
+        ids = [rid for rid in self._origin.ids if rid]
+        if ids:
+            self.env['biblioteca.prestamo'].flush_model([self._campo_historial, 'fecha_prestamo'])
+            self.env.cr.execute(SQL("""
+                SELECT t.id, r.id
+                  FROM unnest(%(ids)s::int[]) AS t(id)
+            CROSS JOIN LATERAL (
+                    SELECT id
+                      FROM biblioteca_prestamo
+                     WHERE %(campo)s = t.id
+                  ORDER BY fecha_prestamo DESC
+                     LIMIT %(limite)s
+                ) r
+            """, campo=SQL.identifier(self._campo_historial), ids=ids, limite=self._limite_historial_reciente))
+            for registro_id, prestamo_id in self.env.cr.fetchall():
+                recientes.setdefault(registro_id, []).append(prestamo_id)
+        for registro in self:
+            registro.prestamo_reciente_ids = self.env['biblioteca.prestamo'].browse(recientes.get(registro._origin.id, []))
+
+    def action_ver_historial(self):
+        """
+        Abre el historial completo de préstamos en una lista paginada.
+        """
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _("Historial de %s", self.display_name),
+            'res_model': 'biblioteca.prestamo',
+            'view_mode': 'list,form',
+            'domain': [(self._campo_historial, '=', self.id)],
+            'context': {'default_%s' % self._campo_historial: self.id},
+        }
+
+    def action_ver_historial_archivado(self):
+        """
+        Abre los préstamos archivados del registro en una lista paginada.
+        """
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _("Historial archivado de %s", self.display_name),
+            'res_model': 'biblioteca.prestamo.historico',
+            'view_mode': 'list,form',
+            'domain': [(self._campo_historial, '=', self.id)],
+        }
@@ -0,0 +1,159 @@
+from odoo import models, fields, api
+from collections import defaultdict
+import functools
+import json
+import logging
+import threading
+import time
+
+_logger = logging.getLogger(__name__)
+
+# Parámetro del sistema que activa la instrumentación ('1' para activarla).
+PARAMETRO_ACTIVA = 'biblioteca.instrumentacion'
+# Segundos mínimos entre dos volcados de métricas a la base de datos en cada proceso.
+INTERVALO_VOLCADO = 60
+
+# Acumulado en memoria del proceso: {(base_de_datos, nombre): [llamadas, consultas, filas, segundos, segundos_max]}
+_bloqueo = threading.Lock()
+_acumulado = defaultdict(lambda: [0, 0, 0, 0.0, 0.0])
+_ultimo_volcado = {}
+
+
+def instrumentado(metodo):
+    """
+    Decorador que mide un método del ciclo de vida de los préstamos: número de
+    llamadas, consultas SQL, filas afectadas y tiempo. Las medidas se agrupan por
+    modelo y método (`biblioteca.prestamo.create`), así que un cálculo heredado
+    de un mixin se mide por separado en cada modelo.
+
+    Solo actúa si el parámetro `biblioteca.instrumentacion` vale '1'; la lectura
+    del parámetro está en la caché del ORM, así que desactivada apenas cuesta nada.
+    Activada, las medidas se acumulan en memoria y se vuelcan a
+    `biblioteca.metrica` como mucho una vez por minuto y proceso, después del commit.
+    """
+    @functools.wraps(metodo)
+    def envoltura(self, *args, **kwargs):
+        if not _activa(self.env):
+            return metodo(self, *args, **kwargs)
+        cr = self.env.cr
+        consultas = cr.sql_log_count
+        inicio = time.perf_counter()
+        resultado = metodo(self, *args, **kwargs)
+        segundos = time.perf_counter() - inicio
+        # En `create` las filas son los registros creados, en las operaciones por lote
+        # los resultados devueltos y en el resto los registros sobre los que se llama.
+        if isinstance(resultado, models.BaseModel) and resultado._name == self._name:
+            filas = len(resultado)
+        elif isinstance(resultado, list):
+            filas = len(resultado)
+        else:
+            filas = len(self)
+        nombre = '%s.%s' % (self._name, metodo.__name__)
+        _registrar(cr.dbname, nombre, cr.sql_log_count - consultas, filas, segundos)
+        if 'biblioteca.metricas' not in cr.postcommit.data:
+            cr.postcommit.data['biblioteca.metricas'] = True
+            cr.postcommit.add(functools.partial(_volcar_si_corresponde, self.env.registry))
+        return resultado
+    return envoltura
+
+
+def _activa(env):
+    return env['ir.config_parameter'].sudo().get_param(PARAMETRO_ACTIVA) == '1'
+
+
+def _registrar(dbname, nombre, consultas, filas, segundos):
+    with _bloqueo:
+        acumulado = _acumulado[(dbname, nombre)]
+        acumulado[0] += 1
+        acumulado[1] += consultas
+        acumulado[2] += filas
+        acumulado[3] += segundos
+        acumulado[4] = max(acumulado[4], segundos)
+
+
+def _volcar_si_corresponde(registry):
+    """
+    Vuelca las métricas acumuladas del proceso si ha pasado el intervalo mínimo.
+    """
+    if time.monotonic() - _ultimo_volcado.get(registry.db_name, 0) < INTERVALO_VOLCADO:
+        return
+    _ultimo_volcado[registry.db_name] = time.monotonic()
+    with registry.cursor() as cr:
+        cr.execute("SELECT 1")  # Abre la transacción antes de tomar las métricas del acumulado.
+        api.Environment(cr, api.SUPERUSER_ID, {})['biblioteca.metrica']._volcar()
+
+
+class Metrica(models.Model):
+    """
+    Métricas de rendimiento de las acciones y cálculos de la biblioteca,
+    agregadas por hora. Cada fila acumula las llamadas de todos los procesos
+    del servidor a un mismo método durante esa hora.
+    """
+    _name = 'biblioteca.metrica'
+    _description = 'Métrica de Rendimiento'
+    _order = 'periodo desc, segundos desc'
+
+    # ==================== CAMPOS DE LA MÉTRICA ====================
+    nombre = fields.Char(string='Método', required=True, readonly=True, index=True, help="Acción o cálculo medido.")
+    periodo = fields.Datetime(string='Periodo', required=True, readonly=True, index=True, help="Hora a la que corresponden las medidas.")
+    llamadas = fields.Integer(string='Llamadas', readonly=True)
+    consultas = fields.Integer(string='Consultas SQL', readonly=True)
+    filas = fields.Integer(string='Filas', readonly=True, help="Registros procesados por las llamadas.")
+    segundos = fields.Float(string='Tiempo Total (s)', readonly=True, digits=(16, 4))
+    segundos_max = fields.Float(string='Tiempo Máximo (s)', readonly=True, digits=(16, 4), aggregator='max')
+    consultas_por_llamada = fields.Float(string='Consultas por Llamada', compute='_compute_promedios', digits=(16, 2))
+    ms_por_llamada = fields.Float(string='ms por Llamada', compute='_compute_promedios', digits=(16, 2))
+
+    _sql_constraints = [
+        ('nombre_periodo_uniq', 'unique(nombre, periodo)', 'Solo puede haber una métrica por método y periodo.'),
+    ]
+
+    @api.depends('llamadas', 'consultas', 'segundos')
+    def _compute_promedios(self):
+        for metrica in self:
+            llamadas = metrica.llamadas or 1
+            metrica.consultas_por_llamada = metrica.consultas / llamadas
+            metrica.ms_por_llamada = metrica.segundos * 1000 / llamadas
+
+    @api.model
+    def _volcar(self):
+        """
+        Suma al periodo actual las métricas acumuladas en memoria para esta base
+        de datos, con un INSERT ... ON CONFLICT por método, y las escribe también
+        como líneas de log en JSON para poder recogerlas desde fuera.
+        """
+        dbname = self.env.cr.dbname
+        with _bloqueo:
+            pendientes = {nombre: valores for (db, nombre), valores in _acumulado.items() if db == dbname}
+            for nombre in pendientes:
+                del _acumulado[(dbname, nombre)]
+        if not pendientes:
+            return
+        ahora = fields.Datetime.now()
+        periodo = ahora.replace(minute=0, second=0, microsecond=0)
+        for nombre, (llamadas, consultas, filas, segundos, segundos_max) in pendientes.items():
+            self.env.cr.execute("""
+                INSERT INTO biblioteca_metrica AS m
+                       (nombre, periodo, llamadas, consultas, filas, segundos, segundos_max, create_date, write_date)
+                VALUES (%(nombre)s, %(periodo)s, %(llamadas)s, %(consultas)s, %(filas)s, %(segundos)s, %(segundos_max)s, %(ahora)s, %(ahora)s)
+                ON CONFLICT (nombre, periodo) DO UPDATE
+                   SET llamadas = m.llamadas + EXCLUDED.llamadas,
+                       consultas = m.consultas + EXCLUDED.consultas,
+                       filas = m.filas + EXCLUDED.filas,
+                       segundos = m.segundos + EXCLUDED.segundos,
+                       segundos_max = GREATEST(m.segundos_max, EXCLUDED.segundos_max),
+                       write_date = EXCLUDED.write_date
+            """, {
+                'nombre': nombre, 'periodo': periodo, 'llamadas': llamadas, 'consultas': consultas,
+                'filas': filas, 'segundos': segundos, 'segundos_max': segundos_max, 'ahora': ahora,
+            })
+            _logger.info("biblioteca.metrica %s", json.dumps({
+                'db': dbname,
+                'metodo': nombre,
+                'llamadas': llamadas,
+                'consultas': consultas,
+                'filas': filas,
+                'segundos': round(segundos, 6),
+                'segundos_max': round(segundos_max, 6),
+            }))
+        self.invalidate_model()
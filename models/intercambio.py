@@ -0,0 +1,289 @@
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+from collections import defaultdict
+import csv
+import itertools
+import json
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Columnas de los ficheros de intercambio por tipo de registro, en el orden de exportación.
+COLUMNAS = {
+    'autor': ['name', 'nacionalidad', 'fecha_nacimiento', 'biografia'],
+    'libro': ['name', 'autor', 'editorial', 'anio_publicacion', 'genero', 'monto', 'multa', 'descripcion'],
+    'miembro': ['name', 'dni', 'email', 'telefono', 'direccion', 'estado'],
+}
+TIPOS = [('libro', 'Libros'), ('autor', 'Autores'), ('miembro', 'Miembros')]
+FORMATOS = [('csv', 'CSV'), ('jsonl', 'JSON Lines')]
+# Errores de fila que se conservan en el resumen; el resto solo se cuentan.
+MAX_ERRORES = 100
+
+
+class Intercambio(models.AbstractModel):
+    """
+    Importación y exportación masiva del catálogo (libros y autores) y de los
+    miembros en CSV o JSON Lines, pensada para cargas de cientos de miles de filas.
+
+    - La importación lee el fichero por lotes, así que la memoria no depende del
+      tamaño del fichero, y crea cada lote con una sola llamada a `create`.
+      Los autores de los libros se resuelven por nombre con una búsqueda por lote
+      (y se crean los que faltan); autores y miembros ya existentes, identificados
+      por nombre y por DNI, se actualizan en lugar de duplicarse.
+    - La exportación recorre la tabla por páginas de clave (`id > último exportado`)
+      y escribe las filas a medida que llegan, sin cargar los registros en el ORM.
+    """
+    _name = 'biblioteca.intercambio'
+    _description = 'Importación y Exportación de la Biblioteca'
+
+    # ==================== IMPORTACIÓN ====================
+    @api.model
+    def importar(self, fichero, tipo, formato='csv', tamano_lote=1000):
+        """
+        Importa los registros de tipo `tipo` ('libro', 'autor' o 'miembro') desde
+        `fichero`, un fichero de texto abierto (en CSV, con `newline=''`).
+        Cada lote se crea en un punto de guardado: si falla, se descartan solo sus
+        filas y la importación continúa. Devuelve un resumen:
+        {'creados': n, 'actualizados': n, 'errores': n, 'detalle_errores': [(linea, mensaje), ...]}
+        """
+        if tipo not in COLUMNAS:
+            raise UserError(_("Tipo de registro desconocido: %s", tipo))
+        resumen = {'creados': 0, 'actualizados': 0, 'errores': 0, 'detalle_errores': []}
+        filas = self._leer_filas(fichero, formato, COLUMNAS[tipo], resumen)
+        importar_lote = getattr(self, '_importar_%s' % tipo)
+        while True:
+            lote = list(itertools.islice(filas, tamano_lote))
+            if not lote:
+                break
+            parcial = {'creados': 0, 'actualizados': 0, 'errores': 0, 'detalle_errores': []}
+            try:
+                with self.env.cr.savepoint():
+                    importar_lote(lote, parcial)
+                    self.env.flush_all()
+            except Exception as error:
+                self._anotar_error(resumen, lote[0][0], _("Lote descartado (líneas %(desde)s a %(hasta)s): %(error)s",
+                                                         desde=lote[0][0], hasta=lote[-1][0], error=error))
+                resumen['errores'] += len(lote) - 1
+            else:
+                resumen['creados'] += parcial['creados']
+                resumen['actualizados'] += parcial['actualizados']
+                resumen['errores'] += parcial['errores']
+                resumen['detalle_errores'] += parcial['detalle_errores'][:MAX_ERRORES - len(resumen['detalle_errores'])]
+            # Se vacía la caché del ORM para que la memoria no crezca con cada lote.
+            self.env.invalidate_all()
+        _logger.info("Importación de %s: %s creados, %s actualizados, %s errores",
+                     tipo, resumen['creados'], resumen['actualizados'], resumen['errores'])
+        return resumen
+
+    @api.model
+    def _leer_filas(self, fichero, formato, columnas, resumen):
+        """
+        Genera las filas del fichero como tuplas (linea, valores), conservando solo
+        las columnas conocidas con valor. Las líneas ilegibles se anotan como error.
+        """
+        if formato == 'csv':
+            for linea, fila in enumerate(csv.DictReader(fichero), start=2):
+                yield linea, self._limpiar_fila(fila, columnas)
+        elif formato == 'jsonl':
+            for linea, texto in enumerate(fichero, start=1):
+                if not texto.strip():
+                    continue
+                try:
+                    fila = json.loads(texto)
+                except ValueError as error:
+                    self._anotar_error(resumen, linea, _("JSON no válido: %s", error))
+                    continue
+                yield linea, self._limpiar_fila(fila, columnas)
+        else:
+            raise UserError(_("Formato desconocido: %s", formato))
+
+    @api.model
+    def _limpiar_fila(self, fila, columnas):
+        valores = {}
+        for columna in columnas:
+            valor = fila.get(columna)
+            if isinstance(valor, str):
+                valor = valor.strip()
+            if valor not in (None, ''):
+                valores[columna] = valor
+        return valores
+
+    @api.model
+    def _anotar_error(self, resumen, linea, mensaje):
+        resumen['errores'] += 1
+        if len(resumen['detalle_errores']) < MAX_ERRORES:
+            resumen['detalle_errores'].append((linea, mensaje))
+
+    @api.model
+    def _validar_seleccion(self, modelo, campo, lote, resumen):
+        """
+        Descarta del lote las filas con un valor no válido para el campo de selección
+        `campo`, que harían fallar la creación del lote completo.
+        """
+        validos = set(self.env[modelo]._fields[campo].get_values(self.env))
+        correctas = []
+        for linea, valores in lote:
+            if campo in valores and valores[campo] not in validos:
+                self._anotar_error(resumen, linea, _("Valor no válido para %(campo)s: %(valor)s", campo=campo, valor=valores[campo]))
+            else:
+                correctas.append((linea, valores))
+        return correctas
+
+    @api.model
+    def _importar_con_clave(self, modelo, clave, lote, resumen):
+        """
+        Crea o actualiza los registros de `modelo` identificados por el campo `clave`:
+        una búsqueda para todo el lote, una creación para los nuevos y una escritura
+        por cada conjunto distinto de cambios, compartida por todos los registros
+        existentes que reciben los mismos valores (por ejemplo, el mismo estado o
+        nacionalidad). Las filas repetidas dentro del fichero se combinan y prevalece la última.
+        """
+        por_clave = {}
+        for linea, valores in lote:
+            if not valores.get(clave) or not valores.get('name'):
+                self._anotar_error(resumen, linea, _("Faltan columnas obligatorias (name, %s).", clave))
+                continue
+            por_clave.setdefault(valores[clave], {}).update(valores)
+        if not por_clave:
+            return
+        Modelo = self.env[modelo].with_context(active_test=False)
+        existentes = {registro[clave]: registro for registro in Modelo.search([(clave, 'in', list(por_clave))])}
+        nuevos = [valores for valor_clave, valores in por_clave.items() if valor_clave not in existentes]
+        por_cambios = defaultdict(list)
+        for valor_clave, registro in existentes.items():
+            cambios = {
+                campo: valor for campo, valor in por_clave[valor_clave].items()
+                if registro._fields[campo].convert_to_cache(valor, registro)
+                != registro._fields[campo].convert_to_cache(registro[campo], registro)
+            }
+            if cambios:
+                por_cambios[tuple(sorted(cambios.items()))].append(registro.id)
+        for cambios, ids in por_cambios.items():
+            Modelo.browse(ids).write(dict(cambios))
+            resumen['actualizados'] += len(ids)
+        Modelo.create(nuevos)
+        resumen['creados'] += len(nuevos)
+
+    @api.model
+    def _importar_autor(self, lote, resumen):
+        self._importar_con_clave('biblioteca.autor', 'name', lote, resumen)
+
+    @api.model
+    def _importar_miembro(self, lote, resumen):
+        lote = self._validar_seleccion('biblioteca.miembro', 'estado', lote, resumen)
+        self._importar_con_clave('biblioteca.miembro', 'dni', lote, resumen)
+
+    @api.model
+    def _importar_libro(self, lote, resumen):
+        """
+        Crea los libros del lote con una sola llamada a `create`. La columna
+        'autor' es el nombre del autor: todos los del lote se resuelven con una
+        búsqueda y los que no existen se crean juntos.
+        """
+        lote = self._validar_seleccion('biblioteca.libro', 'genero', lote, resumen)
+        correctas = []
+        for linea, valores in lote:
+            if not valores.get('name') or not valores.get('autor'):
+                self._anotar_error(resumen, linea, _("Faltan columnas obligatorias (name, autor)."))
+            else:
+                correctas.append(valores)
+        if not correctas:
+            return
+        autores = self._resolver_autores({valores['autor'] for valores in correctas})
+        vals_list = []
+        for valores in correctas:
+            vals = dict(valores, autor_id=autores[valores['autor']])
+            del vals['autor']
+            vals_list.append(vals)
+        self.env['biblioteca.libro'].create(vals_list)
+        resumen['creados'] += len(vals_list)
+
+    @api.model
+    def _resolver_autores(self, nombres):
+        """
+        Devuelve {nombre: autor_id} para los nombres indicados, creando en una sola
+        llamada los autores que no existen. La caché solo vive durante el lote.
+        """
+        Autor = self.env['biblioteca.autor'].with_context(active_test=False)
+        cache = {}
+        for autor in Autor.search_fetch([('name', 'in', list(nombres))], ['name'], order='id'):
+            cache.setdefault(autor.name, autor.id)
+        faltan = [nombre for nombre in nombres if nombre not in cache]
+        for autor in Autor.create([{'name': nombre} for nombre in faltan]):
+            cache[autor.name] = autor.id
+        return cache
+
+    # ==================== EXPORTACIÓN ====================
+    @api.model
+    def exportar(self, salida, tipo, formato='csv', tamano_lote=2000):
+        """
+        Escribe en `salida` (un fichero de texto abierto; en CSV, con `newline=''`)
+        todos los registros activos de tipo `tipo` con las mismas columnas que acepta
+        la importación. Las filas se leen en páginas de `tamano_lote` en orden de id,
+        cada una a partir del último id de la anterior (sobre la clave primaria), así
+        que ninguna página vuelve a recorrer las anteriores; todas se leen con la
+        misma instantánea de la transacción actual.
+        Devuelve el número de filas exportadas.
+        """
+        if tipo not in COLUMNAS:
+            raise UserError(_("Tipo de registro desconocido: %s", tipo))
+        modelo = dict(autor='biblioteca.autor', libro='biblioteca.libro', miembro='biblioteca.miembro')[tipo]
+        # La consulta no pasa por el ORM: se comprueban los permisos y se vuelcan los cambios pendientes.
+        self.env[modelo].check_access('read')
+        self.env.flush_all()
+        columnas = COLUMNAS[tipo]
+        if formato == 'csv':
+            escritor = csv.writer(salida)
+            escribir = escritor.writerow
+            escribir(columnas)
+        elif formato == 'jsonl':
+            def escribir(fila):
+                salida.write(json.dumps(dict(zip(columnas, fila)), ensure_ascii=False, default=str) + '\n')
+        else:
+            raise UserError(_("Formato desconocido: %s", formato))
+
+        total = 0
+        ultimo = 0
+        while True:
+            self.env.cr.execute(self._consulta_exportacion(tipo), {'ultimo': ultimo, 'limite': tamano_lote})
+            filas = self.env.cr.fetchall()
+            if not filas:
+                break
+            for fila in filas:
+                valores = fila[1:]
+                escribir(['' if valor is None else valor for valor in valores] if formato == 'csv' else valores)
+            ultimo = filas[-1][0]
+            total += len(filas)
+        _logger.info("Exportación de %s: %s filas", tipo, total)
+        return total
+
+    @api.model
+    def _consulta_exportacion(self, tipo):
+        """
+        Consulta SQL de una página de exportación de cada tipo: el id seguido de las
+        columnas de `COLUMNAS`, para los ids mayores que `ultimo` y hasta `limite` filas.
+        """
+        return {
+            'autor': """
+                SELECT id, name, nacionalidad, fecha_nacimiento, biografia
+                  FROM biblioteca_autor
+                 WHERE active AND id > %(ultimo)s
+              ORDER BY id
+                 LIMIT %(limite)s
+            """,
+            'libro': """
+                SELECT l.id, l.name, a.name, l.editorial, l.anio_publicacion, l.genero, l.monto, l.multa, l.descripcion
+                  FROM biblioteca_libro l
+                  JOIN biblioteca_autor a ON a.id = l.autor_id
+                 WHERE l.active AND l.id > %(ultimo)s
+              ORDER BY l.id
+                 LIMIT %(limite)s
+            """,
+            'miembro': """
+                SELECT id, name, dni, email, telefono, direccion, estado
+                  FROM biblioteca_miembro
+                 WHERE id > %(ultimo)s
+              ORDER BY id
+                 LIMIT %(limite)s
+            """,
+        }[tipo]
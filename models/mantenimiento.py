@@ -0,0 +1,145 @@
+from odoo import models, api, _
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Agregados almacenados que se pueden reconstruir: (tabla, UPDATE para los ids de un lote).
+# Cada UPDATE recalcula los valores con un GROUP BY sobre los ids del lote y solo
+# escribe las filas cuyo valor cambia.
+AGREGADOS = [
+    ('biblioteca_autor', """
+        UPDATE biblioteca_autor a
+           SET total_libros = t.total
+          FROM (
+            SELECT ids.id, COUNT(l.id) AS total
+              FROM unnest(%(ids)s::int[]) AS ids(id)
+         LEFT JOIN biblioteca_libro l ON l.autor_id = ids.id AND l.active
+          GROUP BY ids.id
+          ) t
+         WHERE a.id = t.id AND a.total_libros IS DISTINCT FROM t.total
+    """),
+    # Contadores de ejemplares y estado de los títulos (misma regla que `_ajustar_ejemplares`).
+    # Un título sin ejemplares activos toma el estado de sus préstamos abiertos o de su
+    # reserva asignada sin ejemplar, o queda 'disponible' si ya no tiene ninguno.
+    # Las variaciones en cola de esos títulos se descartan: el recuento ya las incluye.
+    ('biblioteca_libro', """
+        WITH pendientes AS (
+            DELETE FROM biblioteca_libro_ejemplares_delta WHERE libro_id = ANY(%(ids)s)
+        )
+        UPDATE biblioteca_libro l
+           SET ejemplares_total = t.total,
+               ejemplares_disponibles = t.disponibles,
+               ejemplares_prestados = t.prestados,
+               ejemplares_atrasados = t.atrasados,
+               ejemplares_reservados = t.reservados,
+               estado = t.estado
+          FROM (
+            SELECT c.*,
+                   CASE
+                       WHEN c.total = 0 THEN COALESCE(c.prestamo, CASE WHEN c.reservada THEN 'reservado' ELSE 'disponible' END)
+                       WHEN c.disponibles > 0 THEN 'disponible'
+                       WHEN c.atrasados > 0 THEN 'atrasado'
+                       WHEN c.prestados > 0 THEN 'prestado'
+                       ELSE 'reservado'
+                   END AS estado
+              FROM (
+                SELECT ids.id,
+                       COUNT(e.id) AS total,
+                       COUNT(e.id) FILTER (WHERE e.estado = 'disponible') AS disponibles,
+                       COUNT(e.id) FILTER (WHERE e.estado = 'prestado') AS prestados,
+                       COUNT(e.id) FILTER (WHERE e.estado = 'atrasado') AS atrasados,
+                       COUNT(e.id) FILTER (WHERE e.estado = 'reservado') AS reservados,
+                       -- 'atrasado' < 'prestado': un préstamo atrasado prevalece.
+                       (SELECT MIN(p.estado) FROM biblioteca_prestamo p
+                         WHERE p.libro_id = ids.id AND p.ejemplar_id IS NULL
+                           AND p.estado IN ('prestado', 'atrasado')) AS prestamo,
+                       EXISTS (SELECT 1 FROM biblioteca_reserva r
+                                WHERE r.libro_id = ids.id AND r.ejemplar_id IS NULL
+                                  AND r.estado = 'asignada') AS reservada
+                  FROM unnest(%(ids)s::int[]) AS ids(id)
+             LEFT JOIN biblioteca_ejemplar e ON e.libro_id = ids.id AND e.active
+              GROUP BY ids.id
+              ) c
+          ) t
+         WHERE l.id = t.id
+           AND (l.ejemplares_total, l.ejemplares_disponibles, l.ejemplares_prestados, l.ejemplares_atrasados, l.ejemplares_reservados, l.estado)
+               IS DISTINCT FROM (t.total, t.disponibles, t.prestados, t.atrasados, t.reservados, t.estado)
+    """),
+    # Préstamos abiertos y saldo del libro de multas de cada miembro.
+    ('biblioteca_miembro', """
+        UPDATE biblioteca_miembro m
+           SET prestamos_activos = t.activos,
+               deuda_total = t.deuda
+          FROM (
+            SELECT ids.id,
+                   (SELECT COUNT(*) FROM biblioteca_prestamo p
+                     WHERE p.miembro_id = ids.id AND p.estado IN ('prestado', 'atrasado')) AS activos,
+                   (SELECT ROUND(COALESCE(SUM(importe), 0)::numeric, 2) FROM biblioteca_movimiento_multa mm
+                     WHERE mm.miembro_id = ids.id) AS deuda
+              FROM unnest(%(ids)s::int[]) AS ids(id)
+          ) t
+         WHERE m.id = t.id
+           AND (m.prestamos_activos, m.deuda_total) IS DISTINCT FROM (t.activos, t.deuda)
+    """),
+]
+
+class Mantenimiento(models.AbstractModel):
+    """
+    Tareas de mantenimiento de los datos agregados de la biblioteca.
+    Durante el uso normal los agregados se mantienen de forma incremental
+    (contadores de ejemplares, libro de multas) o se recalculan en bloque al volcar
+    los cambios (libros por autor, préstamos activos). La reconstrucción los vuelve
+    a calcular desde cero, por ejemplo tras cargar datos con SQL o restaurar una copia.
+    """
+    _name = 'biblioteca.mantenimiento'
+    _description = 'Mantenimiento de la Biblioteca'
+
+    @api.model
+    def reconstruir_agregados(self, tamano_lote=5000, auto_commit=False):
+        """
+        Recalcula los agregados almacenados de autores, libros y miembros por lotes
+        de `tamano_lote` registros en orden de id, con un UPDATE por lote y tabla.
+        Con `auto_commit` se confirma cada lote para no bloquear las tablas mientras dura.
+        Devuelve {tabla: filas corregidas}.
+        """
+        self.env.flush_all()
+        corregidas = {}
+        for tabla, consulta in AGREGADOS:
+            corregidas[tabla] = 0
+            ultimo = 0
+            while True:
+                self.env.cr.execute(f"SELECT id FROM {tabla} WHERE id > %s ORDER BY id LIMIT %s", [ultimo, tamano_lote])
+                ids = [fila[0] for fila in self.env.cr.fetchall()]
+                if not ids:
+                    break
+                self.env.cr.execute(consulta, {'ids': ids})
+                corregidas[tabla] += self.env.cr.rowcount
+                ultimo = ids[-1]
+                if auto_commit:
+                    self.env.cr.commit()
+        for modelo in ('biblioteca.autor', 'biblioteca.libro', 'biblioteca.miembro'):
+            self.env[modelo].invalidate_model()
+        self.env['biblioteca.libro']._invalidar_catalogo()
+        _logger.info("Reconstrucción de agregados: %s", corregidas)
+        return corregidas
+
+    @api.model
+    def action_reconstruir_agregados(self):
+        """
+        Acción de menú: reconstruye los agregados y muestra cuántos registros se han corregido.
+        """
+        corregidas = self.reconstruir_agregados()
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _("Agregados reconstruidos"),
+                'message': _(
+                    "Autores: %(autores)s, libros: %(libros)s, miembros: %(miembros)s registros corregidos.",
+                    autores=corregidas['biblioteca_autor'],
+                    libros=corregidas['biblioteca_libro'],
+                    miembros=corregidas['biblioteca_miembro'],
+                ),
+                'type': 'success',
+            },
+        }
@@ -0,0 +1,98 @@
+from odoo import models, fields, api, _
+from collections import defaultdict
+
+
+class MovimientoMulta(models.Model):
+    """
+    Clase que representa un movimiento del libro de multas de un miembro:
+    una multa generada (o su variación), un pago o un ajuste manual.
+
+    Los movimientos se registran en el momento en que ocurren y cada uno suma su
+    importe al saldo `deuda_total` del miembro con un UPDATE incremental, así que
+    consultar la deuda, comprobar si un miembro está bloqueado por deuda o listar
+    a los deudores nunca vuelve a sumar el historial de préstamos.
+    Los importes positivos aumentan la deuda y los negativos la reducen.
+    Los movimientos no se modifican ni se borran: las correcciones son ajustes.
+    """
+    _name = 'biblioteca.movimiento.multa'
+    _description = 'Movimiento de Multas'
+    _order = 'fecha desc, id desc'
+
+    # ==================== CAMPOS DEL MOVIMIENTO ====================
+    miembro_id = fields.Many2one('biblioteca.miembro', string='Miembro', required=True, index=True, ondelete='restrict', help="Miembro cuyo saldo modifica el movimiento.")
+    prestamo_id = fields.Many2one('biblioteca.prestamo', string='Préstamo', index=True, ondelete='set null', help="Préstamo que originó la multa. Queda vacío cuando el préstamo se archiva o se elimina; la referencia se conserva.")
+    referencia = fields.Char(string='Referencia', help="Referencia del préstamo que originó el movimiento.")
+    tipo = fields.Selection([
+        ('multa', 'Multa'),
+        ('pago', 'Pago'),
+        ('ajuste', 'Ajuste'),
+    ], string='Tipo', required=True, default='ajuste', help="Naturaleza del movimiento.")
+    importe = fields.Float(string='Importe', required=True, help="Importe del movimiento: positivo aumenta la deuda, negativo la reduce.")
+    fecha = fields.Datetime(string='Fecha', required=True, default=fields.Datetime.now, index=True, help="Momento en que se produjo el movimiento.")
+    nota = fields.Char(string='Nota', help="Observaciones del movimiento.")
+
+    def init(self):
+        """
+        Al instalar el libro de multas sobre una base de datos con préstamos, las
+        multas existentes (también las archivadas) se registran como saldo inicial
+        y la deuda de los miembros pasa a ser la del libro.
+        """
+        self.env.cr.execute("SELECT 1 FROM biblioteca_movimiento_multa LIMIT 1")
+        if self.env.cr.fetchone():
+            return
+        self.env.cr.execute("UPDATE biblioteca_miembro SET deuda_total = 0 WHERE deuda_total != 0")
+        self.env['biblioteca.miembro']._sumar_deuda(self._registrar_multas_existentes())
+
+    # ==================== MÉTODOS CRUD (Create, Read, Update, Delete) ====================
+    @api.model_create_multi
+    def create(self, vals_list):
+        """
+        Crea los movimientos y suma sus importes al saldo de cada miembro,
+        con un único UPDATE para todo el lote.
+        """
+        movimientos = super().create(vals_list)
+        deltas = defaultdict(float)
+        for movimiento in movimientos:
+            deltas[movimiento.miembro_id.id] += movimiento.importe
+        self.env['biblioteca.miembro']._sumar_deuda(deltas)
+        return movimientos
+
+    @api.model
+    def _registrar_multas_existentes(self, prestamo_ids=None):
+        """
+        Registra por SQL un movimiento de multa por cada préstamo con multa, sin
+        tocar los saldos. Sin `prestamo_ids` incluye los préstamos en uso y los
+        archivados; con `prestamo_ids`, solo esos préstamos en uso.
+        Devuelve {miembro_id: importe} para aplicarlo con `_sumar_deuda`.
+        """
+        condicion = "AND id = ANY(%(ids)s)" if prestamo_ids is not None else ""
+        archivados = """
+            UNION ALL
+            SELECT miembro_id, NULL, name, multa, COALESCE(fecha_devolucion, fecha_prestamo)
+              FROM biblioteca_prestamo_historico
+             WHERE multa != 0
+        """ if prestamo_ids is None else ""
+        self.env.cr.execute("""
+            WITH nuevos AS (
+                INSERT INTO biblioteca_movimiento_multa
+                       (miembro_id, prestamo_id, referencia, tipo, importe, fecha, nota,
+                        create_uid, create_date, write_uid, write_date)
+                SELECT miembro_id, prestamo_id, name, 'multa', multa, fecha, %(nota)s,
+                       %(uid)s, %(ahora)s, %(uid)s, %(ahora)s
+                  FROM (
+                        SELECT miembro_id, id AS prestamo_id, name, multa, COALESCE(fecha_devolucion, fecha_prestamo) AS fecha
+                          FROM biblioteca_prestamo
+                         WHERE multa != 0 {condicion}
+                        {archivados}
+                       ) multas
+             RETURNING miembro_id, importe
+            )
+            SELECT miembro_id, SUM(importe) FROM nuevos GROUP BY miembro_id
+        """.format(condicion=condicion, archivados=archivados), {
+            'ids': list(prestamo_ids or []),
+            'nota': _("Saldo inicial"),
+            'uid': self.env.uid,
+            'ahora': fields.Datetime.now(),
+        })
+        self.invalidate_model()
+        return dict(self.env.cr.fetchall())
@@ -0,0 +1,171 @@
+from odoo import models, fields, api, tools, _
+from odoo.exceptions import UserError
+
+class PoliticaPrestamo(models.Model):
+    """
+    Clase que representa la política de préstamos de la biblioteca: qué miembros
+    pueden llevarse libros y por cuántos días.
+    Se aplica la primera política activa (por secuencia). La política se compila
+    una vez en una estructura inmutable que se guarda en la caché del registro y
+    se invalida al modificarla, así que comprobar un préstamo no lee la política
+    de la base de datos; la elegibilidad de todos los miembros de un lote se
+    evalúa con una sola consulta, sea cual sea el número de reglas.
+    """
+    _name = 'biblioteca.politica'
+    _description = 'Política de Préstamos'
+    _order = 'sequence, id'
+
+    # Días de préstamo cuando no hay política ni regla para el género.
+    _dias_por_defecto = 15
+
+    # ==================== CAMPOS DE LA POLÍTICA ====================
+    name = fields.Char(string='Nombre', required=True, help="Nombre de la política.")
+    sequence = fields.Integer(string='Secuencia', default=10, help="Se aplica la primera política activa según este orden.")
+    active = fields.Boolean(string='Activa', default=True, help="Las políticas archivadas no se aplican.")
+    max_prestamos = fields.Integer(string='Máximo de Préstamos Activos', default=0, help="Préstamos abiertos que puede tener un miembro a la vez, contando los nuevos. 0 = sin límite.")
+    max_deuda = fields.Float(string='Deuda Máxima', default=0.0, help="Un miembro con una deuda superior no puede llevarse libros. 0 = sin límite.")
+    bloquear_suspendido = fields.Boolean(string='Bloquear Suspendidos', default=True, help="Los miembros suspendidos no pueden llevarse libros.")
+    bloquear_bloqueado = fields.Boolean(string='Bloquear Bloqueados', default=True, help="Los miembros bloqueados no pueden llevarse libros.")
+    bloquear_inactivo = fields.Boolean(string='Bloquear Inactivos', default=True, help="Los miembros inactivos no pueden llevarse libros.")
+    dias_prestamo = fields.Integer(string='Días de Préstamo', default=15, required=True, help="Días de préstamo de los géneros sin regla propia.")
+    genero_ids = fields.One2many('biblioteca.politica.genero', 'politica_id', string='Días por Género', help="Días de préstamo de cada género.")
+
+    _sql_constraints = [
+        ('dias_positivos', 'CHECK(dias_prestamo > 0)', 'Los días de préstamo deben ser mayores que cero.'),
+    ]
+
+    # ==================== CACHÉ DE LA POLÍTICA ====================
+    @api.model_create_multi
+    def create(self, vals_list):
+        politicas = super().create(vals_list)
+        self.env.registry.clear_cache()
+        return politicas
+
+    def write(self, vals):
+        res = super().write(vals)
+        self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env.registry.clear_cache()
+        return res
+
+    @api.model
+    @tools.ormcache()
+    def _compilar(self):
+        """
+        Devuelve la política vigente compilada en una tupla inmutable
+        (max_prestamos, max_deuda, estados_bloqueados, dias_por_defecto, ((género, días), ...)),
+        o None si no hay ninguna política activa. El resultado queda en caché
+        hasta que se modifica alguna política.
+        """
+        politica = self.sudo().search([], limit=1)
+        if not politica:
+            return None
+        bloqueados = frozenset(
+            estado for estado, bloquear in (
+                ('suspendido', politica.bloquear_suspendido),
+                ('bloqueado', politica.bloquear_bloqueado),
+                ('inactivo', politica.bloquear_inactivo),
+            ) if bloquear
+        )
+        dias = tuple((linea.genero, linea.dias_prestamo) for linea in politica.genero_ids)
+        return (politica.max_prestamos, politica.max_deuda, bloqueados, politica.dias_prestamo, dias)
+
+    # ==================== APLICACIÓN DE LA POLÍTICA ====================
+    @api.model
+    def _dias_prestamo(self, generos):
+        """
+        Devuelve {género: días de préstamo} para los géneros indicados según la política vigente.
+        """
+        compilada = self._compilar()
+        if not compilada:
+            return dict.fromkeys(generos, self._dias_por_defecto)
+        por_genero = dict(compilada[4])
+        return {genero: por_genero.get(genero, compilada[3]) for genero in generos}
+
+    @api.model
+    def _estados_bloqueados(self):
+        """
+        Devuelve la lista de estados de membresía que no pueden llevarse libros según la política vigente.
+        """
+        compilada = self._compilar()
+        return sorted(compilada[2]) if compilada else []
+
+    @api.model
+    def _comprobar_elegibilidad(self, nuevos):
+        """
+        Comprueba que los miembros de `nuevos` ({miembro_id: préstamos nuevos}) pueden
+        llevarse esos libros según la política vigente y, si alguno no puede, lanza un
+        UserError con los motivos. Los estados, los préstamos abiertos y la deuda de
+        todos los miembros se leen con una sola consulta (campos almacenados), y solo
+        si la política tiene alguna regla que lo requiera.
+
+        La consulta bloquea las filas de los miembros (`FOR NO KEY UPDATE`, en orden de
+        id) hasta el final de la transacción: dos puestos que prestan a la vez al mismo
+        miembro se comprueban uno detrás de otro, y el segundo ve los préstamos y la
+        deuda que ha dejado el primero, así que no pueden superar juntos los límites.
+        El bloqueo no impide leer al miembro ni crear registros que lo referencien.
+        """
+        compilada = self._compilar()
+        nuevos = {miembro_id: cantidad for miembro_id, cantidad in nuevos.items() if miembro_id and cantidad}
+        if not compilada or not nuevos:
+            return
+        max_prestamos, max_deuda, bloqueados, _dias, _generos = compilada
+        if not (max_prestamos or max_deuda or bloqueados):
+            return
+        self.env['biblioteca.miembro'].flush_model(['name', 'estado', 'prestamos_activos', 'deuda_total'])
+        self.env.cr.execute("""
+            SELECT id, name, estado, COALESCE(prestamos_activos, 0), COALESCE(deuda_total, 0)
+              FROM biblioteca_miembro
+             WHERE id = ANY(%s)
+          ORDER BY id
+               FOR NO KEY UPDATE
+        """, [list(nuevos)])
+        rechazos = []
+        for miembro_id, nombre, estado, activos, deuda in self.env.cr.fetchall():
+            motivos = []
+            if estado in bloqueados:
+                motivos.append(_("membresía en estado '%s'", estado))
+            if max_prestamos and activos + nuevos[miembro_id] > max_prestamos:
+                motivos.append(_("%(activos)s préstamos activos y %(nuevos)s nuevos superan el máximo de %(maximo)s",
+                                 activos=activos, nuevos=nuevos[miembro_id], maximo=max_prestamos))
+            if max_deuda and deuda > max_deuda:
+                motivos.append(_("deuda de %(deuda).2f superior a %(maximo).2f", deuda=deuda, maximo=max_deuda))
+            if motivos:
+                rechazos.append("%s: %s" % (nombre, "; ".join(motivos)))
+        if rechazos:
+            raise UserError(_("No se puede prestar a los siguientes miembros:\n%s", "\n".join(rechazos)))
+
+class PoliticaGenero(models.Model):
+    """
+    Días de préstamo de un género dentro de una política.
+    """
+    _name = 'biblioteca.politica.genero'
+    _description = 'Días de Préstamo por Género'
+
+    politica_id = fields.Many2one('biblioteca.politica', string='Política', required=True, ondelete='cascade')
+    genero = fields.Selection(selection=lambda self: self.env['biblioteca.libro']._fields['genero'].selection, string='Género', required=True)
+    dias_prestamo = fields.Integer(string='Días de Préstamo', required=True, default=15)
+
+    _sql_constraints = [
+        ('genero_uniq', 'unique(politica_id, genero)', 'Cada género solo puede tener una regla por política.'),
+        ('dias_positivos', 'CHECK(dias_prestamo > 0)', 'Los días de préstamo deben ser mayores que cero.'),
+    ]
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        lineas = super().create(vals_list)
+        self.env.registry.clear_cache()
+        return lineas
+
+    def write(self, vals):
+        res = super().write(vals)
+        self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env.registry.clear_cache()
+        return res
@@ -1,5 +1,13 @@
-from odoo import models, fields, api
+from odoo import models, fields, api, tools, _
+from odoo.exceptions import UserError
+from odoo.tools import float_is_zero
+from collections import Counter, defaultdict
 from datetime import timedelta
+import logging
+
+from .instrumentacion import instrumentado
+
+_logger = logging.getLogger(__name__)
 
 class Prestamo(models.Model):
     """
@@ -12,26 +20,56 @@ class Prestamo(models.Model):
     _order = 'fecha_prestamo desc'  # Ordena los registros por fecha de préstamo, del más reciente al más antiguo.
 
     # ==================== CAMPOS DEL MODELO ====================
-    name = fields.Char(string='Referencia', default='Nuevo', readonly=True, help="Identificador único y secuencial del préstamo.")
-    libro_id = fields.Many2one('biblioteca.libro', string='Libro', required=True, help="Libro que se está prestando.")
-    miembro_id = fields.Many2one('biblioteca.miembro', string='Miembro', required=True, help="Miembro que solicita el préstamo.")
+    name = fields.Char(string='Referencia', default='Nuevo', readonly=True, index=True, help="Identificador único y secuencial del préstamo.")
+    libro_id = fields.Many2one('biblioteca.libro', string='Libro', required=True, index=True, help="Libro que se está prestando.")
+    ejemplar_id = fields.Many2one('biblioteca.ejemplar', string='Ejemplar', index=True, help="Ejemplar físico prestado. Si el título tiene ejemplares y no se indica, se asigna uno disponible.")
+    miembro_id = fields.Many2one('biblioteca.miembro', string='Miembro', required=True, index=True, help="Miembro que solicita el préstamo.")
 
     email = fields.Char(string='Email', readonly=True, help="Email del miembro (se copia automáticamente).")
     telefono = fields.Char(string='Teléfono', readonly=True, help="Teléfono del miembro (se copia automáticamente).")
 
-    fecha_prestamo = fields.Datetime(string='Fecha de Préstamo', default=fields.Datetime.now, required=True, help="Fecha y hora en que se realiza el préstamo.")
-    fecha_devolucion = fields.Datetime(string='Fecha Devolución', compute='_compute_fecha_devolucion', store=True, readonly=True, help="Fecha límite para devolver el libro sin incurrir en multas.")
+    fecha_prestamo = fields.Datetime(string='Fecha de Préstamo', default=fields.Datetime.now, required=True, index=True, help="Fecha y hora en que se realiza el préstamo.")
+    fecha_devolucion = fields.Datetime(string='Fecha Devolución', compute='_compute_fecha_devolucion', store=True, readonly=True, index=True, help="Fecha límite para devolver el libro sin incurrir en multas.")
 
     estado = fields.Selection([
         ('prestado', 'Prestado'),
         ('devuelto', 'Devuelto'),
         ('atrasado', 'Atrasado'),
-    ], string='Estado', default='prestado', help="Estado actual del préstamo.")
+    ], string='Estado', default='prestado', index=True, help="Estado actual del préstamo.")
 
-    dias_prestamo = fields.Integer(string='Días de Préstamo', default=15, help="Número de días acordados para el préstamo.")
+    dias_prestamo = fields.Integer(string='Días de Préstamo', default=15, help="Número de días acordados para el préstamo. Si no se indica, se toman de la política de préstamos según el género del libro.")
 
     monto = fields.Float(string='Monto del Préstamo', readonly=True, help="Costo del préstamo (se copia desde el libro).")
     multa = fields.Float(string='Multa Total', readonly=True, help="Multa total acumulada por días de atraso.")
+    dias_atraso = fields.Integer(string='Días de Atraso', readonly=True, default=0, help="Días de atraso calculados en la última revisión de préstamos vencidos.")
+
+    # Último aviso incluido en un resumen de `biblioteca.aviso`, para no repetirlo en cada ejecución.
+    tipo_aviso = fields.Selection([
+        ('vencimiento', 'Próximo a vencer'),
+        ('atraso', 'Atrasado'),
+    ], string='Último Aviso', readonly=True, copy=False, help="Tipo del último aviso enviado al miembro por este préstamo.")
+    fecha_aviso = fields.Datetime(string='Fecha del Aviso', readonly=True, copy=False, help="Momento en que se generó el último aviso de este préstamo.")
+
+    def init(self):
+        """
+        Crea los índices compuestos que no se pueden declarar en los campos:
+        - Índice parcial de préstamos abiertos ordenado por fecha de devolución,
+          usado por la revisión de atrasos y los filtros de vencidos.
+        - Historiales por miembro y por libro ordenados como la vista de lista (`_order`).
+        """
+        tools.create_index(
+            self.env.cr, 'biblioteca_prestamo_abiertos_idx', self._table,
+            ['fecha_devolucion', 'id'],
+            where="estado IN ('prestado', 'atrasado')",
+        )
+        tools.create_index(
+            self.env.cr, 'biblioteca_prestamo_miembro_fecha_idx', self._table,
+            ['miembro_id', 'fecha_prestamo DESC'],
+        )
+        tools.create_index(
+            self.env.cr, 'biblioteca_prestamo_libro_fecha_idx', self._table,
+            ['libro_id', 'fecha_prestamo DESC'],
+        )
 
     # ==================== MÉTODOS DE CÁLCULO ====================
     @api.depends('fecha_prestamo', 'dias_prestamo')
@@ -65,46 +103,476 @@ class Prestamo(models.Model):
         if self.libro_id:
             self.monto = self.libro_id.monto
             self.multa = 0.0
+            self.dias_prestamo = self.env['biblioteca.politica']._dias_prestamo([self.libro_id.genero])[self.libro_id.genero]
+        if self.ejemplar_id.libro_id != self.libro_id:
+            self.ejemplar_id = False
+
+    @api.onchange('ejemplar_id')
+    def _onchange_ejemplar_id(self):
+        """
+        Cuando se selecciona un ejemplar, el préstamo toma su título.
+        """
+        if self.ejemplar_id:
+            self.libro_id = self.ejemplar_id.libro_id
 
     # ==================== MÉTODOS CRUD (Create, Read, Update, Delete) ====================
+    @api.model_create_multi
+    @instrumentado
+    def create(self, vals_list):
+        """
+        Se sobrescribe el método 'create' para añadir lógica de negocio adicional.
+        Acepta una lista de valores y procesa todo el lote de una vez:
+        1. Reserva en bloque los números de secuencia ('name') de los préstamos nuevos.
+        2. Lee de una sola vez los libros y miembros referenciados para copiar
+           monto, email y teléfono cuando no se proporcionan.
+        3. Asigna y bloquea los ejemplares de los préstamos abiertos (o el libro,
+           si el título no tiene ejemplares) y los marca como 'prestado' con una única escritura.
+
+        El coste por lote es constante en número de consultas (secuencia, lectura de
+        libros y miembros, INSERT y UPDATE de libros), por lo que una importación
+        masiva debe enviarse en lotes de cientos o miles de préstamos por llamada
+        en lugar de registro a registro.
+        """
+        # Los préstamos de un ejemplar concreto toman el título del ejemplar.
+        ejemplares = self.env['biblioteca.ejemplar'].browse({vals['ejemplar_id'] for vals in vals_list if vals.get('ejemplar_id')})
+        for vals in vals_list:
+            if vals.get('ejemplar_id') and not vals.get('libro_id'):
+                vals['libro_id'] = ejemplares.browse(vals['ejemplar_id']).libro_id.id
+
+        sin_nombre = [vals for vals in vals_list if vals.get('name', 'Nuevo') == 'Nuevo']
+        for vals, nombre in zip(sin_nombre, self._reservar_referencias(len(sin_nombre))):
+            vals['name'] = nombre
+
+        libros = self.env['biblioteca.libro'].browse({vals['libro_id'] for vals in vals_list if vals.get('libro_id')})
+        miembros = self.env['biblioteca.miembro'].browse({vals['miembro_id'] for vals in vals_list if vals.get('miembro_id')})
+        # Carga los campos necesarios de todos los registros en una consulta por modelo.
+        libros.fetch(['monto', 'genero'])
+        miembros.fetch(['email', 'telefono'])
+        # Días de préstamo por género según la política de préstamos (compilada y en caché).
+        dias_por_genero = self.env['biblioteca.politica']._dias_prestamo(set(libros.mapped('genero')))
+        for vals in vals_list:
+            if vals.get('libro_id') and 'monto' not in vals:
+                vals['monto'] = libros.browse(vals['libro_id']).monto
+            if vals.get('libro_id') and 'dias_prestamo' not in vals:
+                vals['dias_prestamo'] = dias_por_genero[libros.browse(vals['libro_id']).genero]
+            if vals.get('miembro_id'):
+                miembro = miembros.browse(vals['miembro_id'])
+                vals.setdefault('email', miembro.email)
+                vals.setdefault('telefono', miembro.telefono)
+
+        abiertos = [vals for vals in vals_list if vals.get('estado', 'prestado') in ('prestado', 'atrasado')]
+        # Los miembros del lote deben poder llevarse los libros según la política (una consulta para todo el lote).
+        if not self.env.context.get('biblioteca_elegibilidad_comprobada'):
+            self.env['biblioteca.politica']._comprobar_elegibilidad(Counter(vals.get('miembro_id') for vals in abiertos))
+
+        # Los préstamos de un miembro con una reserva asignada se llevan el ejemplar que tiene apartado.
+        reservas = self.env['biblioteca.reserva']._tomar_reservas(abiertos)
+
+        # Asigna y bloquea los ejemplares del resto de préstamos abiertos para evitar prestar dos veces el mismo ejemplar.
+        self._asignar_ejemplares([vals for indice, vals in enumerate(abiertos) if indice not in reservas])
+
+        # Llama al método 'create' original para crear los registros en la base de datos.
+        prestamos = super().create(vals_list)
+
+        if reservas:
+            posiciones = {id(vals): posicion for posicion, vals in enumerate(vals_list)}
+            self.env['biblioteca.reserva']._completar({
+                reserva_id: prestamos[posiciones[id(abiertos[indice])]].id
+                for indice, reserva_id in reservas.items()
+            })
+
+        # Marca como prestados todos los ejemplares (o libros sin ejemplares) del lote con una sola escritura.
+        prestamos.filtered(lambda p: p.estado in ('prestado', 'atrasado'))._marcar_estado_fisico('prestado')
+
+        # Las multas con las que se crean los préstamos (por ejemplo, al importarlos) pasan al libro de multas.
+        self._registrar_multas([(p.id, p.miembro_id.id, p.name, p.multa) for p in prestamos if p.multa])
+
+        return prestamos
+
+    def write(self, vals):
+        """
+        Se sobrescribe el método 'write' para llevar al libro de multas la variación
+        de la multa de cada préstamo (o su traspaso si cambia el miembro).
+        """
+        if 'multa' not in vals and 'miembro_id' not in vals:
+            return super().write(vals)
+        anteriores = {p.id: (p.miembro_id.id, p.multa) for p in self}
+        resultado = super().write(vals)
+        cambios = []
+        for prestamo in self:
+            miembro_anterior, multa_anterior = anteriores[prestamo.id]
+            if miembro_anterior != prestamo.miembro_id.id:
+                cambios.append((prestamo.id, miembro_anterior, prestamo.name, -multa_anterior))
+                multa_anterior = 0.0
+            cambios.append((prestamo.id, prestamo.miembro_id.id, prestamo.name, prestamo.multa - multa_anterior))
+        self._registrar_multas(cambios)
+        return resultado
+
+    def unlink(self):
+        """
+        Al eliminar un préstamo con multa se anula su multa en el libro de multas.
+        """
+        self._registrar_multas(
+            [(False, p.miembro_id.id, p.name, -p.multa) for p in self if p.multa],
+            tipo='ajuste', nota=_("Préstamo eliminado"),
+        )
+        return super().unlink()
+
+    @api.model
+    def _registrar_multas(self, cambios, tipo='multa', nota=False):
+        """
+        Registra en el libro de multas, con una sola creación para todo el lote,
+        los cambios de multa `cambios`: tuplas (prestamo_id, miembro_id, referencia, importe).
+        Los importes nulos se descartan.
+        """
+        vals_list = [
+            {
+                'prestamo_id': prestamo_id,
+                'miembro_id': miembro_id,
+                'referencia': referencia,
+                'tipo': tipo,
+                'importe': importe,
+                'nota': nota,
+            }
+            for prestamo_id, miembro_id, referencia, importe in cambios
+            if miembro_id and not float_is_zero(importe or 0.0, precision_digits=2)
+        ]
+        if vals_list:
+            self.env['biblioteca.movimiento.multa'].sudo().create(vals_list)
+
+    @api.model
+    def _asignar_ejemplares(self, vals_list):
+        """
+        Prepara los préstamos abiertos de un lote para que no se preste dos veces nada:
+        - Si se indica el ejemplar, bloquea su fila y comprueba que está disponible.
+        - Si el título tiene ejemplares, reclama uno disponible por préstamo con
+          `SKIP LOCKED` (los que otro puesto está prestando se saltan) y lo añade a `vals`.
+        - Si el título no tiene ejemplares, bloquea la fila del libro y comprueba su estado.
+        Los bloqueos duran hasta el final de la transacción. Si otro puesto modifica
+        la misma fila a la vez, PostgreSQL aborta una de las dos transacciones, que
+        al reintentarse ya ve el libro prestado y falla en lugar de duplicar el préstamo.
+        """
+        con_ejemplar = [vals['ejemplar_id'] for vals in vals_list if vals.get('ejemplar_id')]
+        if len(set(con_ejemplar)) != len(con_ejemplar):
+            raise UserError(_("No se puede prestar el mismo ejemplar dos veces en la misma operación."))
+        if con_ejemplar:
+            self.env['biblioteca.ejemplar'].flush_model(['estado', 'active'])
+            self.env.cr.execute("""
+                SELECT id, estado = 'disponible' AND active
+                  FROM biblioteca_ejemplar
+                 WHERE id = ANY(%s)
+                   FOR UPDATE
+            """, [con_ejemplar])
+            ocupados = [ejemplar_id for ejemplar_id, disponible in self.env.cr.fetchall() if not disponible]
+            if ocupados:
+                nombres = self.env['biblioteca.ejemplar'].browse(ocupados).mapped('name')
+                raise UserError(_("Los siguientes ejemplares no están disponibles: %s", ", ".join(nombres)))
+
+        sin_ejemplar = [vals for vals in vals_list if vals.get('libro_id') and not vals.get('ejemplar_id')]
+        if not sin_ejemplar:
+            return
+        libro_ids = list({vals['libro_id'] for vals in sin_ejemplar})
+        self.env['biblioteca.libro'].flush_model(['estado', 'ejemplares_total'])
+        self.env.cr.execute("SELECT id FROM biblioteca_libro WHERE id = ANY(%s) AND ejemplares_total > 0", [libro_ids])
+        titulos_con_ejemplares = {fila[0] for fila in self.env.cr.fetchall()}
+
+        cantidades = defaultdict(int)
+        for vals in sin_ejemplar:
+            if vals['libro_id'] in titulos_con_ejemplares:
+                cantidades[vals['libro_id']] += 1
+        reclamados = self._reclamar_ejemplares(cantidades)
+        faltan = [libro_id for libro_id, cantidad in cantidades.items() if len(reclamados[libro_id]) < cantidad]
+        if faltan:
+            nombres = self.env['biblioteca.libro'].browse(faltan).mapped('name')
+            raise UserError(_("No quedan ejemplares disponibles de: %s", ", ".join(nombres)))
+        for vals in sin_ejemplar:
+            if vals['libro_id'] in titulos_con_ejemplares:
+                vals['ejemplar_id'] = reclamados[vals['libro_id']].pop()
+
+        # Títulos sin ejemplares: el propio libro es la unidad que se presta.
+        libros_sueltos = [vals['libro_id'] for vals in sin_ejemplar if vals['libro_id'] not in titulos_con_ejemplares]
+        if not libros_sueltos:
+            return
+        if len(set(libros_sueltos)) != len(libros_sueltos):
+            raise UserError(_("No se puede prestar el mismo libro dos veces en la misma operación."))
+        self.env.cr.execute("""
+            SELECT id, estado = 'disponible'
+              FROM biblioteca_libro
+             WHERE id = ANY(%s)
+               FOR UPDATE
+        """, [libros_sueltos])
+        ocupados = [libro_id for libro_id, disponible in self.env.cr.fetchall() if not disponible]
+        if ocupados:
+            nombres = self.env['biblioteca.libro'].browse(ocupados).mapped('name')
+            raise UserError(_("Los siguientes libros no están disponibles: %s", ", ".join(nombres)))
+
     @api.model
-    def create(self, vals):
+    def _reclamar_ejemplares(self, cantidades):
+        """
+        Reclama, para cada título de `cantidades` ({libro_id: n}), hasta n ejemplares
+        disponibles con `FOR UPDATE SKIP LOCKED`, en una única consulta.
+        Devuelve {libro_id: [ejemplar_id, ...]}.
+        """
+        reclamados = defaultdict(list)
+        if not cantidades:
+            return reclamados
+        self.env['biblioteca.ejemplar'].flush_model(['estado', 'active', 'libro_id'])
+        self.env.cr.execute("""
+            SELECT e.libro_id, e.id
+              FROM unnest(%s::int[], %s::int[]) AS t(libro_id, cantidad)
+        CROSS JOIN LATERAL (
+                SELECT id, libro_id
+                  FROM biblioteca_ejemplar
+                 WHERE libro_id = t.libro_id AND estado = 'disponible' AND active
+              ORDER BY id
+                 LIMIT t.cantidad
+                   FOR UPDATE SKIP LOCKED
+            ) e
+        """, [list(cantidades), list(cantidades.values())])
+        for libro_id, ejemplar_id in self.env.cr.fetchall():
+            reclamados[libro_id].append(ejemplar_id)
+        return reclamados
+
+    def _liberar_fisico(self):
         """
-        Se sobrescribe el método 'create' para añadir lógica de negocio adicional:
-        1. Asigna un número de secuencia único ('name') al nuevo préstamo.
-        2. Actualiza el estado del libro a 'prestado' para que no pueda ser prestado por otra persona.
+        Lo devuelto en estos préstamos se aparta para la primera reserva en espera
+        de su título (ver `biblioteca.reserva`); lo que nadie espera vuelve a estar disponible.
         """
-        # Genera una secuencia única si no se proporciona una.
-        if vals.get('name', 'Nuevo') == 'Nuevo':
-            vals['name'] = self.env['ir.sequence'].next_by_code('biblioteca.prestamo.sequence') or 'Nuevo'
+        unidades = [(prestamo.libro_id.id, prestamo.ejemplar_id.id) for prestamo in self]
+        apartadas = self.env['biblioteca.reserva']._asignar_siguientes(unidades)
+        self.filtered(lambda p: (p.libro_id.id, p.ejemplar_id.id) not in apartadas)._marcar_estado_fisico('disponible')
 
-        # Llama al método 'create' original para crear el registro en la base de datos.
-        prestamo = super().create(vals)
+    def _marcar_estado_fisico(self, estado):
+        """
+        Cambia el estado de lo que se ha prestado físicamente en estos préstamos:
+        el ejemplar, si lo hay, o el libro en los títulos sin ejemplares.
+        Se hace una única escritura por modelo para todo el lote.
+        """
+        con_ejemplar = self.filtered('ejemplar_id')
+        con_ejemplar.ejemplar_id.filtered(lambda e: e.estado != estado).write({'estado': estado})
+        (self - con_ejemplar).libro_id.filtered(lambda l: l.estado != estado).write({'estado': estado})
 
-        # Cambia el estado del libro a 'prestado'.
-        if prestamo.libro_id:
-            prestamo.libro_id.estado = 'prestado'
+    @api.model
+    def _reservar_referencias(self, cantidad, codigo='biblioteca.prestamo.sequence'):
+        """
+        Devuelve `cantidad` referencias consecutivas de la secuencia `codigo`
+        (por defecto, la de préstamos; los ejemplares la usan con la suya).
+        Con la implementación estándar de `ir.sequence` se piden todos los valores
+        a PostgreSQL en una sola consulta; en cualquier otro caso (sin huecos o con
+        rangos de fechas) se recurre a `next_by_code` para cada referencia.
+        """
+        if not cantidad:
+            return []
+        secuencia = self.env['ir.sequence'].search([
+            ('code', '=', codigo),
+            ('company_id', 'in', [self.env.company.id, False]),
+        ], order='company_id', limit=1)
+        if not secuencia:
+            return ['Nuevo'] * cantidad
+        if secuencia.implementation != 'standard' or secuencia.use_date_range:
+            return [secuencia._next() for _ in range(cantidad)]
+        self.env.cr.execute(
+            "SELECT nextval(%s) FROM generate_series(1, %s)",
+            ['ir_sequence_%03d' % secuencia.id, cantidad],
+        )
+        return [secuencia.get_next_char(numero) for (numero,) in self.env.cr.fetchall()]
 
-        return prestamo
+    # ==================== PRÉSTAMO EN LOTE ====================
+    @api.model
+    def prestar_libros(self, miembro_id, libro_ids, dias_prestamo=None):
+        """
+        Presta a un miembro un lote de libros de forma atómica y segura frente a
+        varios puestos trabajando a la vez.
+
+        Por cada título se reclama un ejemplar disponible (o el libro, si el título
+        no tiene ejemplares) con `FOR UPDATE SKIP LOCKED`: las filas
+        que otro puesto ya tiene bloqueadas se saltan en lugar de esperar. Prestar
+        un ejemplar no escribe en la fila del título (ver
+        `biblioteca.libro._ajustar_ejemplares`), así que dos puestos que prestan
+        ejemplares distintos del mismo título no se bloquean entre sí. Solo se
+        espera por la fila del miembro, que se bloquea para aplicar la política.
+        Si otro puesto confirma el préstamo de un ejemplar después de empezar esta
+        transacción, PostgreSQL la aborta con un error de serialización y el
+        servidor la reintenta, igual que cualquier otra petición.
+        Devuelve una lista con un resultado por libro solicitado:
+        {'libro_id': id, 'resultado': 'prestado' | 'en_uso' | 'no_disponible', 'prestamo_id': id | False}
+        - 'prestado': se ha creado el préstamo.
+        - 'en_uso': otro puesto está prestando el último ejemplar libre en este momento.
+        - 'no_disponible': el libro no existe, está archivado o no le quedan ejemplares libres.
+        """
+        libro_ids = list(dict.fromkeys(libro_ids))
+        if not libro_ids:
+            return []
+        # La política se comprueba antes de reclamar ejemplares, con todos los libros solicitados.
+        self.env['biblioteca.politica']._comprobar_elegibilidad({miembro_id: len(libro_ids)})
+        # Los títulos que el miembro tiene reservados y apartados se prestan con lo apartado (ver `create`).
+        self.env['biblioteca.reserva'].flush_model(['miembro_id', 'libro_id', 'estado'])
+        self.env.cr.execute("""
+            SELECT libro_id FROM biblioteca_reserva
+             WHERE miembro_id = %s AND libro_id = ANY(%s) AND estado = 'asignada'
+        """, [miembro_id, libro_ids])
+        reservados = {fila[0] for fila in self.env.cr.fetchall()}
+        por_reclamar = [libro_id for libro_id in libro_ids if libro_id not in reservados]
+        # Un ejemplar libre por título; en los títulos sin ejemplares se reclama el propio libro.
+        ejemplares = self._reclamar_ejemplares(dict.fromkeys(por_reclamar, 1))
+        self.env['biblioteca.libro'].flush_model(['estado', 'active', 'ejemplares_total'])
+        self.env.cr.execute("""
+            SELECT id FROM biblioteca_libro
+             WHERE id = ANY(%s) AND estado = 'disponible' AND active AND ejemplares_total = 0
+               FOR UPDATE SKIP LOCKED
+        """, [por_reclamar])
+        libros_sueltos = {fila[0] for fila in self.env.cr.fetchall()}
+
+        vals_list = []
+        for libro_id in libro_ids:
+            if ejemplares[libro_id] or libro_id in libros_sueltos or libro_id in reservados:
+                vals = {'libro_id': libro_id, 'miembro_id': miembro_id}
+                if ejemplares[libro_id]:
+                    vals['ejemplar_id'] = ejemplares[libro_id][0]
+                if dias_prestamo:
+                    vals['dias_prestamo'] = dias_prestamo
+                vals_list.append(vals)
+        prestamos = self.with_context(biblioteca_elegibilidad_comprobada=True).create(vals_list)
+        prestamo_por_libro = {prestamo.libro_id.id: prestamo.id for prestamo in prestamos}
+
+        # Entre los no reclamados, los que aún tienen algo disponible están bloqueados por otro puesto.
+        en_uso = set()
+        restantes = [libro_id for libro_id in libro_ids if libro_id not in prestamo_por_libro]
+        if restantes:
+            en_uso = set(self.env['biblioteca.libro'].browse(restantes)._con_disponibles().ids)
+
+        resultados = []
+        for libro_id in libro_ids:
+            if libro_id in prestamo_por_libro:
+                resultado = 'prestado'
+            elif libro_id in en_uso:
+                resultado = 'en_uso'
+            else:
+                resultado = 'no_disponible'
+            resultados.append({
+                'libro_id': libro_id,
+                'resultado': resultado,
+                'prestamo_id': prestamo_por_libro.get(libro_id, False),
+            })
+        return resultados
+
+    # ==================== DEVOLUCIÓN EN LOTE ====================
+    @api.model
+    @instrumentado
+    def devolver_prestamos(self, codigos):
+        """
+        Devuelve de una vez los préstamos identificados por `codigos`, tal como
+        llegan de un lector de códigos de barras o de una lista pegada: cada código
+        puede ser la referencia del préstamo o el código del ejemplar prestado.
+
+        Todos los códigos se resuelven con una única consulta y todos los préstamos
+        se cierran con un único UPDATE que, en la misma pasada, calcula los días de
+        atraso y la multa de los devueltos fuera de plazo (igual que
+        `action_calcular_multa`). Después se liberan los ejemplares o libros con
+        una escritura por modelo.
+        Devuelve una lista con un resultado por código:
+        {'codigo': str, 'resultado': 'devuelto' | 'ya_devuelto' | 'no_encontrado' | 'duplicado',
+         'prestamo_id': id | False, 'dias_atraso': int, 'multa': float}
+        """
+        codigos = [codigo.strip() for codigo in codigos if codigo and codigo.strip()]
+        if not codigos:
+            return []
+        self.env.flush_all()
+        # Por código, el préstamo con esa referencia o el préstamo abierto de ese ejemplar.
+        self.env.cr.execute("""
+            SELECT t.codigo, p.id, p.estado
+              FROM unnest(%s::varchar[]) AS t(codigo)
+        CROSS JOIN LATERAL (
+                SELECT id, estado FROM biblioteca_prestamo WHERE name = t.codigo
+                 UNION ALL
+                SELECT p.id, p.estado
+                  FROM biblioteca_ejemplar e
+                  JOIN biblioteca_prestamo p ON p.ejemplar_id = e.id
+                 WHERE e.name = t.codigo AND p.estado IN ('prestado', 'atrasado')
+                 LIMIT 1
+            ) p
+        """, [list(set(codigos))])
+        encontrados = {codigo: (prestamo_id, estado) for codigo, prestamo_id, estado in self.env.cr.fetchall()}
+
+        abiertos = {
+            prestamo_id for prestamo_id, estado in encontrados.values()
+            if estado in ('prestado', 'atrasado')
+        }
+        devueltos = {}
+        if abiertos:
+            self.env.cr.execute("""
+                WITH cerrar AS (
+                    SELECT p.id, COALESCE(p.multa, 0) AS multa_anterior,
+                           CASE WHEN p.fecha_devolucion < %(ahora)s
+                                THEN FLOOR(EXTRACT(EPOCH FROM %(ahora)s - p.fecha_devolucion) / 86400)::int
+                           END AS dias
+                      FROM biblioteca_prestamo p
+                     WHERE p.id = ANY(%(ids)s) AND p.estado IN ('prestado', 'atrasado')
+                       FOR UPDATE
+                )
+                UPDATE biblioteca_prestamo p
+                   SET estado = 'devuelto',
+                       dias_atraso = COALESCE(cerrar.dias, p.dias_atraso),
+                       multa = CASE WHEN cerrar.dias IS NOT NULL
+                                    THEN cerrar.dias * COALESCE(l.multa, 0)
+                                    ELSE p.multa END,
+                       write_uid = %(uid)s,
+                       write_date = %(ahora)s
+                  FROM cerrar, biblioteca_libro l
+                 WHERE p.id = cerrar.id
+                   AND l.id = p.libro_id
+             RETURNING p.id, p.dias_atraso, p.multa, p.miembro_id, p.name, p.multa - cerrar.multa_anterior
+            """, {'ahora': fields.Datetime.now(), 'ids': list(abiertos), 'uid': self.env.uid})
+            filas = self.env.cr.fetchall()
+            devueltos = {fila[0]: (fila[1], fila[2]) for fila in filas}
+            prestamos = self.browse(list(devueltos))
+            # Los valores se han escrito por SQL: se invalida la caché y se
+            # notifican los cambios para que se recalculen los totales de los miembros.
+            prestamos.invalidate_recordset(['estado', 'dias_atraso', 'multa', 'write_uid', 'write_date'])
+            prestamos.modified(['estado', 'dias_atraso', 'multa'])
+            prestamos._liberar_fisico()
+            self._registrar_multas([(fila[0], fila[3], fila[4], fila[5]) for fila in filas])
+
+        resultados = []
+        vistos = set()
+        for codigo in codigos:
+            prestamo_id, _estado = encontrados.get(codigo, (False, False))
+            dias, multa = devueltos.get(prestamo_id, (0, 0.0))
+            if not prestamo_id:
+                resultado = 'no_encontrado'
+            elif prestamo_id in vistos:
+                resultado = 'duplicado'
+            elif prestamo_id in devueltos:
+                resultado = 'devuelto'
+            else:
+                resultado = 'ya_devuelto'
+            vistos.add(prestamo_id)
+            resultados.append({
+                'codigo': codigo,
+                'resultado': resultado,
+                'prestamo_id': prestamo_id,
+                'dias_atraso': dias if resultado == 'devuelto' else 0,
+                'multa': multa if resultado == 'devuelto' else 0.0,
+            })
+        return resultados
 
     # ==================== MÉTODOS DE ACCIÓN (Botones) ====================
+    @instrumentado
     def action_devolver_libro(self):
         """
-        Acción ejecutada al intentar devolver un libro.
-        Verifica si la devolución se realiza fuera de plazo para cambiar el estado a 'atrasado'.
-        Si se devuelve a tiempo, el estado del libro vuelve a 'disponible'.
+        Acción ejecutada al devolver un libro.
+        Si la devolución se realiza fuera de plazo, calcula antes la multa correspondiente.
+        En ambos casos el préstamo queda 'devuelto' y el libro vuelve a estar 'disponible'.
         """
         self.ensure_one()
         hoy = fields.Datetime.now()
 
         if hoy > self.fecha_devolucion:
-            self.estado = 'atrasado'
-            self.libro_id.estado = 'disponible' # Aunque esté atrasado, ya está disponible
             self.action_calcular_multa() # Calcula la multa correspondiente.
-        else:
-            self.estado = 'devuelto'
-            self.libro_id.estado = 'disponible'
+        self.estado = 'devuelto'
+        self._liberar_fisico()
 
+    @instrumentado
     def action_calcular_multa(self):
         """
         Calcula la multa basándose en los días de atraso y el costo de multa diario del libro.
@@ -114,8 +582,10 @@ class Prestamo(models.Model):
         if self.fecha_devolucion and fields.Datetime.now() > self.fecha_devolucion:
             dias_atraso = (fields.Datetime.now() - self.fecha_devolucion).days
             multa_dia = self.libro_id.multa or 0.0
+            self.dias_atraso = dias_atraso
             self.multa = dias_atraso * multa_dia
 
+    @instrumentado
     def action_entregado(self):
         """
         Acción final que marca el préstamo como 'devuelto' y el libro como 'disponible'.
@@ -123,5 +593,64 @@ class Prestamo(models.Model):
         """
         self.ensure_one()
         self.estado = 'devuelto'
-        if self.libro_id:
-            self.libro_id.estado = 'disponible'
+        self._liberar_fisico()
+
+    # ==================== TAREAS PROGRAMADAS ====================
+    @api.model
+    def _cron_actualizar_atrasos(self, tamano_lote=1000, auto_commit=False):
+        """
+        Revisión nocturna de préstamos vencidos.
+        Busca los préstamos abiertos cuya fecha de devolución ya pasó y actualiza,
+        por lotes y con sentencias SQL de conjunto, los días de atraso, la multa,
+        el estado del préstamo ('atrasado') y el del ejemplar o libro prestado.
+
+        Solo se procesan los préstamos cuyo estado o número de días de atraso ha
+        cambiado desde la última ejecución, por lo que una ejecución diaria solo
+        toca una fila por préstamo vencido. Con `auto_commit` se confirma cada lote
+        para no mantener bloqueos largos cuando hay muchos atrasos acumulados.
+        """
+        ahora = fields.Datetime.now()
+        total = 0
+        self.env.flush_all()
+        while True:
+            self.env.cr.execute("""
+                WITH pendientes AS (
+                    SELECT p.id, COALESCE(p.multa, 0) AS multa_anterior,
+                           FLOOR(EXTRACT(EPOCH FROM %(ahora)s - p.fecha_devolucion) / 86400)::int AS dias
+                      FROM biblioteca_prestamo p
+                     WHERE p.estado IN ('prestado', 'atrasado')
+                       AND p.fecha_devolucion < %(ahora)s
+                       AND (p.estado != 'atrasado'
+                            OR p.dias_atraso IS DISTINCT FROM
+                               FLOOR(EXTRACT(EPOCH FROM %(ahora)s - p.fecha_devolucion) / 86400)::int)
+                     LIMIT %(limite)s
+                       FOR UPDATE OF p SKIP LOCKED
+                )
+                UPDATE biblioteca_prestamo p
+                   SET estado = 'atrasado',
+                       dias_atraso = pendientes.dias,
+                       multa = pendientes.dias * COALESCE(l.multa, 0),
+                       write_uid = %(uid)s,
+                       write_date = %(ahora)s
+                  FROM pendientes, biblioteca_libro l
+                 WHERE p.id = pendientes.id
+                   AND l.id = p.libro_id
+             RETURNING p.id, p.miembro_id, p.name, p.multa - pendientes.multa_anterior
+            """, {'ahora': ahora, 'limite': tamano_lote, 'uid': self.env.uid})
+            filas = self.env.cr.fetchall()
+            if not filas:
+                break
+            prestamos = self.browse([fila[0] for fila in filas])
+            # Los valores se han escrito por SQL: se invalida la caché y se
+            # notifican los cambios para que se recalculen los totales de los miembros.
+            prestamos.invalidate_recordset(['estado', 'dias_atraso', 'multa', 'write_uid', 'write_date'])
+            prestamos.modified(['estado', 'dias_atraso', 'multa'])
+            prestamos._marcar_estado_fisico('atrasado')
+            # La variación de multa de cada préstamo se registra en el libro de multas.
+            self._registrar_multas(filas)
+            self.env.flush_all()
+            total += len(filas)
+            if auto_commit:
+                self.env.cr.commit()
+        _logger.info("Revisión de atrasos: %s préstamos actualizados", total)
+        return total
@@ -0,0 +1,90 @@
+from odoo import models, fields, api
+from odoo.tools import SQL
+import logging
+
+_logger = logging.getLogger(__name__)
+
+class PrestamoHistorico(models.Model):
+    """
+    Clase que almacena los préstamos cerrados antiguos.
+    Los préstamos devueltos con más antigüedad que la configurada se mueven desde
+    `biblioteca.prestamo` a este modelo, de modo que la tabla de préstamos en uso
+    solo contiene la actividad reciente. Los totales de miembros y libros y los
+    reportes tienen en cuenta ambos modelos.
+    """
+    _name = 'biblioteca.prestamo.historico'
+    _description = 'Préstamo Archivado'
+    _order = 'fecha_prestamo desc'
+
+    # Parámetro del sistema con la antigüedad (en días) a partir de la cual se archivan los préstamos.
+    _parametro_dias = 'biblioteca.dias_archivo_prestamos'
+    _dias_por_defecto = 730
+
+    # ==================== CAMPOS DEL MODELO ====================
+    # Mismos campos que `biblioteca.prestamo`; el `id` se conserva al archivar.
+    name = fields.Char(string='Referencia', readonly=True, index=True)
+    libro_id = fields.Many2one('biblioteca.libro', string='Libro', required=True, readonly=True, index=True)
+    ejemplar_id = fields.Many2one('biblioteca.ejemplar', string='Ejemplar', readonly=True, index=True)
+    miembro_id = fields.Many2one('biblioteca.miembro', string='Miembro', required=True, readonly=True, index=True)
+    email = fields.Char(string='Email', readonly=True)
+    telefono = fields.Char(string='Teléfono', readonly=True)
+    fecha_prestamo = fields.Datetime(string='Fecha de Préstamo', required=True, readonly=True, index=True)
+    fecha_devolucion = fields.Datetime(string='Fecha Devolución', readonly=True)
+    estado = fields.Selection(selection=lambda self: self.env['biblioteca.prestamo']._fields['estado'].selection, string='Estado', readonly=True)
+    dias_prestamo = fields.Integer(string='Días de Préstamo', readonly=True)
+    dias_atraso = fields.Integer(string='Días de Atraso', readonly=True)
+    monto = fields.Float(string='Monto del Préstamo', readonly=True)
+    multa = fields.Float(string='Multa Total', readonly=True)
+    fecha_archivo = fields.Datetime(string='Fecha de Archivo', readonly=True, help="Momento en que el préstamo se movió al archivo.")
+
+    # ==================== TAREAS PROGRAMADAS ====================
+    @api.model
+    def _cron_archivar_prestamos(self, tamano_lote=5000, auto_commit=False):
+        """
+        Mueve al archivo los préstamos devueltos cuya fecha de préstamo es anterior
+        a la antigüedad configurada en el parámetro `biblioteca.dias_archivo_prestamos`.
+
+        Cada lote se mueve con una sola sentencia (DELETE ... RETURNING encadenado a
+        un INSERT) que bloquea solo las filas del lote y salta las que están en uso.
+        Con `auto_commit` se confirma cada lote: si la tarea se interrumpe, la
+        siguiente ejecución continúa donde se quedó, porque lo ya movido deja de
+        cumplir el criterio.
+        """
+        dias = int(self.env['ir.config_parameter'].sudo().get_param(self._parametro_dias, self._dias_por_defecto))
+        limite = fields.Datetime.subtract(fields.Datetime.now(), days=dias)
+        Prestamo = self.env['biblioteca.prestamo']
+        columnas = [
+            nombre for nombre, campo in self._fields.items()
+            if campo.store and campo.column_type and nombre in Prestamo._fields
+        ]
+        lista = SQL(", ").join(SQL.identifier(nombre) for nombre in columnas)
+        total = 0
+        self.env.flush_all()
+        while True:
+            self.env.cr.execute(SQL("""
+                WITH movidos AS (
+                    DELETE FROM biblioteca_prestamo
+                     WHERE id IN (
+                        SELECT id
+                          FROM biblioteca_prestamo
+                         WHERE estado = 'devuelto' AND fecha_prestamo < %(limite)s
+                      ORDER BY id
+                         LIMIT %(tamano)s
+                           FOR UPDATE SKIP LOCKED
+                     )
+                 RETURNING %(lista)s
+                )
+                INSERT INTO biblioteca_prestamo_historico (%(lista)s, fecha_archivo)
+                SELECT %(lista)s, %(ahora)s FROM movidos
+                RETURNING id
+            """, limite=limite, tamano=tamano_lote, lista=lista, ahora=fields.Datetime.now()))
+            movidos = [fila[0] for fila in self.env.cr.fetchall()]
+            if not movidos:
+                break
+            # Las filas se han borrado por SQL: se descartan de la caché.
+            Prestamo.invalidate_model()
+            total += len(movidos)
+            if auto_commit:
+                self.env.cr.commit()
+        _logger.info("Archivo de préstamos: %s préstamos archivados", total)
+        return total
@@ -0,0 +1,235 @@
+from odoo import models, fields, api, tools
+import logging
+
+_logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    np = sparse = None
+
+class Recomendacion(models.Model):
+    """
+    Clase que almacena, para cada título, los K títulos que más se prestan junto
+    a él ("quienes lo prestaron también prestaron...").
+
+    Dos títulos coinciden cuando un mismo miembro ha prestado ambos. La tarea
+    programada lee solo los préstamos nuevos desde la ejecución anterior, calcula
+    con NumPy/SciPy la variación de la matriz dispersa de coincidencias y la
+    acumula en `biblioteca_recomendacion_par`; después recalcula los K vecinos
+    de los títulos afectados. Consultar las recomendaciones de un título es una
+    sola lectura sobre el índice (libro_id, posicion).
+    """
+    _name = 'biblioteca.recomendacion'
+    _description = 'Recomendación de Libro'
+    _order = 'libro_id, posicion'
+    _log_access = False
+
+    # Parámetros del sistema: vecinos guardados por título, último préstamo procesado
+    # y última anotación de la secuencia de préstamos (ver `_frontera_segura`).
+    _parametro_vecinos = 'biblioteca.recomendaciones_vecinos'
+    _vecinos_por_defecto = 10
+    _parametro_ultimo = 'biblioteca.recomendaciones_ultimo_prestamo'
+    _parametro_frontera = 'biblioteca.recomendaciones_frontera'
+
+    # ==================== CAMPOS DE LA RECOMENDACIÓN ====================
+    libro_id = fields.Many2one('biblioteca.libro', string='Libro', required=True, readonly=True, ondelete='cascade', help="Título para el que se recomienda.")
+    relacionado_id = fields.Many2one('biblioteca.libro', string='También Prestado', required=True, readonly=True, ondelete='cascade', help="Título prestado por los mismos miembros.")
+    posicion = fields.Integer(string='Posición', readonly=True, help="Orden de la recomendación (1 es la más relevante).")
+    puntuacion = fields.Float(string='Afinidad', readonly=True, digits=(4, 3), help="Coincidencias normalizadas por la popularidad de ambos títulos (similitud del coseno).")
+    veces = fields.Integer(string='Miembros en Común', readonly=True, help="Miembros que han prestado ambos títulos.")
+
+    def init(self):
+        """
+        Crea el índice de lectura de las recomendaciones y la tabla de coincidencias
+        acumuladas. La tabla guarda ambos sentidos de cada par y, en la diagonal
+        (libro_id = relacionado_id), el número de miembros distintos que han prestado el título.
+        """
+        tools.create_index(self.env.cr, 'biblioteca_recomendacion_libro_posicion_idx', self._table, ['libro_id', 'posicion'])
+        self.env.cr.execute("""
+            CREATE TABLE IF NOT EXISTS biblioteca_recomendacion_par (
+                libro_id integer NOT NULL REFERENCES biblioteca_libro(id) ON DELETE CASCADE,
+                relacionado_id integer NOT NULL REFERENCES biblioteca_libro(id) ON DELETE CASCADE,
+                veces integer NOT NULL,
+                PRIMARY KEY (libro_id, relacionado_id)
+            )
+        """)
+
+    # ==================== CONSULTA ====================
+    @api.model
+    def _vecinos(self, libro_id):
+        """
+        Devuelve las recomendaciones de un título como lista de diccionarios
+        {id, name, afinidad}, con una sola consulta sobre el índice (libro_id, posicion).
+        """
+        self.env.cr.execute("""
+            SELECT l.id, l.name, r.puntuacion
+              FROM biblioteca_recomendacion r
+              JOIN biblioteca_libro l ON l.id = r.relacionado_id
+             WHERE r.libro_id = %s AND l.active
+          ORDER BY r.posicion
+        """, [libro_id])
+        return [{'id': id_, 'name': name, 'afinidad': puntuacion} for id_, name, puntuacion in self.env.cr.fetchall()]
+
+    # ==================== TAREAS PROGRAMADAS ====================
+    @api.model
+    def _cron_actualizar_recomendaciones(self, tamano_lote=50000, auto_commit=False, margen_minutos=60):
+        """
+        Procesa, por lotes y en orden de id, los préstamos (en uso y archivados)
+        posteriores al último procesado y anteriores a la frontera segura (ver
+        `_frontera_segura`), acumula sus coincidencias y recalcula los vecinos de
+        los títulos afectados. Con `auto_commit` se confirma cada lote junto con
+        el último préstamo procesado, así que la tarea es reanudable.
+        Requiere NumPy y SciPy; sin ellos no hace nada y lo avisa en el registro.
+        """
+        if sparse is None:
+            _logger.warning("Recomendaciones: NumPy y SciPy no están instalados, no se actualizan.")
+            return 0
+        parametros = self.env['ir.config_parameter'].sudo()
+        ultimo = int(parametros.get_param(self._parametro_ultimo, 0))
+        frontera = self._frontera_segura(ultimo, margen_minutos)
+        total = 0
+        self.env.flush_all()
+        while True:
+            self.env.cr.execute("""
+                SELECT id, miembro_id, libro_id FROM (
+                    SELECT id, miembro_id, libro_id FROM biblioteca_prestamo WHERE id > %(ultimo)s AND id <= %(frontera)s
+                    UNION ALL
+                    SELECT id, miembro_id, libro_id FROM biblioteca_prestamo_historico WHERE id > %(ultimo)s AND id <= %(frontera)s
+                ) p
+              ORDER BY id
+                 LIMIT %(limite)s
+            """, {'ultimo': ultimo, 'frontera': frontera, 'limite': tamano_lote})
+            filas = self.env.cr.fetchall()
+            if not filas:
+                break
+            nuevos = np.array([(miembro_id, libro_id) for _id, miembro_id, libro_id in filas], dtype=np.int64)
+            afectados = self._acumular_coincidencias(nuevos, ultimo)
+            self._recalcular_vecinos(afectados)
+            ultimo = filas[-1][0]
+            parametros.set_param(self._parametro_ultimo, ultimo)
+            total += len(filas)
+            if auto_commit:
+                self.env.cr.commit()
+        if total:
+            self.env['biblioteca.libro']._invalidar_catalogo()
+        _logger.info("Recomendaciones: %s préstamos nuevos procesados", total)
+        return total
+
+    @api.model
+    def _frontera_segura(self, ultimo, margen_minutos):
+        """
+        Devuelve el mayor id de préstamo que se puede procesar sin saltarse ninguno.
+
+        Los ids se asignan al insertar, no al confirmar: un préstamo insertado por
+        una transacción larga puede confirmarse después de que la tarea haya pasado
+        de su id, y no se contaría nunca. Por eso cada ejecución anota la hora y el
+        último id asignado por la secuencia de préstamos, y solo se procesa hasta
+        una anotación con al menos `margen_minutos` de antigüedad: para entonces
+        todas las transacciones que pudieran tener un id menor han terminado,
+        siempre que ninguna dure más que el margen (las peticiones y tareas de Odoo
+        tienen límites de tiempo muy inferiores). Con la tarea diaria, los préstamos
+        se procesan en la ejecución siguiente a la que los anota. Con margen 0 se
+        procesa todo lo que se ve, como en las pruebas.
+        """
+        self.env.cr.execute("SELECT last_value FROM biblioteca_prestamo_id_seq")
+        actual = self.env.cr.fetchone()[0]
+        if not margen_minutos:
+            return actual
+        parametros = self.env['ir.config_parameter'].sudo()
+        ahora = fields.Datetime.now()
+        frontera = ultimo
+        anotacion = parametros.get_param(self._parametro_frontera)
+        if anotacion:
+            fecha, valor = anotacion.split('|')
+            if fields.Datetime.to_datetime(fecha) > fields.Datetime.subtract(ahora, minutes=margen_minutos):
+                # La anotación aún es reciente: se conserva y no se procesa nada nuevo.
+                return ultimo
+            frontera = int(valor)
+        parametros.set_param(self._parametro_frontera, '%s|%s' % (fields.Datetime.to_string(ahora), actual))
+        return max(frontera, ultimo)
+
+    @api.model
+    def _acumular_coincidencias(self, nuevos, ultimo):
+        """
+        Suma a `biblioteca_recomendacion_par` las coincidencias que aportan los
+        pares (miembro_id, libro_id) de `nuevos`, préstamos posteriores a `ultimo`.
+
+        Con O la matriz miembro × título de lo que ya se había procesado y D la de
+        los títulos que cada miembro presta por primera vez, la matriz de
+        coincidencias pasa de OᵀO a (O + D)ᵀ(O + D), así que la variación es
+        DᵀO + OᵀD + DᵀD: solo intervienen los miembros con préstamos nuevos.
+        Devuelve la lista de títulos cuyas coincidencias han cambiado.
+        """
+        miembros = np.unique(nuevos[:, 0])
+        self.env.cr.execute("""
+            SELECT DISTINCT miembro_id, libro_id FROM (
+                SELECT miembro_id, libro_id FROM biblioteca_prestamo WHERE miembro_id = ANY(%(miembros)s) AND id <= %(ultimo)s
+                UNION ALL
+                SELECT miembro_id, libro_id FROM biblioteca_prestamo_historico WHERE miembro_id = ANY(%(miembros)s) AND id <= %(ultimo)s
+            ) p
+        """, {'miembros': miembros.tolist(), 'ultimo': ultimo})
+        anteriores = np.array(self.env.cr.fetchall(), dtype=np.int64).reshape(-1, 2)
+
+        # Índices compactos de miembros y títulos para las matrices.
+        libros, indices = np.unique(np.concatenate([anteriores[:, 1], nuevos[:, 1]]), return_inverse=True)
+        filas = np.searchsorted(miembros, np.concatenate([anteriores[:, 0], nuevos[:, 0]]))
+        forma = (len(miembros), len(libros))
+        n = len(anteriores)
+        O = sparse.csr_matrix((np.ones(n, dtype=np.int32), (filas[:n], indices[:n])), shape=forma)
+        D = sparse.csr_matrix((np.ones(len(nuevos), dtype=np.int32), (filas[n:], indices[n:])), shape=forma)
+        # Binarias: un título prestado varias veces por el mismo miembro cuenta una vez.
+        D.data[:] = 1
+        D = D - D.multiply(O)
+        D.eliminate_zeros()
+        cruce = D.T @ O
+        variacion = (cruce + cruce.T + D.T @ D).tocoo()
+        if not variacion.nnz:
+            return []
+
+        self.env.cr.execute("""
+            INSERT INTO biblioteca_recomendacion_par AS p (libro_id, relacionado_id, veces)
+            SELECT * FROM unnest(%s::int[], %s::int[], %s::int[])
+            ON CONFLICT (libro_id, relacionado_id) DO UPDATE SET veces = p.veces + EXCLUDED.veces
+        """, [libros[variacion.row].tolist(), libros[variacion.col].tolist(), variacion.data.tolist()])
+        return libros[np.unique(variacion.row)].tolist()
+
+    @api.model
+    def _recalcular_vecinos(self, libro_ids):
+        """
+        Sustituye los K vecinos de los títulos indicados por los de mayor afinidad
+        según las coincidencias acumuladas, con un DELETE y un INSERT ... SELECT.
+        """
+        if not libro_ids:
+            return
+        vecinos = int(self.env['ir.config_parameter'].sudo().get_param(self._parametro_vecinos, self._vecinos_por_defecto))
+        self.env.cr.execute("DELETE FROM biblioteca_recomendacion WHERE libro_id = ANY(%s)", [libro_ids])
+        self.env.cr.execute("""
+            INSERT INTO biblioteca_recomendacion (libro_id, relacionado_id, posicion, puntuacion, veces)
+            SELECT libro_id, relacionado_id, posicion, puntuacion, veces FROM (
+                SELECT p.libro_id, p.relacionado_id, p.veces,
+                       p.veces / sqrt(a.veces::float8 * b.veces) AS puntuacion,
+                       row_number() OVER (
+                           PARTITION BY p.libro_id
+                           ORDER BY p.veces / sqrt(a.veces::float8 * b.veces) DESC, p.veces DESC, p.relacionado_id
+                       ) AS posicion
+                  FROM biblioteca_recomendacion_par p
+                  JOIN biblioteca_recomendacion_par a ON a.libro_id = p.libro_id AND a.relacionado_id = p.libro_id
+                  JOIN biblioteca_recomendacion_par b ON b.libro_id = p.relacionado_id AND b.relacionado_id = p.relacionado_id
+                 WHERE p.libro_id = ANY(%s) AND p.relacionado_id <> p.libro_id
+            ) t
+             WHERE posicion <= %s
+        """, [libro_ids, vecinos])
+        self.invalidate_model()
+        self.env['biblioteca.libro'].browse(libro_ids).invalidate_recordset(['recomendacion_ids'])
+
+    @api.model
+    def _reiniciar_recomendaciones(self):
+        """
+        Borra las coincidencias y las recomendaciones y vuelve a procesar todo el
+        historial. Útil si se eliminan préstamos o cambia el número de vecinos.
+        """
+        self.env.cr.execute("TRUNCATE biblioteca_recomendacion_par, biblioteca_recomendacion")
+        self.env['ir.config_parameter'].sudo().set_param(self._parametro_ultimo, 0)
+        return self._cron_actualizar_recomendaciones()
@@ -0,0 +1,163 @@
+from odoo import models, fields, api
+from odoo.tools import SQL
+import logging
+
+_logger = logging.getLogger(__name__)
+
+class ReporteMaterializado(models.AbstractModel):
+    """
+    Base común de los reportes de la biblioteca.
+    Cada reporte es una vista materializada de PostgreSQL que agrega los préstamos
+    en uso y los archivados (`_prestamos`): los tableros consultan
+    datos ya agregados en lugar de recorrer la tabla de préstamos en vivo, y la
+    tarea programada los reconstruye con `REFRESH MATERIALIZED VIEW CONCURRENTLY`,
+    que no bloquea las lecturas mientras se recalcula.
+    """
+    _name = 'biblioteca.reporte.materializado'
+    _description = 'Reporte Materializado de la Biblioteca'
+    _auto = False
+
+    # Modelos de reporte que refresca la tarea programada.
+    _reportes = ['biblioteca.reporte.prestamo', 'biblioteca.reporte.miembro']
+
+    # Préstamos en uso y archivados, con las columnas que usan los reportes.
+    _prestamos = """
+        SELECT id, libro_id, miembro_id, fecha_prestamo, estado, dias_atraso, monto, multa FROM biblioteca_prestamo
+        UNION ALL
+        SELECT id, libro_id, miembro_id, fecha_prestamo, estado, dias_atraso, monto, multa FROM biblioteca_prestamo_historico
+    """
+
+    def _query(self):
+        """
+        Devuelve la consulta SQL que define el reporte. Debe incluir una columna
+        `id` única, necesaria para el refresco concurrente.
+        """
+        raise NotImplementedError()
+
+    def init(self):
+        """
+        (Re)crea la vista materializada con su índice único sobre `id`.
+        Se ejecuta al instalar o actualizar el módulo.
+        """
+        if self._abstract:
+            return
+        self.env.cr.execute(f"DROP MATERIALIZED VIEW IF EXISTS {self._table} CASCADE")
+        self.env.cr.execute(f"CREATE MATERIALIZED VIEW {self._table} AS ({self._query()})")
+        self.env.cr.execute(f"CREATE UNIQUE INDEX {self._table}_id_idx ON {self._table} (id)")
+
+    def _refrescar(self):
+        """
+        Reconstruye la vista materializada sin bloquear a quien la está consultando.
+        """
+        self.env.flush_all()
+        self.env.cr.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {self._table}")
+        self.invalidate_model()
+
+    @api.model
+    def _cron_refrescar_reportes(self):
+        """
+        Tarea programada que refresca todos los reportes de la biblioteca.
+        """
+        for nombre in self._reportes:
+            self.env[nombre]._refrescar()
+            _logger.info("Reporte %s refrescado", nombre)
+
+
+class ReportePrestamo(models.Model):
+    """
+    Estadísticas de préstamos agregadas por día y libro: número de préstamos,
+    atrasos, devoluciones y recaudación (monto del préstamo más multas).
+    Permite analizar por fecha, género y autor sin consultar la tabla de préstamos.
+    """
+    _name = 'biblioteca.reporte.prestamo'
+    _inherit = 'biblioteca.reporte.materializado'
+    _description = 'Estadísticas de Préstamos'
+    _auto = False
+    _order = 'fecha desc'
+
+    # ==================== CAMPOS DEL REPORTE ====================
+    fecha = fields.Date(string='Fecha', readonly=True)
+    libro_id = fields.Many2one('biblioteca.libro', string='Libro', readonly=True)
+    autor_id = fields.Many2one('biblioteca.autor', string='Autor', readonly=True)
+    genero = fields.Selection(selection=lambda self: self.env['biblioteca.libro']._fields['genero'].selection, string='Género', readonly=True)
+    cantidad = fields.Integer(string='Préstamos', readonly=True)
+    atrasados = fields.Integer(string='Atrasados', readonly=True, help="Préstamos vencidos o devueltos fuera de plazo.")
+    devueltos = fields.Integer(string='Devueltos', readonly=True)
+    tasa_atraso = fields.Float(string='Tasa de Atraso (%)', readonly=True, aggregator='avg', help="Porcentaje de préstamos atrasados; al agrupar se calcula con los totales de atrasados y préstamos del grupo.")
+    monto = fields.Float(string='Monto', readonly=True)
+    multa = fields.Float(string='Multas', readonly=True)
+    ingresos = fields.Float(string='Ingresos', readonly=True, help="Monto de los préstamos más las multas.")
+
+    def _query(self):
+        return f"""
+            SELECT MIN(p.id) AS id,
+                   p.fecha_prestamo::date AS fecha,
+                   p.libro_id,
+                   l.autor_id,
+                   l.genero,
+                   COUNT(*) AS cantidad,
+                   COUNT(*) FILTER (WHERE p.estado = 'atrasado' OR p.dias_atraso > 0) AS atrasados,
+                   COUNT(*) FILTER (WHERE p.estado = 'devuelto') AS devueltos,
+                   100.0 * COUNT(*) FILTER (WHERE p.estado = 'atrasado' OR p.dias_atraso > 0) / COUNT(*) AS tasa_atraso,
+                   COALESCE(SUM(p.monto), 0) AS monto,
+                   COALESCE(SUM(p.multa), 0) AS multa,
+                   COALESCE(SUM(p.monto), 0) + COALESCE(SUM(p.multa), 0) AS ingresos
+              FROM ({self._prestamos}) p
+              JOIN biblioteca_libro l ON l.id = p.libro_id
+          GROUP BY p.fecha_prestamo::date, p.libro_id, l.autor_id, l.genero
+        """
+
+    def _read_group_select(self, aggregate_spec, query):
+        """
+        La tasa de atraso de un grupo (por mes, género, autor...) no es el promedio
+        de las tasas de cada día y libro, que pesarían igual con uno o con cien
+        préstamos: se calcula con la suma de atrasados entre la suma de préstamos.
+        """
+        if aggregate_spec != 'tasa_atraso:avg':
+            return super()._read_group_select(aggregate_spec, query)
+        return SQL(
+            "100.0 * SUM(%(atrasados)s) / NULLIF(SUM(%(cantidad)s), 0)",
+            atrasados=self._field_to_sql(self._table, 'atrasados', query),
+            cantidad=self._field_to_sql(self._table, 'cantidad', query),
+        )
+
+
+class ReporteMiembro(models.Model):
+    """
+    Resumen de actividad por miembro: préstamos totales, activos y atrasados,
+    recaudación y fecha del último préstamo. Ordenado por número de préstamos
+    para mostrar los miembros más activos.
+    """
+    _name = 'biblioteca.reporte.miembro'
+    _inherit = 'biblioteca.reporte.materializado'
+    _description = 'Estadísticas por Miembro'
+    _auto = False
+    _order = 'cantidad desc'
+
+    # ==================== CAMPOS DEL REPORTE ====================
+    miembro_id = fields.Many2one('biblioteca.miembro', string='Miembro', readonly=True)
+    estado = fields.Selection(selection=lambda self: self.env['biblioteca.miembro']._fields['estado'].selection, string='Estado de Membresía', readonly=True)
+    cantidad = fields.Integer(string='Préstamos', readonly=True)
+    activos = fields.Integer(string='Activos', readonly=True)
+    atrasados = fields.Integer(string='Atrasados', readonly=True)
+    monto = fields.Float(string='Monto', readonly=True)
+    multa = fields.Float(string='Multas', readonly=True)
+    ingresos = fields.Float(string='Ingresos', readonly=True)
+    ultimo_prestamo = fields.Datetime(string='Último Préstamo', readonly=True, aggregator='max')
+
+    def _query(self):
+        return f"""
+            SELECT p.miembro_id AS id,
+                   p.miembro_id,
+                   m.estado,
+                   COUNT(*) AS cantidad,
+                   COUNT(*) FILTER (WHERE p.estado IN ('prestado', 'atrasado')) AS activos,
+                   COUNT(*) FILTER (WHERE p.estado = 'atrasado' OR p.dias_atraso > 0) AS atrasados,
+                   COALESCE(SUM(p.monto), 0) AS monto,
+                   COALESCE(SUM(p.multa), 0) AS multa,
+                   COALESCE(SUM(p.monto), 0) + COALESCE(SUM(p.multa), 0) AS ingresos,
+                   MAX(p.fecha_prestamo) AS ultimo_prestamo
+              FROM ({self._prestamos}) p
+              JOIN biblioteca_miembro m ON m.id = p.miembro_id
+          GROUP BY p.miembro_id, m.estado
+        """
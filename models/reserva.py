@@ -0,0 +1,307 @@
+from odoo import models, fields, api, tools, _
+from odoo.exceptions import UserError
+from collections import Counter, defaultdict
+import logging
+
+_logger = logging.getLogger(__name__)
+
+class Reserva(models.Model):
+    """
+    Clase que representa la reserva de un título por parte de un miembro.
+    Las reservas en espera de cada título forman una cola por orden de llegada.
+    Cuando se devuelve un ejemplar (o un libro sin ejemplares), se aparta para la
+    primera reserva de la cola, que pasa a 'asignada' y tiene unos días para
+    recogerlo. Las asignaciones no recogidas a tiempo caducan con una tarea
+    programada y el ejemplar pasa a la siguiente reserva.
+    """
+    _name = 'biblioteca.reserva'
+    _description = 'Reserva de Libro'
+    _order = 'fecha_solicitud desc, id desc'
+
+    # Parámetro del sistema con los días que se guarda un ejemplar apartado.
+    _parametro_dias = 'biblioteca.dias_reserva'
+    _dias_por_defecto = 3
+
+    # ==================== CAMPOS DE LA RESERVA ====================
+    libro_id = fields.Many2one('biblioteca.libro', string='Libro', required=True, index=True, ondelete='cascade', help="Título reservado.")
+    miembro_id = fields.Many2one('biblioteca.miembro', string='Miembro', required=True, index=True, ondelete='cascade', help="Miembro que reserva el libro.")
+    fecha_solicitud = fields.Datetime(string='Fecha de Solicitud', default=fields.Datetime.now, required=True, readonly=True, help="Momento de la reserva; determina el orden en la cola.")
+    estado = fields.Selection([
+        ('espera', 'En Espera'),
+        ('asignada', 'Asignada'),
+        ('completada', 'Completada'),
+        ('cancelada', 'Cancelada'),
+        ('expirada', 'Expirada'),
+    ], string='Estado', default='espera', required=True, readonly=True, index=True, help="Estado de la reserva.")
+    ejemplar_id = fields.Many2one('biblioteca.ejemplar', string='Ejemplar Apartado', readonly=True, ondelete='set null', help="Ejemplar apartado para el miembro mientras la reserva está asignada.")
+    fecha_asignacion = fields.Datetime(string='Fecha de Asignación', readonly=True, help="Momento en que se apartó el ejemplar.")
+    fecha_limite = fields.Datetime(string='Recoger antes de', readonly=True, help="Fecha límite para recoger el ejemplar apartado.")
+    prestamo_id = fields.Many2one('biblioteca.prestamo', string='Préstamo', readonly=True, ondelete='set null', help="Préstamo con el que se completó la reserva.")
+    posicion = fields.Integer(string='Posición en la Cola', compute='_compute_posicion', help="Reservas por delante en la cola del título, más uno.")
+
+    def init(self):
+        """
+        Crea los índices parciales de la cola:
+        - Cola de cada título en orden de llegada, para tomar la primera reserva
+          con un recorrido de índice, sin ordenar ni recorrer toda la cola.
+        - Asignaciones pendientes por fecha límite, para la caducidad.
+        - Una sola reserva abierta por miembro y título.
+        """
+        tools.create_index(
+            self.env.cr, 'biblioteca_reserva_cola_idx', self._table,
+            ['libro_id', 'fecha_solicitud', 'id'],
+            where="estado = 'espera'",
+        )
+        tools.create_index(
+            self.env.cr, 'biblioteca_reserva_asignadas_idx', self._table,
+            ['fecha_limite', 'id'],
+            where="estado = 'asignada'",
+        )
+        self.env.cr.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS biblioteca_reserva_abierta_uniq
+                ON biblioteca_reserva (miembro_id, libro_id)
+             WHERE estado IN ('espera', 'asignada')
+        """)
+
+    @api.depends('libro_id', 'fecha_solicitud', 'estado')
+    def _compute_posicion(self):
+        """
+        Calcula la posición en la cola de las reservas en espera con una sola
+        consulta por lote, que cuenta sobre el índice de la cola.
+        """
+        en_espera = self.filtered(lambda r: r._origin.id and r.estado == 'espera')
+        posiciones = {}
+        if en_espera:
+            self.flush_model(['libro_id', 'fecha_solicitud', 'estado'])
+            self.env.cr.execute("""
+                SELECT r.id,
+                       (SELECT COUNT(*) FROM biblioteca_reserva c
+                         WHERE c.libro_id = r.libro_id AND c.estado = 'espera'
+                           AND (c.fecha_solicitud, c.id) <= (r.fecha_solicitud, r.id))
+                  FROM biblioteca_reserva r
+                 WHERE r.id = ANY(%s)
+            """, [en_espera._origin.ids])
+            posiciones = dict(self.env.cr.fetchall())
+        for reserva in self:
+            reserva.posicion = posiciones.get(reserva._origin.id, 0)
+
+    @api.depends('libro_id', 'miembro_id')
+    def _compute_display_name(self):
+        for reserva in self:
+            reserva.display_name = "%s - %s" % (reserva.libro_id.name or '', reserva.miembro_id.name or '')
+
+    # ==================== MÉTODOS CRUD (Create, Read, Update, Delete) ====================
+    @api.model_create_multi
+    def create(self, vals_list):
+        """
+        Comprueba para todo el lote, antes de crear las reservas:
+        - que el título no tenga nada disponible: basta con prestarlo;
+        - que el miembro no tenga ya una reserva abierta del mismo título (una consulta);
+        - que el miembro pueda llevarse libros según la política de préstamos,
+          contando cada reserva como un préstamo más.
+        """
+        libros = self.env['biblioteca.libro'].browse({vals['libro_id'] for vals in vals_list if vals.get('libro_id')})
+        disponibles = libros._con_disponibles()
+        if disponibles:
+            raise UserError(_("Los siguientes libros están disponibles y no necesitan reserva: %s", ", ".join(disponibles.mapped('name'))))
+        pares = [(vals.get('miembro_id'), vals.get('libro_id')) for vals in vals_list if vals.get('miembro_id') and vals.get('libro_id')]
+        if len(set(pares)) != len(pares):
+            raise UserError(_("No se puede reservar el mismo libro dos veces para el mismo miembro."))
+        if pares:
+            self.flush_model(['miembro_id', 'libro_id', 'estado'])
+            self.env.cr.execute("""
+                SELECT r.id
+                  FROM biblioteca_reserva r
+                  JOIN unnest(%s::int[], %s::int[]) AS t(miembro_id, libro_id)
+                    ON r.miembro_id = t.miembro_id AND r.libro_id = t.libro_id
+                 WHERE r.estado IN ('espera', 'asignada')
+            """, [[m for m, _l in pares], [l for _m, l in pares]])
+            abiertas = self.browse([fila[0] for fila in self.env.cr.fetchall()])
+            if abiertas:
+                raise UserError(_("Ya existe una reserva abierta de: %s", ", ".join(abiertas.mapped('display_name'))))
+        self.env['biblioteca.politica']._comprobar_elegibilidad(Counter(miembro_id for miembro_id, _libro_id in pares))
+        return super().create(vals_list)
+
+    # ==================== ASIGNACIÓN DE LA COLA ====================
+    @api.model
+    def _asignar_siguientes(self, unidades):
+        """
+        Aparta las unidades liberadas para las primeras reservas en espera de su título.
+        `unidades` es una lista de tuplas (libro_id, ejemplar_id), con ejemplar_id
+        False en los títulos sin ejemplares. Las primeras reservas de cada título
+        se toman con una única consulta (LATERAL ... LIMIT sobre el índice de la
+        cola, con `SKIP LOCKED`), así que el coste no depende de la longitud de la cola.
+        Las reservas de miembros cuya membresía bloquea la política se saltan y
+        siguen en espera. Devuelve el conjunto de unidades apartadas; el resto debe
+        quedar disponible.
+        """
+        por_libro = defaultdict(list)
+        for libro_id, ejemplar_id in unidades:
+            por_libro[libro_id].append(ejemplar_id)
+        if not por_libro:
+            return set()
+        self.flush_model(['libro_id', 'miembro_id', 'estado', 'fecha_solicitud'])
+        self.env['biblioteca.miembro'].flush_model(['estado'])
+        self.env.cr.execute("""
+            SELECT r.libro_id, r.id
+              FROM unnest(%s::int[], %s::int[]) AS t(libro_id, cantidad)
+        CROSS JOIN LATERAL (
+                SELECT id, libro_id
+                  FROM biblioteca_reserva c
+                 WHERE c.libro_id = t.libro_id AND c.estado = 'espera'
+                   AND NOT EXISTS (SELECT 1 FROM biblioteca_miembro m
+                                    WHERE m.id = c.miembro_id AND m.estado = ANY(%s))
+              ORDER BY c.fecha_solicitud, c.id
+                 LIMIT t.cantidad
+                   FOR UPDATE OF c SKIP LOCKED
+            ) r
+        """, [
+            list(por_libro), [len(ejemplares) for ejemplares in por_libro.values()],
+            self.env['biblioteca.politica']._estados_bloqueados(),
+        ])
+        asignaciones = []
+        for libro_id, reserva_id in self.env.cr.fetchall():
+            asignaciones.append((reserva_id, libro_id, por_libro[libro_id].pop(0)))
+        if not asignaciones:
+            return set()
+
+        ahora = fields.Datetime.now()
+        dias = int(self.env['ir.config_parameter'].sudo().get_param(self._parametro_dias, self._dias_por_defecto))
+        self.env.cr.execute("""
+            UPDATE biblioteca_reserva r
+               SET estado = 'asignada',
+                   ejemplar_id = NULLIF(t.ejemplar_id, 0),
+                   fecha_asignacion = %s,
+                   fecha_limite = %s,
+                   write_uid = %s,
+                   write_date = %s
+              FROM unnest(%s::int[], %s::int[]) AS t(id, ejemplar_id)
+             WHERE r.id = t.id
+        """, [
+            ahora, fields.Datetime.add(ahora, days=dias), self.env.uid, ahora,
+            [reserva_id for reserva_id, _libro_id, _ejemplar_id in asignaciones],
+            [ejemplar_id or 0 for _reserva_id, _libro_id, ejemplar_id in asignaciones],
+        ])
+        reservas = self.browse([reserva_id for reserva_id, _libro_id, _ejemplar_id in asignaciones])
+        reservas.invalidate_recordset(['estado', 'ejemplar_id', 'fecha_asignacion', 'fecha_limite', 'write_uid', 'write_date'])
+        reservas.modified(['estado', 'ejemplar_id'])
+
+        # Lo apartado queda 'reservado' con una escritura por modelo.
+        ejemplar_ids = [ejemplar_id for _reserva_id, _libro_id, ejemplar_id in asignaciones if ejemplar_id]
+        libro_ids = [libro_id for _reserva_id, libro_id, ejemplar_id in asignaciones if not ejemplar_id]
+        self.env['biblioteca.ejemplar'].browse(ejemplar_ids).write({'estado': 'reservado'})
+        self.env['biblioteca.libro'].browse(libro_ids).write({'estado': 'reservado'})
+        return {(libro_id, ejemplar_id) for _reserva_id, libro_id, ejemplar_id in asignaciones}
+
+    @api.model
+    def _tomar_reservas(self, vals_list):
+        """
+        Busca, con una sola consulta, las reservas asignadas a los miembros y títulos
+        de `vals_list` (valores de préstamos nuevos) y bloquea sus filas.
+        A cada préstamo con reserva le pone el ejemplar apartado.
+        Devuelve {índice en vals_list: reserva_id}.
+        """
+        pares = [(vals.get('miembro_id'), vals.get('libro_id')) for vals in vals_list]
+        pares_validos = [(m, l) for m, l in pares if m and l]
+        if not pares_validos:
+            return {}
+        self.flush_model(['miembro_id', 'libro_id', 'estado', 'ejemplar_id'])
+        self.env.cr.execute("""
+            SELECT r.id, r.miembro_id, r.libro_id, r.ejemplar_id
+              FROM biblioteca_reserva r
+              JOIN unnest(%s::int[], %s::int[]) AS t(miembro_id, libro_id)
+                ON r.miembro_id = t.miembro_id AND r.libro_id = t.libro_id
+             WHERE r.estado = 'asignada'
+               FOR UPDATE OF r
+        """, [[m for m, _l in pares_validos], [l for _m, l in pares_validos]])
+        reservas = {(miembro_id, libro_id): (reserva_id, ejemplar_id) for reserva_id, miembro_id, libro_id, ejemplar_id in self.env.cr.fetchall()}
+        tomadas = {}
+        for indice, (vals, par) in enumerate(zip(vals_list, pares)):
+            if par not in reservas:
+                continue
+            reserva_id, ejemplar_id = reservas.pop(par)
+            if vals.get('ejemplar_id') and vals['ejemplar_id'] != ejemplar_id:
+                # Se presta otro ejemplar: la reserva sigue guardando el suyo.
+                reservas[par] = (reserva_id, ejemplar_id)
+                continue
+            if ejemplar_id:
+                vals['ejemplar_id'] = ejemplar_id
+            tomadas[indice] = reserva_id
+        return tomadas
+
+    @api.model
+    def _completar(self, prestamo_por_reserva):
+        """
+        Marca como completadas las reservas de `prestamo_por_reserva`
+        ({reserva_id: prestamo_id}) con un único UPDATE.
+        """
+        if not prestamo_por_reserva:
+            return
+        ahora = fields.Datetime.now()
+        self.env.cr.execute("""
+            UPDATE biblioteca_reserva r
+               SET estado = 'completada', prestamo_id = t.prestamo_id, write_uid = %s, write_date = %s
+              FROM unnest(%s::int[], %s::int[]) AS t(id, prestamo_id)
+             WHERE r.id = t.id
+        """, [self.env.uid, ahora, list(prestamo_por_reserva), list(prestamo_por_reserva.values())])
+        reservas = self.browse(list(prestamo_por_reserva))
+        reservas.invalidate_recordset(['estado', 'prestamo_id', 'write_uid', 'write_date'])
+        reservas.modified(['estado', 'prestamo_id'])
+
+    def _liberar(self):
+        """
+        Libera lo apartado por estas reservas (caducadas o canceladas): pasa a la
+        siguiente reserva en espera del título o, si no hay, queda disponible.
+        """
+        unidades = [(reserva.libro_id.id, reserva.ejemplar_id.id) for reserva in self if reserva.libro_id]
+        asignadas = self._asignar_siguientes(unidades)
+        libres = [unidad for unidad in unidades if unidad not in asignadas]
+        self.env['biblioteca.ejemplar'].browse([e for _l, e in libres if e]).write({'estado': 'disponible'})
+        self.env['biblioteca.libro'].browse([l for l, e in libres if not e]).write({'estado': 'disponible'})
+
+    # ==================== MÉTODOS DE ACCIÓN (Botones) ====================
+    def action_cancelar(self):
+        """
+        Cancela las reservas abiertas. Si tenían un ejemplar apartado, pasa a la siguiente de la cola.
+        """
+        abiertas = self.filtered(lambda r: r.estado in ('espera', 'asignada'))
+        asignadas = abiertas.filtered(lambda r: r.estado == 'asignada')
+        abiertas.write({'estado': 'cancelada'})
+        asignadas._liberar()
+
+    # ==================== TAREAS PROGRAMADAS ====================
+    @api.model
+    def _cron_expirar_reservas(self, tamano_lote=1000, auto_commit=False):
+        """
+        Caduca, por lotes, las reservas asignadas cuya fecha límite ya pasó y pasa
+        lo que tenían apartado a la siguiente reserva de la cola (o lo deja disponible).
+        Cada lote se toma con el índice de asignadas y `SKIP LOCKED`; con
+        `auto_commit` se confirma cada lote.
+        """
+        total = 0
+        self.env.flush_all()
+        while True:
+            self.env.cr.execute("""
+                UPDATE biblioteca_reserva r
+                   SET estado = 'expirada', write_uid = %(uid)s, write_date = %(ahora)s
+                 WHERE r.id IN (
+                    SELECT id FROM biblioteca_reserva
+                     WHERE estado = 'asignada' AND fecha_limite < %(ahora)s
+                  ORDER BY fecha_limite, id
+                     LIMIT %(limite)s
+                       FOR UPDATE SKIP LOCKED
+                 )
+             RETURNING r.id
+            """, {'ahora': fields.Datetime.now(), 'limite': tamano_lote, 'uid': self.env.uid})
+            expiradas = self.browse([fila[0] for fila in self.env.cr.fetchall()])
+            if not expiradas:
+                break
+            expiradas.invalidate_recordset(['estado', 'write_uid', 'write_date'])
+            expiradas.modified(['estado'])
+            expiradas._liberar()
+            self.env.flush_all()
+            total += len(expiradas)
+            if auto_commit:
+                self.env.cr.commit()
+        _logger.info("Caducidad de reservas: %s reservas expiradas", total)
+        return total
@@ -0,0 +1,10 @@
+from . import test_rendimiento
+from . import test_concurrencia
+from . import test_multas
+from . import test_intercambio
+from . import test_reservas
+from . import test_catalogo
+from . import test_avisos
+from . import test_mantenimiento
+from . import test_politica
+from . import test_busqueda
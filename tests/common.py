@@ -0,0 +1,267 @@
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from odoo import fields
+from odoo.tests.common import TransactionCase
+
+# Variables de entorno que controlan la escala y los resultados del banco de pruebas.
+ENV_PRESTAMOS = 'BIBLIOTECA_BENCH_PRESTAMOS'
+ENV_SALIDA = 'BIBLIOTECA_BENCH_SALIDA'
+ENV_REFERENCIA = 'BIBLIOTECA_BENCH_REFERENCIA'
+ENV_TOLERANCIA = 'BIBLIOTECA_BENCH_TOLERANCIA'
+
+
+def guardar_resultados(clase, resultados):
+    """
+    Guarda los resultados de una clase de pruebas en el fichero JSON de salida,
+    sustituyendo los de una ejecución anterior de la misma clase.
+    """
+    salida = os.environ.get(ENV_SALIDA) or os.path.join(tempfile.gettempdir(), 'biblioteca_benchmark.json')
+    anteriores = []
+    if os.path.exists(salida):
+        with open(salida) as fichero:
+            anteriores = [r for r in json.load(fichero) if r['clase'] != clase]
+    with open(salida, 'w') as fichero:
+        json.dump(anteriores + resultados, fichero, indent=2)
+
+
+class GeneradorBiblioteca:
+    """
+    Generador de datos sintéticos para medir el rendimiento del módulo.
+    Rellena autores, libros (algunos con ejemplares), miembros y préstamos a la
+    escala indicada, entre diez mil y diez millones de préstamos.
+
+    Autores, libros, ejemplares y miembros se crean con el ORM en lotes, para
+    que se ejecute la misma lógica que en producción. El historial de préstamos
+    devueltos se inserta por SQL con `generate_series`, porque crear millones de
+    préstamos cerrados por el ORM no aporta nada a las mediciones. Los préstamos
+    abiertos se crean con `biblioteca.prestamo.create`, de modo que ejemplares,
+    libros y miembros quedan coherentes.
+    """
+
+    def __init__(self, env, prestamos=10000, tamano_lote=100000):
+        self.env = env
+        self.prestamos = prestamos
+        self.tamano_lote = tamano_lote
+        self.autores = env['biblioteca.autor']
+        self.libros = env['biblioteca.libro']
+        self.miembros = env['biblioteca.miembro']
+        self.abiertos = env['biblioteca.prestamo']
+
+    def generar(self):
+        """
+        Genera todos los datos y devuelve el propio generador para acceder a los registros creados.
+        """
+        num_autores = max(10, self.prestamos // 200)
+        num_libros = max(50, self.prestamos // 50)
+        num_miembros = max(50, self.prestamos // 20)
+        self.autores = self._crear_en_lotes('biblioteca.autor', [
+            {'name': 'Autor %s' % i, 'nacionalidad': 'País %s' % (i % 40)}
+            for i in range(num_autores)
+        ])
+        self.libros = self._crear_en_lotes('biblioteca.libro', [
+            {
+                'name': 'Libro %s' % i,
+                'autor_id': self.autores[i % num_autores].id,
+                'editorial': 'Editorial %s' % (i % 100),
+                'genero': ('ficcion', 'ciencia', 'historia', 'biografia', 'infantil', 'otros')[i % 6],
+                'monto': 1.0,
+                'multa': 0.5,
+                'descripcion': 'Descripción sintética del libro %s' % i,
+            }
+            for i in range(num_libros)
+        ])
+        # Uno de cada cuatro títulos tiene tres ejemplares físicos.
+        self._crear_en_lotes('biblioteca.ejemplar', [
+            {'name': 'BENCH-%s-%s' % (libro.id, n), 'libro_id': libro.id}
+            for libro in self.libros[::4]
+            for n in range(3)
+        ])
+        self.miembros = self._crear_en_lotes('biblioteca.miembro', [
+            {'name': 'Miembro %s' % i, 'dni': 'BENCH%08d' % i, 'email': 'miembro%s@example.com' % i}
+            for i in range(num_miembros)
+        ])
+        self._insertar_historial(self.prestamos - self._num_abiertos())
+        self._crear_abiertos(self._num_abiertos())
+        self._recalcular_miembros()
+        return self
+
+    def _num_abiertos(self):
+        # Como mucho un préstamo abierto por cada cuatro títulos, para que queden libros libres.
+        return min(self.prestamos // 100, len(self.libros) // 4, 5000)
+
+    def _crear_en_lotes(self, modelo, vals_list, tamano=1000):
+        ids = []
+        for inicio in range(0, len(vals_list), tamano):
+            ids += self.env[modelo].create(vals_list[inicio:inicio + tamano]).ids
+            self.env.flush_all()
+        return self.env[modelo].browse(ids)
+
+    def _insertar_historial(self, cantidad):
+        """
+        Inserta `cantidad` préstamos devueltos, repartidos en el último año y medio.
+        Uno de cada diez se devolvió con atraso y tiene multa.
+        """
+        uid = self.env.uid
+        ahora = fields.Datetime.now()
+        for inicio in range(1, cantidad + 1, self.tamano_lote):
+            fin = min(cantidad, inicio + self.tamano_lote - 1)
+            self.env.cr.execute("""
+                INSERT INTO biblioteca_prestamo
+                       (name, libro_id, miembro_id, fecha_prestamo, fecha_devolucion, dias_prestamo,
+                        dias_atraso, estado, monto, multa, create_uid, create_date, write_uid, write_date)
+                SELECT 'BENCH/' || g,
+                       (%(libros)s::int[])[1 + (g * 7919) %% %(num_libros)s],
+                       (%(miembros)s::int[])[1 + (g * 104729) %% %(num_miembros)s],
+                       %(ahora)s - make_interval(days => 30 + g %% 540),
+                       %(ahora)s - make_interval(days => 15 + g %% 540),
+                       15,
+                       CASE WHEN g %% 10 = 0 THEN 3 ELSE 0 END,
+                       'devuelto',
+                       1.0,
+                       CASE WHEN g %% 10 = 0 THEN 1.5 ELSE 0 END,
+                       %(uid)s, %(ahora)s, %(uid)s, %(ahora)s
+                  FROM generate_series(%(inicio)s, %(fin)s) g
+            """, {
+                'libros': self.libros.ids,
+                'num_libros': len(self.libros),
+                'miembros': self.miembros.ids,
+                'num_miembros': len(self.miembros),
+                'ahora': ahora,
+                'uid': uid,
+                'inicio': inicio,
+                'fin': fin,
+            })
+        self.env['biblioteca.prestamo'].invalidate_model()
+        # Las multas del historial pasan al libro de multas, como si se hubieran registrado al devolverse.
+        self.env.cr.execute("SELECT id FROM biblioteca_prestamo WHERE name LIKE 'BENCH/%' AND multa != 0")
+        deltas = self.env['biblioteca.movimiento.multa']._registrar_multas_existentes(
+            [fila[0] for fila in self.env.cr.fetchall()]
+        )
+        self.env['biblioteca.miembro']._sumar_deuda(deltas)
+
+    def _crear_abiertos(self, cantidad):
+        """
+        Crea préstamos abiertos con fechas de los últimos 40 días: los de más de
+        15 días están vencidos y los procesará la revisión de atrasos.
+        """
+        ahora = fields.Datetime.now()
+        vals_list = [
+            {
+                'libro_id': self.libros[i * 4 + 1].id,
+                'miembro_id': self.miembros[i % len(self.miembros)].id,
+                'fecha_prestamo': ahora - timedelta(days=i % 40),
+            }
+            for i in range(cantidad)
+        ]
+        self.abiertos = self._crear_en_lotes('biblioteca.prestamo', vals_list)
+
+    def _recalcular_miembros(self):
+        """
+        El historial insertado por SQL no dispara los recálculos del ORM: se
+        fuerza el total almacenado de préstamos activos de los miembros por lotes.
+        """
+        campo = self.env['biblioteca.miembro']._fields['prestamos_activos']
+        for inicio in range(0, len(self.miembros), 1000):
+            self.env.add_to_compute(campo, self.miembros[inicio:inicio + 1000])
+            self.env.flush_all()
+
+
+class BibliotecaCase(TransactionCase):
+    """
+    Caso base de las pruebas de comportamiento: un autor, tres libros sin
+    ejemplares, un libro con dos ejemplares y tres miembros activos.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.autor = cls.env['biblioteca.autor'].create({'name': 'Autor de Prueba'})
+        cls.libros = cls.env['biblioteca.libro'].create([
+            {'name': 'Libro de Prueba %s' % i, 'autor_id': cls.autor.id, 'genero': genero, 'monto': 2.0, 'multa': 1.0}
+            for i, genero in enumerate(('ficcion', 'ciencia', 'historia'))
+        ])
+        cls.libro_ejemplares = cls.env['biblioteca.libro'].create({
+            'name': 'Libro con Ejemplares', 'autor_id': cls.autor.id, 'monto': 2.0, 'multa': 1.0,
+        })
+        cls.ejemplares = cls.env['biblioteca.ejemplar'].create([
+            {'libro_id': cls.libro_ejemplares.id} for _n in range(2)
+        ])
+        cls.miembros = cls.env['biblioteca.miembro'].create([
+            {'name': 'Miembro de Prueba %s' % i, 'dni': 'PRUEBA%03d' % i, 'email': 'prueba%s@example.com' % i}
+            for i in range(3)
+        ])
+
+    def prestar(self, libro, miembro, dias_atras=0, **vals):
+        """
+        Crea un préstamo de `libro` a `miembro` hecho hace `dias_atras` días.
+        """
+        return self.env['biblioteca.prestamo'].create(dict(
+            vals, libro_id=libro.id, miembro_id=miembro.id,
+            fecha_prestamo=fields.Datetime.now() - timedelta(days=dias_atras),
+        ))
+
+
+class BibliotecaBenchmarkCase(TransactionCase):
+    """
+    Caso base del banco de pruebas de rendimiento. Genera los datos una vez por
+    clase y ofrece `medir()`, que cuenta las consultas SQL y el tiempo de cada
+    escenario, los compara con su presupuesto y los guarda en un fichero JSON.
+
+    - `BIBLIOTECA_BENCH_PRESTAMOS`: número de préstamos a generar (10000 por defecto).
+    - `BIBLIOTECA_BENCH_SALIDA`: fichero JSON de resultados.
+    - `BIBLIOTECA_BENCH_REFERENCIA`: JSON {escenario: {"consultas": n, "segundos": s}}
+      que sustituye a los presupuestos por defecto (por ejemplo, los de la última versión).
+    - `BIBLIOTECA_BENCH_TOLERANCIA`: margen sobre el presupuesto de tiempo (1.5 por defecto).
+    """
+
+    # {escenario: (consultas, segundos)}; las subclases definen sus presupuestos.
+    presupuestos = {}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.escala = int(os.environ.get(ENV_PRESTAMOS, 10000))
+        cls.datos = GeneradorBiblioteca(cls.env, prestamos=cls.escala).generar()
+        cls.resultados = []
+        cls.referencia = {}
+        if os.environ.get(ENV_REFERENCIA):
+            with open(os.environ[ENV_REFERENCIA]) as fichero:
+                cls.referencia = json.load(fichero)
+        cls.tolerancia = float(os.environ.get(ENV_TOLERANCIA, 1.5))
+
+    @classmethod
+    def tearDownClass(cls):
+        guardar_resultados(cls.__name__, cls.resultados)
+        super().tearDownClass()
+
+    @contextmanager
+    def medir(self, escenario, filas=0):
+        """
+        Mide un escenario y falla si supera su presupuesto de consultas o de tiempo.
+        """
+        self.env.flush_all()
+        self.env.invalidate_all()
+        consultas_inicio = self.env.cr.sql_log_count
+        inicio = time.perf_counter()
+        yield
+        self.env.flush_all()
+        segundos = time.perf_counter() - inicio
+        consultas = self.env.cr.sql_log_count - consultas_inicio
+        presupuesto = self.referencia.get(escenario) or dict(zip(('consultas', 'segundos'), self.presupuestos[escenario]))
+        self.resultados.append({
+            'clase': type(self).__name__,
+            'escenario': escenario,
+            'escala': self.escala,
+            'filas': filas,
+            'consultas': consultas,
+            'segundos': round(segundos, 4),
+            'presupuesto_consultas': presupuesto['consultas'],
+            'presupuesto_segundos': presupuesto['segundos'],
+        })
+        self.assertLessEqual(consultas, presupuesto['consultas'], "%s: demasiadas consultas SQL" % escenario)
+        self.assertLessEqual(segundos, presupuesto['segundos'] * self.tolerancia, "%s: tiempo por encima del presupuesto" % escenario)
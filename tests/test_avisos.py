@@ -0,0 +1,56 @@
+from odoo.tests import tagged
+
+from .common import BibliotecaCase
+
+
+@tagged('post_install', '-at_install')
+class TestAvisos(BibliotecaCase):
+    """
+    Avisos de préstamos: un resumen por miembro, sin reenvíos y con cuota por ejecución.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.env['ir.config_parameter'].sudo().set_param('biblioteca.avisos_salida', 'registro')
+        # 15 días de préstamo según la política general y aviso 2 días antes del vencimiento.
+        self.proximo = self.prestar(self.libros[0], self.miembros[0], dias_atras=14)
+        self.atrasado = self.prestar(self.libros[1], self.miembros[0], dias_atras=20)
+        self.otro = self.prestar(self.libros[2], self.miembros[1], dias_atras=14)
+        self.lejano = self.prestar(self.libro_ejemplares, self.miembros[2])
+
+    def avisos(self):
+        return self.env['biblioteca.aviso'].search([('miembro_id', 'in', self.miembros.ids)])
+
+    def test_resumen_por_miembro(self):
+        """ Los préstamos de un miembro se agrupan en un solo aviso y los lejanos no se avisan. """
+        self.env['biblioteca.aviso']._cron_generar_avisos()
+        avisos = self.avisos()
+        self.assertEqual(avisos.miembro_id, self.miembros[:2])
+        aviso = avisos.filtered(lambda a: a.miembro_id == self.miembros[0])
+        self.assertEqual(aviso.tipo, 'atraso')
+        self.assertEqual(aviso.prestamo_ids, self.proximo | self.atrasado)
+        self.assertIn(self.proximo.name, aviso.cuerpo)
+        self.assertIn(self.atrasado.name, aviso.cuerpo)
+        self.assertEqual(avisos.filtered(lambda a: a.miembro_id == self.miembros[1]).tipo, 'vencimiento')
+        self.assertEqual(self.proximo.tipo_aviso, 'vencimiento')
+        self.assertEqual(self.atrasado.tipo_aviso, 'atraso')
+        self.assertFalse(self.lejano.tipo_aviso)
+
+    def test_sin_reenvio(self):
+        """ Una segunda generación no vuelve a avisar los préstamos ya avisados. """
+        Aviso = self.env['biblioteca.aviso']
+        Aviso._cron_generar_avisos()
+        avisos = self.avisos()
+        Aviso._cron_generar_avisos()
+        self.assertEqual(self.avisos(), avisos)
+
+    def test_cuota_de_envio(self):
+        """ Cada ejecución envía como mucho `avisos_por_minuto` por minuto del intervalo, sin esperar. """
+        Aviso = self.env['biblioteca.aviso']
+        Aviso.create([
+            {'miembro_id': miembro.id, 'tipo': 'vencimiento', 'asunto': 'Prueba', 'cuerpo': 'Prueba'}
+            for miembro in self.miembros
+        ])
+        self.env['ir.config_parameter'].sudo().set_param('biblioteca.avisos_por_minuto', 1)
+        self.assertEqual(Aviso._cron_enviar_avisos(minutos=2), 2)
+        self.assertTrue(Aviso.search_count([('estado', '=', 'pendiente')]))
@@ -0,0 +1,49 @@
+from odoo.tests import tagged
+
+from .common import BibliotecaCase
+
+
+@tagged('post_install', '-at_install')
+class TestBusqueda(BibliotecaCase):
+    """
+    Búsqueda en el catálogo: coincidencias por título, autor, editorial y descripción,
+    y filtro por la disponibilidad leída de los ejemplares.
+    """
+
+    def test_ramas_de_la_busqueda(self):
+        """ Cada campo aporta sus coincidencias; el dominio y el archivado las filtran. """
+        Libro = self.env['biblioteca.libro']
+        autor = self.env['biblioteca.autor'].create({'name': 'Zenobia Quirós'})
+        por_titulo = Libro.create({'name': 'Crónica del Zeppelin', 'autor_id': self.autor.id, 'genero': 'historia'})
+        por_autor = Libro.create({'name': 'Memorias', 'autor_id': autor.id, 'genero': 'biografia'})
+        por_editorial = Libro.create({'name': 'Atlas', 'autor_id': self.autor.id, 'editorial': 'Ediciones Zeppelin'})
+        por_descripcion = Libro.create({'name': 'Viajes', 'autor_id': self.autor.id, 'descripcion': 'Un viaje en zeppelin'})
+        archivado = Libro.create({'name': 'Zeppelin archivado', 'autor_id': self.autor.id, 'active': False})
+
+        encontrados = Libro.buscar_catalogo('zeppelin')
+        self.assertEqual(set(encontrados.ids), {por_titulo.id, por_editorial.id, por_descripcion.id})
+        self.assertNotIn(archivado, encontrados)
+        self.assertEqual(Libro.buscar_catalogo('Quirós'), por_autor)
+        self.assertEqual(Libro.buscar_catalogo('zeppelin', domain=[('genero', '=', 'historia')]), por_titulo)
+        self.assertEqual(len(Libro.buscar_catalogo('zeppelin', limit=1)), 1)
+        self.assertFalse(Libro.buscar_catalogo('inexistente'))
+
+    def test_filtro_de_disponibilidad(self):
+        """ La disponibilidad se lee de los ejemplares, sin esperar a consolidar los contadores. """
+        Libro = self.env['biblioteca.libro']
+        libro = self.libro_ejemplares
+        dominio = [('id', '=', libro.id), ('disponibilidad', '=', 'disponible')]
+        self.prestar(libro, self.miembros[0])
+        self.assertEqual(libro.disponibilidad, 'disponible')
+        self.assertEqual(Libro.search(dominio), libro)
+
+        self.prestar(libro, self.miembros[1])
+        libro.invalidate_recordset(['disponibilidad'])
+        self.assertEqual(libro.disponibilidad, 'prestado')
+        self.assertFalse(Libro.search(dominio))
+        self.assertEqual(Libro.search([('id', '=', libro.id), ('disponibilidad', 'in', ('prestado', 'reservado'))]), libro)
+        self.assertEqual(Libro.search([('id', 'in', (libro | self.libros[0]).ids), ('disponibilidad', '!=', 'prestado')]), self.libros[0])
+
+        Libro._cron_consolidar_ejemplares()
+        self.assertEqual(libro.estado, 'prestado')
+        self.assertEqual(libro.ejemplares_disponibles, 0)
@@ -0,0 +1,33 @@
+from odoo.tests import HttpCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestCatalogo(HttpCase):
+    """
+    Catálogo público en JSON: peticiones condicionales con ETag / If-None-Match.
+    """
+
+    def setUp(self):
+        super().setUp()
+        autor = self.env['biblioteca.autor'].create({'name': 'Autor del Catálogo'})
+        self.env['biblioteca.libro'].create([
+            {'name': 'Libro del Catálogo %s' % i, 'autor_id': autor.id} for i in range(3)
+        ])
+
+    def test_peticion_condicional(self):
+        """ Un cliente que envía el ETag de la página recibe 304 sin cuerpo; con otro ETag, la página. """
+        url = '/biblioteca/api/libros?limite=2'
+        respuesta = self.url_open(url)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(respuesta.json()['datos'])
+        etag = respuesta.headers['ETag']
+        self.assertTrue(etag.startswith('"') and etag.endswith('"'))
+
+        respuesta = self.url_open(url, headers={'If-None-Match': etag})
+        self.assertEqual(respuesta.status_code, 304)
+        self.assertEqual(respuesta.content, b'')
+        self.assertEqual(respuesta.headers['ETag'], etag)
+
+        respuesta = self.url_open(url, headers={'If-None-Match': '"otro", W/"debil"'})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.headers['ETag'], etag)
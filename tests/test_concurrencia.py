@@ -0,0 +1,180 @@
+import random
+import threading
+import time
+
+from psycopg2 import errors
+
+from odoo import api, SUPERUSER_ID
+from odoo.modules.registry import Registry
+from odoo.tests import tagged
+from odoo.tests.common import BaseCase, get_db_name
+
+from .common import guardar_resultados
+
+
+@tagged('post_install', '-at_install', '-standard', 'biblioteca_rendimiento', 'biblioteca_concurrencia')
+class TestConcurrenciaPrestamos(BaseCase):
+    """
+    Prueba de estrés del préstamo en lote (`prestar_libros`) desde varios puestos.
+    Cada hilo usa su propio cursor y confirma sus transacciones, como haría un
+    puesto real; por eso los datos se crean y se borran con transacciones propias
+    en lugar de usar el cursor de prueba.
+
+    Comprueba que ningún libro ni ejemplar queda con dos préstamos abiertos, que
+    los contadores de disponibilidad coinciden con un recuento completo, que el
+    rendimiento de la segunda mitad de la prueba no cae por debajo de la mitad
+    del de la primera y que los errores de serialización son la excepción: los
+    puestos reintentan como el servidor, pero los reintentos se cuentan, se
+    guardan con los resultados y no pueden pasar de `max_reintentos`.
+    """
+
+    puestos = 8
+    rondas = 30
+    libros_por_ronda = 5
+    # Fracción máxima de operaciones (préstamos y devoluciones) que se reintentan.
+    # Solo deberían fallar las que coinciden con otro puesto confirmando el mismo ejemplar.
+    max_reintentos = 0.05
+
+    def setUp(self):
+        super().setUp()
+        self.registry = Registry(get_db_name())
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            autor = env['biblioteca.autor'].create({'name': 'Autor Concurrencia'})
+            libros = env['biblioteca.libro'].create([
+                {'name': 'Concurrencia %s' % i, 'autor_id': autor.id, 'multa': 0.5}
+                for i in range(40)
+            ])
+            env['biblioteca.ejemplar'].create([
+                {'name': 'CONC-%s-%s' % (libro.id, n), 'libro_id': libro.id}
+                for libro in libros[:10]
+                for n in range(4)
+            ])
+            miembros = env['biblioteca.miembro'].create([
+                {'name': 'Puesto %s' % i, 'dni': 'CONC%04d' % i}
+                for i in range(self.puestos)
+            ])
+            self.autor_id = autor.id
+            self.libro_ids = libros.ids
+            self.miembro_ids = miembros.ids
+        self.addCleanup(self._borrar_datos)
+
+    def _borrar_datos(self):
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            env['biblioteca.prestamo'].search([('libro_id', 'in', self.libro_ids)]).unlink()
+            env['biblioteca.libro'].browse(self.libro_ids).unlink()
+            env['biblioteca.miembro'].browse(self.miembro_ids).unlink()
+            env['biblioteca.autor'].browse(self.autor_id).unlink()
+
+    def _puesto(self, indice, mediciones, errores):
+        """
+        Simula un puesto de préstamo: en cada ronda presta un lote de libros al azar
+        y después los devuelve, cada operación en su propia transacción.
+        """
+        azar = random.Random(indice)
+        miembro_id = self.miembro_ids[indice]
+        try:
+            for _ronda in range(self.rondas):
+                solicitados = azar.sample(self.libro_ids, self.libros_por_ronda)
+                inicio = time.perf_counter()
+                prestamo_ids, reintentos = [], 0
+                while True:
+                    try:
+                        with self.registry.cursor() as cr:
+                            env = api.Environment(cr, SUPERUSER_ID, {})
+                            resultados = env['biblioteca.prestamo'].prestar_libros(miembro_id, solicitados)
+                            prestamo_ids = [r['prestamo_id'] for r in resultados if r['prestamo_id']]
+                        break
+                    except errors.SerializationFailure:
+                        # Igual que el servidor: se reintenta la transacción completa.
+                        reintentos += 1
+                medicion = (time.perf_counter(), len(prestamo_ids), time.perf_counter() - inicio, reintentos)
+                reintentos_devolucion = 0
+                while prestamo_ids:
+                    try:
+                        with self.registry.cursor() as cr:
+                            env = api.Environment(cr, SUPERUSER_ID, {})
+                            for prestamo in env['biblioteca.prestamo'].browse(prestamo_ids):
+                                prestamo.action_entregado()
+                        break
+                    except errors.SerializationFailure:
+                        reintentos_devolucion += 1
+                mediciones.append(medicion + (reintentos_devolucion,))
+        except Exception as error:
+            # Se informa desde el hilo principal.
+            errores.append(error)
+
+    def test_prestamos_concurrentes(self):
+        mediciones, errores = [], []
+        hilos = [
+            threading.Thread(target=self._puesto, args=(i, mediciones, errores))
+            for i in range(self.puestos)
+        ]
+        inicio = time.perf_counter()
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        duracion = time.perf_counter() - inicio
+        self.assertFalse(errores, "Errores en los puestos: %s" % errores)
+
+        with self.registry.cursor() as cr:
+            # Se consolidan las variaciones de disponibilidad en cola antes de comparar los contadores.
+            api.Environment(cr, SUPERUSER_ID, {})['biblioteca.libro']._cron_consolidar_ejemplares()
+            # Ningún ejemplar, ni libro sin ejemplares, con más de un préstamo abierto a la vez:
+            # cada puesto devuelve lo que presta, así que al final no debe quedar nada abierto.
+            cr.execute("""
+                SELECT COUNT(*) FROM biblioteca_prestamo
+                 WHERE libro_id = ANY(%s) AND estado IN ('prestado', 'atrasado')
+            """, [self.libro_ids])
+            self.assertEqual(cr.fetchone()[0], 0)
+            # Los préstamos de un mismo ejemplar o libro no se solapan en el tiempo.
+            cr.execute("""
+                SELECT COUNT(*)
+                  FROM biblioteca_prestamo a
+                  JOIN biblioteca_prestamo b
+                    ON a.id < b.id
+                   AND COALESCE(a.ejemplar_id, 0) = COALESCE(b.ejemplar_id, 0)
+                   AND a.libro_id = b.libro_id
+                   AND a.create_date < b.write_date AND b.create_date < a.write_date
+                 WHERE a.libro_id = ANY(%s)
+            """, [self.libro_ids])
+            self.assertEqual(cr.fetchone()[0], 0, "Se ha prestado dos veces el mismo libro o ejemplar")
+            # Los contadores incrementales coinciden con un recuento completo.
+            cr.execute("""
+                SELECT l.id
+                  FROM biblioteca_libro l
+                  LEFT JOIN biblioteca_ejemplar e ON e.libro_id = l.id AND e.active
+                 WHERE l.id = ANY(%s)
+              GROUP BY l.id
+                HAVING l.ejemplares_total != COUNT(e.id)
+                    OR l.ejemplares_disponibles != COUNT(e.id) FILTER (WHERE e.estado = 'disponible')
+            """, [self.libro_ids])
+            self.assertFalse(cr.fetchall(), "Contadores de ejemplares desajustados")
+
+        reintentos_prestamo = sum(m[3] for m in mediciones)
+        reintentos_devolucion = sum(m[4] for m in mediciones)
+        mediciones.sort()
+        mitad = len(mediciones) // 2
+        primera = sum(m[1] for m in mediciones[:mitad]) / max(sum(m[2] for m in mediciones[:mitad]), 1e-6)
+        segunda = sum(m[1] for m in mediciones[mitad:]) / max(sum(m[2] for m in mediciones[mitad:]), 1e-6)
+        guardar_resultados(type(self).__name__, [{
+            'clase': type(self).__name__,
+            'escenario': 'prestamos_concurrentes',
+            'puestos': self.puestos,
+            'rondas': self.rondas,
+            'prestamos': sum(m[1] for m in mediciones),
+            'reintentos_prestamo': reintentos_prestamo,
+            'reintentos_devolucion': reintentos_devolucion,
+            'segundos': round(duracion, 4),
+            'prestamos_por_segundo_primera_mitad': round(primera, 2),
+            'prestamos_por_segundo_segunda_mitad': round(segunda, 2),
+        }])
+        self.assertGreaterEqual(segunda, primera * 0.5, "El rendimiento cae durante la prueba")
+        operaciones = 2 * self.puestos * self.rondas
+        self.assertLessEqual(
+            reintentos_prestamo + reintentos_devolucion, operaciones * self.max_reintentos,
+            "Demasiados errores de serialización: %s al prestar y %s al devolver en %s operaciones"
+            % (reintentos_prestamo, reintentos_devolucion, operaciones),
+        )
@@ -0,0 +1,68 @@
+import io
+
+from odoo.tests import tagged
+
+from .common import BibliotecaCase
+
+
+@tagged('post_install', '-at_install')
+class TestIntercambio(BibliotecaCase):
+    """
+    Importación y exportación masiva: los registros existentes se identifican
+    por su clave (DNI de los miembros, nombre de los autores) y no se duplican.
+    """
+
+    def importar(self, texto, tipo, formato='csv', **kwargs):
+        return self.env['biblioteca.intercambio'].importar(io.StringIO(texto, newline=''), tipo, formato, **kwargs)
+
+    def test_miembros_por_dni(self):
+        """ Un DNI existente actualiza el miembro; uno repetido en el fichero se combina. """
+        existente = self.miembros[0]
+        resumen = self.importar('\n'.join([
+            'name,dni,email,estado',
+            '%s,%s,nuevo@example.com,suspendido' % (existente.name, existente.dni),
+            'Miembro Nuevo,NUEVO001,primero@example.com,activo',
+            'Miembro Nuevo,NUEVO001,ultimo@example.com,activo',
+            'Sin Documento,,x@example.com,activo',
+        ]), 'miembro')
+        self.assertEqual((resumen['creados'], resumen['actualizados'], resumen['errores']), (1, 1, 1))
+        self.assertEqual((existente.email, existente.estado), ('nuevo@example.com', 'suspendido'))
+        nuevo = self.env['biblioteca.miembro'].search([('dni', '=', 'NUEVO001')])
+        self.assertEqual(len(nuevo), 1)
+        self.assertEqual(nuevo.email, 'ultimo@example.com')
+
+        # Volver a importar el mismo fichero no crea ni cambia nada.
+        resumen = self.importar('name,dni,email\n%s,%s,nuevo@example.com' % (existente.name, existente.dni), 'miembro')
+        self.assertEqual((resumen['creados'], resumen['actualizados']), (0, 0))
+
+    def test_actualizaciones_agrupadas(self):
+        """ Los miembros que reciben los mismos valores se actualizan juntos y se cuentan uno a uno. """
+        lineas = ['name,dni,estado'] + ['%s,%s,inactivo' % (miembro.name, miembro.dni) for miembro in self.miembros]
+        lineas[1] = '%s,%s,bloqueado' % (self.miembros[0].name, self.miembros[0].dni)
+        resumen = self.importar('\n'.join(lineas), 'miembro')
+        self.assertEqual(resumen['actualizados'], len(self.miembros))
+        self.assertEqual(self.miembros.mapped('estado'), ['bloqueado', 'inactivo', 'inactivo'])
+
+    def test_libros_con_autores_por_nombre(self):
+        """ Los autores de los libros se resuelven por nombre; los que faltan se crean una vez. """
+        resumen = self.importar('\n'.join([
+            '{"name": "Importado 1", "autor": "%s", "genero": "ciencia"}' % self.autor.name,
+            '{"name": "Importado 2", "autor": "Autor Importado"}',
+            '{"name": "Importado 3", "autor": "Autor Importado"}',
+            '{"name": "Importado 4", "autor": "Autor Importado", "genero": "desconocido"}',
+            'no es JSON',
+        ]), 'libro', 'jsonl')
+        self.assertEqual((resumen['creados'], resumen['errores']), (3, 2))
+        self.assertEqual(self.env['biblioteca.autor'].search_count([('name', '=', self.autor.name)]), 1)
+        importado = self.env['biblioteca.autor'].search([('name', '=', 'Autor Importado')])
+        self.assertEqual(importado.total_libros, 2)
+
+    def test_exportacion_por_paginas(self):
+        """ La exportación recorre todos los registros aunque ocupen varias páginas. """
+        salida = io.StringIO(newline='')
+        total = self.env['biblioteca.intercambio'].exportar(salida, 'miembro', tamano_lote=2)
+        exportados = salida.getvalue().splitlines()
+        self.assertEqual(total, self.env['biblioteca.miembro'].search_count([]))
+        self.assertEqual(len(exportados), total + 1)
+        self.assertEqual(exportados[0], 'name,dni,email,telefono,direccion,estado')
+        self.assertTrue(any(linea.startswith('%s,%s,' % (self.miembros[0].name, self.miembros[0].dni)) for linea in exportados))
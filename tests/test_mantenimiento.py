@@ -0,0 +1,40 @@
+from odoo.tests import tagged
+
+from .common import BibliotecaCase
+
+
+@tagged('post_install', '-at_install')
+class TestMantenimiento(BibliotecaCase):
+    """
+    Reconstrucción de agregados: corrige contadores y estados alterados por SQL.
+    """
+
+    def test_reconstruir_agregados(self):
+        """ Los contadores y el estado de títulos y miembros se recalculan desde cero. """
+        miembro = self.miembros[0]
+        prestamo = self.prestar(self.libros[0], miembro)
+        self.env.flush_all()
+        # Se corrompen los agregados como lo haría una carga por SQL.
+        self.env.cr.execute("UPDATE biblioteca_libro SET estado = 'disponible' WHERE id = %s", [self.libros[0].id])
+        self.env.cr.execute("UPDATE biblioteca_libro SET ejemplares_disponibles = 0, estado = 'prestado' WHERE id = %s", [self.libro_ejemplares.id])
+        self.env.cr.execute("UPDATE biblioteca_miembro SET prestamos_activos = 5 WHERE id = %s", [miembro.id])
+
+        self.env['biblioteca.mantenimiento'].reconstruir_agregados()
+        self.assertEqual(self.libros[0].estado, 'prestado')
+        self.assertEqual(self.libro_ejemplares.ejemplares_disponibles, 2)
+        self.assertEqual(self.libro_ejemplares.estado, 'disponible')
+        self.assertEqual(miembro.prestamos_activos, 1)
+
+        prestamo.action_devolver_libro()
+        self.env.flush_all()
+        self.env.cr.execute("UPDATE biblioteca_libro SET estado = 'prestado' WHERE id = %s", [self.libros[0].id])
+        self.env['biblioteca.mantenimiento'].reconstruir_agregados()
+        self.assertEqual(self.libros[0].estado, 'disponible')
+
+    def test_titulo_con_ejemplares_archivados(self):
+        """ Si se archivan todos los ejemplares, el título deja de conservar su estado anterior. """
+        self.env.cr.execute("UPDATE biblioteca_ejemplar SET active = false WHERE libro_id = %s", [self.libro_ejemplares.id])
+        self.env.cr.execute("UPDATE biblioteca_libro SET estado = 'reservado' WHERE id = %s", [self.libro_ejemplares.id])
+        self.env['biblioteca.mantenimiento'].reconstruir_agregados()
+        self.assertEqual(self.libro_ejemplares.ejemplares_total, 0)
+        self.assertEqual(self.libro_ejemplares.estado, 'disponible')
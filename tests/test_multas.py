@@ -0,0 +1,42 @@
+from odoo.exceptions import UserError
+from odoo.tests import tagged
+
+from .common import BibliotecaCase
+
+
+@tagged('post_install', '-at_install')
+class TestMultas(BibliotecaCase):
+    """
+    Libro de multas: las multas y los pagos actualizan `deuda_total` del miembro.
+    """
+
+    def test_devolucion_con_atraso_y_pago(self):
+        """ La multa de una devolución tardía suma a la deuda y un pago la descuenta. """
+        miembro = self.miembros[0]
+        prestamo = self.prestar(self.libros[0], miembro, dias_atras=20)
+        # 15 días de préstamo según la política general: 5 días de atraso a 1.0 por día.
+        prestamo.action_devolver_libro()
+        self.assertEqual(prestamo.dias_atraso, 5)
+        self.assertEqual(prestamo.multa, 5.0)
+        self.assertEqual(miembro.deuda_total, 5.0)
+
+        self.env['biblioteca.pago.multa'].create({'miembro_id': miembro.id, 'importe': 3.0}).action_confirmar()
+        self.assertEqual(miembro.deuda_total, 2.0)
+        self.assertEqual(sorted(miembro.movimiento_multa_ids.mapped('tipo')), ['multa', 'pago'])
+        self.assertEqual(sum(miembro.movimiento_multa_ids.mapped('importe')), miembro.deuda_total)
+
+    def test_variacion_y_anulacion_de_multa(self):
+        """ Cambiar la multa de un préstamo registra la diferencia; eliminarlo la anula. """
+        miembro = self.miembros[1]
+        prestamo = self.prestar(self.libros[1], miembro)
+        prestamo.multa = 4.0
+        prestamo.multa = 1.5
+        self.assertEqual(miembro.deuda_total, 1.5)
+        prestamo.unlink()
+        self.assertEqual(miembro.deuda_total, 0.0)
+
+    def test_pago_no_positivo(self):
+        """ Un pago debe ser mayor que cero. """
+        pago = self.env['biblioteca.pago.multa'].create({'miembro_id': self.miembros[0].id, 'importe': 0.0})
+        with self.assertRaises(UserError):
+            pago.action_confirmar()
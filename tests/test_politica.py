@@ -0,0 +1,61 @@
+from datetime import timedelta
+
+from odoo import fields
+from odoo.exceptions import UserError
+from odoo.tests import tagged
+
+from .common import BibliotecaCase
+
+
+@tagged('post_install', '-at_install')
+class TestPolitica(BibliotecaCase):
+    """
+    Política de préstamos: estados bloqueados, límites de préstamos y deuda, días por género.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.politica = self.env['biblioteca.politica'].search([], limit=1)
+        self.politica.write({'max_prestamos': 0, 'max_deuda': 0.0, 'bloquear_suspendido': True, 'dias_prestamo': 15})
+
+    def test_miembro_suspendido(self):
+        """ Un miembro suspendido no puede llevarse libros; si la política lo permite, sí. """
+        miembro = self.miembros[0]
+        miembro.estado = 'suspendido'
+        with self.assertRaises(UserError):
+            self.prestar(self.libros[0], miembro)
+        self.politica.bloquear_suspendido = False
+        self.assertTrue(self.prestar(self.libros[0], miembro))
+
+    def test_maximo_de_prestamos(self):
+        """ Los préstamos abiertos más los nuevos no pueden superar el máximo, también por lote. """
+        self.politica.max_prestamos = 2
+        miembro = self.miembros[0]
+        self.prestar(self.libros[0], miembro)
+        with self.assertRaises(UserError):
+            self.env['biblioteca.prestamo'].prestar_libros(miembro.id, self.libros[1:].ids)
+        self.prestar(self.libros[1], miembro)
+        with self.assertRaises(UserError):
+            self.prestar(self.libros[2], miembro)
+        # Otro miembro no se ve afectado.
+        self.assertTrue(self.prestar(self.libros[2], self.miembros[1]))
+
+    def test_deuda_maxima(self):
+        """ Un miembro con deuda superior a la máxima no puede llevarse libros. """
+        self.politica.max_deuda = 3.0
+        miembro = self.miembros[0]
+        self.prestar(self.libros[0], miembro).multa = 4.0
+        self.assertEqual(miembro.deuda_total, 4.0)
+        with self.assertRaises(UserError):
+            self.prestar(self.libros[1], miembro)
+        self.env['biblioteca.pago.multa'].create({'miembro_id': miembro.id, 'importe': 2.0}).action_confirmar()
+        self.assertTrue(self.prestar(self.libros[1], miembro))
+
+    def test_dias_por_genero(self):
+        """ Los días de préstamo salen de la regla del género o, si no la hay, de la política. """
+        self.politica.genero_ids = [fields.Command.clear(), fields.Command.create({'genero': 'ficcion', 'dias_prestamo': 7})]
+        ficcion = self.prestar(self.libros[0], self.miembros[0])
+        ciencia = self.prestar(self.libros[1], self.miembros[0])
+        self.assertEqual(ficcion.dias_prestamo, 7)
+        self.assertEqual(ciencia.dias_prestamo, 15)
+        self.assertEqual(ficcion.fecha_devolucion, ficcion.fecha_prestamo + timedelta(days=7))
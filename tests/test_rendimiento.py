@@ -0,0 +1,204 @@
+import io
+from datetime import timedelta
+
+from odoo import fields
+from odoo.exceptions import UserError
+from odoo.tests import tagged
+
+from .common import BibliotecaBenchmarkCase
+from ..models import recomendacion
+
+
+@tagged('post_install', '-at_install', '-standard', 'biblioteca_rendimiento')
+class TestRendimiento(BibliotecaBenchmarkCase):
+    """
+    Escenarios de rendimiento del ciclo de vida de los préstamos.
+    Se ejecutan con `--test-tags biblioteca_rendimiento`; los presupuestos de
+    consultas no dependen de la escala, así que un aumento indica que algún
+    camino vuelve a procesar registro a registro.
+    """
+
+    presupuestos = {
+        # escenario: (consultas, segundos)
+        'lista_miembros': (10, 1.0),
+        'formulario_libro': (15, 1.0),
+        'creacion_masiva': (40, 10.0),
+        'devolucion_y_multa': (30, 0.5),
+        'revision_atrasos': (70, 30.0),
+        'devolucion_lote': (40, 5.0),
+        'importacion_libros': (80, 20.0),
+        'asignacion_reserva': (30, 0.5),
+        'recomendaciones': (40, 10.0),
+        'generacion_avisos': (30, 10.0),
+        'reconstruccion_agregados': (20, 30.0),
+        'creacion_con_politica': (42, 10.0),
+    }
+
+    def test_lista_miembros(self):
+        """ Carga de la primera página de la lista de miembros. """
+        especificacion = {
+            campo: {} for campo in (
+                'codigo_miembro', 'name', 'dni', 'email', 'telefono', 'estado',
+                'prestamos_activos', 'deuda_total',
+            )
+        }
+        with self.medir('lista_miembros', filas=80):
+            resultado = self.env['biblioteca.miembro'].web_search_read([], especificacion, limit=80)
+        self.assertEqual(len(resultado['records']), min(80, len(self.datos.miembros)))
+
+    def test_formulario_libro(self):
+        """ Apertura del formulario del libro con más préstamos. """
+        self.env.cr.execute("""
+            SELECT libro_id FROM biblioteca_prestamo GROUP BY libro_id ORDER BY COUNT(*) DESC LIMIT 1
+        """)
+        libro = self.env['biblioteca.libro'].browse(self.env.cr.fetchone()[0])
+        especificacion = {
+            'name': {}, 'autor_id': {'fields': {'display_name': {}}}, 'editorial': {}, 'estado': {},
+            'genero': {}, 'anio_publicacion': {}, 'monto': {}, 'multa': {}, 'descripcion': {},
+            'ejemplares_total': {}, 'ejemplares_disponibles': {}, 'ejemplares_prestados': {}, 'ejemplares_atrasados': {},
+            'ejemplar_ids': {'fields': {'name': {}, 'estado': {}}},
+            'total_prestamos': {}, 'ultimo_prestamo': {}, 'prestamo_abierto_id': {'fields': {'display_name': {}}},
+            'prestamo_reciente_ids': {'fields': {
+                'name': {}, 'miembro_id': {'fields': {'display_name': {}}}, 'fecha_prestamo': {}, 'estado': {},
+            }},
+        }
+        with self.medir('formulario_libro', filas=1):
+            resultado = libro.web_read(especificacion)
+        self.assertGreater(resultado[0]['total_prestamos'], 0)
+
+    def test_creacion_masiva(self):
+        """ Creación de 500 préstamos en una sola llamada. """
+        libros = self.env['biblioteca.libro'].search([('estado', '=', 'disponible'), ('ejemplares_total', '=', 0)], limit=500)
+        miembros = self.datos.miembros
+        vals_list = [
+            {'libro_id': libro.id, 'miembro_id': miembros[i % len(miembros)].id}
+            for i, libro in enumerate(libros)
+        ]
+        with self.medir('creacion_masiva', filas=len(vals_list)):
+            prestamos = self.env['biblioteca.prestamo'].create(vals_list)
+        self.assertEqual(set(prestamos.libro_id.mapped('estado')), {'prestado'})
+
+    def test_devolucion_y_multa(self):
+        """ Devolución fuera de plazo de un préstamo, con cálculo de la multa. """
+        prestamo = self.datos.abiertos.filtered(lambda p: p.fecha_devolucion < fields.Datetime.now())[:1]
+        if not prestamo:
+            prestamo = self.datos.abiertos[:1]
+            prestamo.fecha_prestamo = fields.Datetime.now() - timedelta(days=30)
+        with self.medir('devolucion_y_multa', filas=1):
+            prestamo.action_devolver_libro()
+        self.assertEqual(prestamo.estado, 'devuelto')
+        self.assertGreater(prestamo.multa, 0)
+
+    def test_revision_atrasos(self):
+        """ Revisión nocturna de préstamos vencidos. """
+        vencidos = self.env['biblioteca.prestamo'].search_count([
+            ('estado', '=', 'prestado'), ('fecha_devolucion', '<', fields.Datetime.now()),
+        ])
+        with self.medir('revision_atrasos', filas=vencidos):
+            actualizados = self.env['biblioteca.prestamo']._cron_actualizar_atrasos()
+        self.assertEqual(actualizados, vencidos)
+
+    def test_devolucion_lote(self):
+        """ Devolución de todos los préstamos abiertos desde el mostrador, mezclando referencias y ejemplares. """
+        codigos = [prestamo.ejemplar_id.name or prestamo.name for prestamo in self.datos.abiertos]
+        with self.medir('devolucion_lote', filas=len(codigos)):
+            resultados = self.env['biblioteca.prestamo'].devolver_prestamos(codigos)
+        self.assertEqual({r['resultado'] for r in resultados}, {'devuelto'})
+        self.assertEqual(set(self.datos.abiertos.mapped('estado')), {'devuelto'})
+
+    def test_importacion_libros(self):
+        """ Importación en CSV de 5000 libros de 500 autores, algunos de ellos ya existentes. """
+        lineas = ['name,autor,editorial,genero,multa']
+        lineas += [
+            'Importado %s,%s,Editorial %s,ciencia,0.5' % (i, 'Autor %s' % (i % 500), i % 20)
+            for i in range(5000)
+        ]
+        with self.medir('importacion_libros', filas=5000):
+            resumen = self.env['biblioteca.intercambio'].importar(io.StringIO('\n'.join(lineas), newline=''), 'libro')
+        self.assertEqual(resumen['creados'], 5000)
+        self.assertFalse(resumen['errores'])
+
+    def test_asignacion_reserva(self):
+        """ Devolución de un libro prestado con decenas de miles de reservas en espera. """
+        prestamo = self.datos.abiertos[:1]
+        self.env.cr.execute("""
+            INSERT INTO biblioteca_reserva
+                   (libro_id, miembro_id, fecha_solicitud, estado, create_uid, create_date, write_uid, write_date)
+            SELECT l, m, %(ahora)s - make_interval(secs => m), 'espera', %(uid)s, %(ahora)s, %(uid)s, %(ahora)s
+              FROM unnest(%(libros)s::int[]) AS l, unnest(%(miembros)s::int[]) AS m
+        """, {
+            'libros': self.datos.abiertos.libro_id.ids,
+            'miembros': self.datos.miembros.ids,
+            'ahora': fields.Datetime.now(),
+            'uid': self.env.uid,
+        })
+        with self.medir('asignacion_reserva', filas=1):
+            prestamo.action_entregado()
+        reserva = self.env['biblioteca.reserva'].search([('libro_id', '=', prestamo.libro_id.id), ('estado', '=', 'asignada')])
+        self.assertEqual(len(reserva), 1)
+        self.assertEqual(prestamo.libro_id.estado, 'reservado')
+
+    def test_recomendaciones(self):
+        """ Actualización incremental de las recomendaciones tras 500 préstamos nuevos. """
+        Recomendacion = self.env['biblioteca.recomendacion']
+        if recomendacion.sparse is None:
+            self.skipTest("NumPy y SciPy no están instalados")
+        Recomendacion._cron_actualizar_recomendaciones(margen_minutos=0)
+        libros = self.env['biblioteca.libro'].search([('estado', '=', 'disponible'), ('ejemplares_total', '=', 0)], limit=500)
+        miembros = self.datos.miembros
+        self.env['biblioteca.prestamo'].create([
+            {'libro_id': libro.id, 'miembro_id': miembros[i % len(miembros)].id}
+            for i, libro in enumerate(libros)
+        ])
+        with self.medir('recomendaciones', filas=len(libros)):
+            procesados = Recomendacion._cron_actualizar_recomendaciones(margen_minutos=0)
+        self.assertEqual(procesados, len(libros))
+        self.assertTrue(Recomendacion._vecinos(libros[0].id))
+
+    def test_generacion_avisos(self):
+        """ Generación nocturna de los avisos de préstamos vencidos o a punto de vencer. """
+        self.env['biblioteca.prestamo']._cron_actualizar_atrasos()
+        miembros = self.env['biblioteca.prestamo'].search([
+            ('estado', 'in', ('prestado', 'atrasado')), ('fecha_devolucion', '<', fields.Datetime.now() + timedelta(days=2)),
+        ]).miembro_id
+        with self.medir('generacion_avisos', filas=len(miembros)):
+            generados = self.env['biblioteca.aviso']._cron_generar_avisos()
+        self.assertEqual(generados, len(miembros))
+        self.assertEqual(self.env['biblioteca.aviso'].search([]).miembro_id, miembros)
+        self.assertFalse(self.env['biblioteca.aviso']._cron_generar_avisos())
+
+    def test_reconstruccion_agregados(self):
+        """ Reconstrucción desde cero de los agregados tras corromperlos con SQL. """
+        autor = self.env['biblioteca.autor'].search([('total_libros', '>', 0)], limit=1)
+        miembro = self.datos.abiertos[:1].miembro_id
+        esperado = (autor.total_libros, miembro.prestamos_activos, miembro.deuda_total)
+        self.env.cr.execute("UPDATE biblioteca_autor SET total_libros = 0 WHERE id = %s", [autor.id])
+        self.env.cr.execute("UPDATE biblioteca_miembro SET prestamos_activos = 0, deuda_total = -1 WHERE id = %s", [miembro.id])
+        with self.medir('reconstruccion_agregados'):
+            corregidas = self.env['biblioteca.mantenimiento'].reconstruir_agregados(tamano_lote=1000000)
+        self.assertGreaterEqual(corregidas['biblioteca_autor'], 1)
+        self.assertGreaterEqual(corregidas['biblioteca_miembro'], 1)
+        self.assertEqual((autor.total_libros, miembro.prestamos_activos, miembro.deuda_total), esperado)
+
+    def test_creacion_con_politica(self):
+        """ Creación de 500 préstamos con una política con todas las reglas: una consulta más que sin política. """
+        politica = self.env['biblioteca.politica'].search([], limit=1)
+        politica.write({
+            'max_prestamos': 1000,
+            'max_deuda': 1000000.0,
+            'genero_ids': [fields.Command.create({'genero': 'ciencia', 'dias_prestamo': 7})],
+        })
+        libros = self.env['biblioteca.libro'].search([('estado', '=', 'disponible'), ('ejemplares_total', '=', 0)], limit=500)
+        miembros = self.datos.miembros
+        vals_list = [
+            {'libro_id': libro.id, 'miembro_id': miembros[i % len(miembros)].id}
+            for i, libro in enumerate(libros)
+        ]
+        self.env['biblioteca.politica']._compilar()
+        with self.medir('creacion_con_politica', filas=len(vals_list)):
+            prestamos = self.env['biblioteca.prestamo'].create(vals_list)
+        ciencia = prestamos.filtered(lambda p: p.libro_id.genero == 'ciencia')
+        self.assertTrue(all(prestamo.dias_prestamo == 7 for prestamo in ciencia))
+        miembros[:1].estado = 'suspendido'
+        with self.assertRaises(UserError):
+            self.env['biblioteca.prestamo'].prestar_libros(miembros[:1].id, libros[:1].ids)
@@ -0,0 +1,91 @@
+from datetime import timedelta
+
+from odoo import fields
+from odoo.exceptions import UserError
+from odoo.tests import tagged
+
+from .common import BibliotecaCase
+
+
+@tagged('post_install', '-at_install')
+class TestReservas(BibliotecaCase):
+    """
+    Cola de reservas: lo devuelto se aparta para la primera reserva en espera,
+    las asignaciones no recogidas caducan y pasan a la siguiente.
+    """
+
+    def reservar(self, libro, miembro):
+        return self.env['biblioteca.reserva'].create({'libro_id': libro.id, 'miembro_id': miembro.id})
+
+    def test_caducidad_pasa_a_la_siguiente(self):
+        """ Una asignación caducada pasa a la siguiente reserva de la cola, que se completa al prestar. """
+        libro = self.libros[0]
+        prestamo = self.prestar(libro, self.miembros[0])
+        primera = self.reservar(libro, self.miembros[1])
+        segunda = self.reservar(libro, self.miembros[2])
+        self.assertEqual((primera.posicion, segunda.posicion), (1, 2))
+
+        prestamo.action_entregado()
+        self.assertEqual((primera.estado, segunda.estado), ('asignada', 'espera'))
+        self.assertEqual(libro.estado, 'reservado')
+
+        primera.fecha_limite = fields.Datetime.now() - timedelta(hours=1)
+        self.assertEqual(self.env['biblioteca.reserva']._cron_expirar_reservas(), 1)
+        self.assertEqual((primera.estado, segunda.estado), ('expirada', 'asignada'))
+        self.assertEqual(libro.estado, 'reservado')
+
+        nuevo = self.prestar(libro, self.miembros[2])
+        self.assertEqual(segunda.estado, 'completada')
+        self.assertEqual(segunda.prestamo_id, nuevo)
+        self.assertEqual(libro.estado, 'prestado')
+
+    def test_caducidad_sin_cola_libera(self):
+        """ Si nadie más espera, lo apartado vuelve a estar disponible al caducar. """
+        libro = self.libros[1]
+        prestamo = self.prestar(libro, self.miembros[0])
+        reserva = self.reservar(libro, self.miembros[1])
+        prestamo.action_entregado()
+        reserva.fecha_limite = fields.Datetime.now() - timedelta(hours=1)
+        self.env['biblioteca.reserva']._cron_expirar_reservas()
+        self.assertEqual(reserva.estado, 'expirada')
+        self.assertEqual(libro.estado, 'disponible')
+
+    def test_ejemplar_apartado(self):
+        """ En un título con ejemplares se aparta el ejemplar devuelto y el miembro se lleva ese. """
+        libro = self.libro_ejemplares
+        prestamos = self.env['biblioteca.prestamo'].create([
+            {'libro_id': libro.id, 'miembro_id': self.miembros[0].id} for _n in range(2)
+        ])
+        reserva = self.reservar(libro, self.miembros[1])
+        prestamos[0].action_entregado()
+        self.assertEqual(reserva.estado, 'asignada')
+        self.assertEqual(reserva.ejemplar_id, prestamos[0].ejemplar_id)
+        self.assertEqual(reserva.ejemplar_id.estado, 'reservado')
+
+        resultado = self.env['biblioteca.prestamo'].prestar_libros(self.miembros[1].id, libro.ids)
+        self.assertEqual(resultado[0]['resultado'], 'prestado')
+        prestamo = self.env['biblioteca.prestamo'].browse(resultado[0]['prestamo_id'])
+        self.assertEqual(prestamo.ejemplar_id, reserva.ejemplar_id)
+        self.assertEqual(reserva.estado, 'completada')
+
+    def test_reservas_no_validas(self):
+        """ No se reserva lo disponible, ni dos veces lo mismo, ni para un miembro que no puede llevarse libros. """
+        with self.assertRaises(UserError):
+            self.reservar(self.libros[2], self.miembros[1])
+        self.prestar(self.libros[2], self.miembros[0])
+        self.reservar(self.libros[2], self.miembros[1])
+        with self.assertRaises(UserError):
+            self.reservar(self.libros[2], self.miembros[1])
+        self.miembros[2].estado = 'suspendido'
+        with self.assertRaises(UserError):
+            self.reservar(self.libros[2], self.miembros[2])
+
+    def test_miembro_suspendido_en_cola(self):
+        """ La reserva de un miembro suspendido después de reservar se salta y sigue en espera. """
+        libro = self.libros[0]
+        prestamo = self.prestar(libro, self.miembros[0])
+        primera = self.reservar(libro, self.miembros[1])
+        segunda = self.reservar(libro, self.miembros[2])
+        self.miembros[1].estado = 'suspendido'
+        prestamo.action_entregado()
+        self.assertEqual((primera.estado, segunda.estado), ('espera', 'asignada'))
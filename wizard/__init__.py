@@ -0,0 +1,3 @@
+from . import devolucion_lote
+from . import pago_multa
+from . import intercambio
@@ -0,0 +1,80 @@
+from odoo import models, fields, api
+import re
+
+RESULTADOS_DEVOLUCION = [
+    ('devuelto', 'Devuelto'),
+    ('ya_devuelto', 'Ya devuelto'),
+    ('no_encontrado', 'No encontrado'),
+    ('duplicado', 'Duplicado'),
+]
+
+
+class DevolucionLote(models.TransientModel):
+    """
+    Asistente del mostrador de devoluciones. Se escanean o pegan los códigos de
+    los préstamos o de los ejemplares devueltos (uno por línea) y se devuelven
+    todos a la vez con `biblioteca.prestamo.devolver_prestamos`, mostrando el
+    resultado de cada código. El asistente queda abierto para el siguiente lote.
+    """
+    _name = 'biblioteca.devolucion.lote'
+    _description = 'Devolución de Préstamos en Lote'
+
+    # ==================== CAMPOS DEL ASISTENTE ====================
+    codigos = fields.Text(string='Códigos', help="Referencias de préstamo o códigos de ejemplar, uno por línea o separados por espacios o comas.")
+    linea_ids = fields.One2many('biblioteca.devolucion.lote.linea', 'devolucion_id', string='Resultados', readonly=True)
+    total_devueltos = fields.Integer(string='Devueltos', compute='_compute_totales', help="Préstamos devueltos en el último lote.")
+    total_multas = fields.Float(string='Multas', compute='_compute_totales', help="Suma de las multas generadas en el último lote.")
+
+    @api.depends('linea_ids.resultado', 'linea_ids.multa')
+    def _compute_totales(self):
+        for devolucion in self:
+            devueltas = devolucion.linea_ids.filtered(lambda l: l.resultado == 'devuelto')
+            devolucion.total_devueltos = len(devueltas)
+            devolucion.total_multas = sum(devueltas.mapped('multa'))
+
+    # ==================== MÉTODOS DE ACCIÓN (Botones) ====================
+    def action_devolver(self):
+        """
+        Devuelve los préstamos de los códigos introducidos, sustituye los resultados
+        anteriores por los de este lote y vacía los códigos para el siguiente.
+        """
+        self.ensure_one()
+        codigos = re.split(r'[\s,;]+', self.codigos or '')
+        resultados = self.env['biblioteca.prestamo'].devolver_prestamos(codigos)
+        self.write({
+            'codigos': False,
+            'linea_ids': [fields.Command.clear()] + [
+                fields.Command.create({
+                    'codigo': resultado['codigo'],
+                    'resultado': resultado['resultado'],
+                    'prestamo_id': resultado['prestamo_id'],
+                    'dias_atraso': resultado['dias_atraso'],
+                    'multa': resultado['multa'],
+                })
+                for resultado in resultados
+            ],
+        })
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
+
+
+class DevolucionLoteLinea(models.TransientModel):
+    """
+    Resultado de un código en una devolución en lote.
+    """
+    _name = 'biblioteca.devolucion.lote.linea'
+    _description = 'Resultado de Devolución en Lote'
+
+    devolucion_id = fields.Many2one('biblioteca.devolucion.lote', string='Devolución', required=True, ondelete='cascade')
+    codigo = fields.Char(string='Código', readonly=True)
+    resultado = fields.Selection(RESULTADOS_DEVOLUCION, string='Resultado', readonly=True)
+    prestamo_id = fields.Many2one('biblioteca.prestamo', string='Préstamo', readonly=True)
+    miembro_id = fields.Many2one(related='prestamo_id.miembro_id', string='Miembro')
+    libro_id = fields.Many2one(related='prestamo_id.libro_id', string='Libro')
+    dias_atraso = fields.Integer(string='Días de Atraso', readonly=True)
+    multa = fields.Float(string='Multa', readonly=True)
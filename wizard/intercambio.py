@@ -0,0 +1,67 @@
+from odoo import models, fields, _
+from ..models.intercambio import TIPOS, FORMATOS
+import base64
+import io
+import tempfile
+
+
+class IntercambioWizard(models.TransientModel):
+    """
+    Asistente para importar o exportar libros, autores o miembros en CSV o JSON Lines
+    con `biblioteca.intercambio`. Para ficheros muy grandes es preferible llamar
+    directamente a `importar` o `exportar` con un fichero abierto desde el
+    servidor (por ejemplo, en `odoo-bin shell`), sin pasar por el navegador.
+    """
+    _name = 'biblioteca.intercambio.wizard'
+    _description = 'Importar / Exportar'
+
+    # ==================== CAMPOS DEL ASISTENTE ====================
+    operacion = fields.Selection([
+        ('importar', 'Importar'),
+        ('exportar', 'Exportar'),
+    ], string='Operación', required=True, default='importar')
+    tipo = fields.Selection(TIPOS, string='Registros', required=True, default='libro')
+    formato = fields.Selection(FORMATOS, string='Formato', required=True, default='csv')
+    archivo = fields.Binary(string='Fichero', help="Fichero a importar o fichero exportado.")
+    nombre_archivo = fields.Char(string='Nombre del Fichero')
+    resultado = fields.Text(string='Resultado', readonly=True)
+
+    # ==================== MÉTODOS DE ACCIÓN (Botones) ====================
+    def action_ejecutar(self):
+        """
+        Ejecuta la importación o la exportación y vuelve a mostrar el asistente
+        con el resumen (y, al exportar, el fichero para descargar).
+        """
+        self.ensure_one()
+        Intercambio = self.env['biblioteca.intercambio']
+        if self.operacion == 'importar':
+            if not self.archivo:
+                return self._reabrir(resultado=_("Seleccione el fichero a importar."))
+            fichero = io.TextIOWrapper(io.BytesIO(base64.b64decode(self.archivo)), encoding='utf-8-sig', newline='')
+            resumen = Intercambio.importar(fichero, self.tipo, self.formato)
+            lineas = [_("Creados: %(creados)s\nActualizados: %(actualizados)s\nErrores: %(errores)s", **resumen)]
+            lineas += [_("Línea %(linea)s: %(mensaje)s", linea=linea, mensaje=mensaje) for linea, mensaje in resumen['detalle_errores']]
+            return self._reabrir(resultado="\n".join(lineas))
+        # La exportación se escribe en un fichero temporal, no en memoria.
+        with tempfile.TemporaryFile() as temporal:
+            salida = io.TextIOWrapper(temporal, encoding='utf-8', newline='')
+            total = Intercambio.exportar(salida, self.tipo, self.formato)
+            salida.flush()
+            temporal.seek(0)
+            contenido = base64.b64encode(temporal.read())
+            salida.detach()
+        return self._reabrir(
+            archivo=contenido,
+            nombre_archivo='%s.%s' % (self.tipo, self.formato),
+            resultado=_("Filas exportadas: %s", total),
+        )
+
+    def _reabrir(self, **valores):
+        self.write(valores)
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
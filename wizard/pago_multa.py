@@ -0,0 +1,41 @@
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+
+
+class PagoMulta(models.TransientModel):
+    """
+    Asistente para registrar el pago (total o parcial) de las multas de un miembro.
+    El pago se anota como un movimiento negativo en el libro de multas, que
+    descuenta el importe de la deuda del miembro.
+    """
+    _name = 'biblioteca.pago.multa'
+    _description = 'Pago de Multas'
+
+    # ==================== CAMPOS DEL ASISTENTE ====================
+    miembro_id = fields.Many2one('biblioteca.miembro', string='Miembro', required=True, help="Miembro que realiza el pago.")
+    deuda_total = fields.Float(related='miembro_id.deuda_total', string='Deuda Actual')
+    importe = fields.Float(string='Importe', required=True, help="Importe pagado.")
+    nota = fields.Char(string='Nota', help="Observaciones del pago (forma de pago, recibo...).")
+
+    @api.onchange('miembro_id')
+    def _onchange_miembro_id(self):
+        """
+        Propone como importe la deuda completa del miembro.
+        """
+        self.importe = self.miembro_id.deuda_total
+
+    # ==================== MÉTODOS DE ACCIÓN (Botones) ====================
+    def action_confirmar(self):
+        """
+        Registra el pago en el libro de multas.
+        """
+        self.ensure_one()
+        if self.importe <= 0:
+            raise UserError(_("El importe del pago debe ser mayor que cero."))
+        self.env['biblioteca.movimiento.multa'].create({
+            'miembro_id': self.miembro_id.id,
+            'tipo': 'pago',
+            'importe': -self.importe,
+            'nota': self.nota,
+        })
+        return {'type': 'ir.actions.act_window_close'}